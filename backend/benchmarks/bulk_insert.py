@@ -0,0 +1,86 @@
+"""
+Compares the old chunked `INSERT ... VALUES` bulk path with src.bulk.bulk_insert
+(binary COPY on asyncpg, multi-row INSERT elsewhere).
+
+Run from backend/ against the database in DATABASE_URL:
+    python -m benchmarks.bulk_insert --amount 100000 --repeat 3
+
+Every run is rolled back, the COPY included, nothing is left behind in the tickets table.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime, UTC
+from itertools import repeat
+
+from sqlalchemy import insert
+
+import src.models  # noqa: F401  resolves the User <-> Ticket relationship
+from src.bulk import bulk_insert
+from src.database import AsyncSessionLocal, engine
+from src.migrations import migrate
+from src.tickets.constants import BULK_TICKET_COLUMNS
+from src.tickets.models import Ticket
+from src.utils import chunked
+
+
+async def chunked_insert(db, amount: int) -> None:
+    """The pre-COPY implementation of create_ticket_bulk"""
+    ticket_records = [
+        {
+            "price": 10.0,
+            "name": "benchmark",
+            "is_valid": True,
+        }
+        for _ in range(amount)
+    ]
+
+    for chunk in chunked(ticket_records, 500):
+        await db.execute(insert(Ticket).values(chunk))
+
+
+async def streamed_insert(db, amount: int) -> None:
+    now = datetime.now(UTC)
+    await bulk_insert(db, Ticket.__table__, BULK_TICKET_COLUMNS, repeat((10.0, "benchmark", True, now, now), amount))
+
+
+async def measure(name: str, writer, amount: int, runs: int) -> None:
+    timings = []
+    peak_memory = 0
+
+    for _ in range(runs):
+        async with AsyncSessionLocal() as db:
+            tracemalloc.start()
+            started = time.perf_counter()
+
+            await writer(db, amount)
+            await db.flush()
+
+            timings.append(time.perf_counter() - started)
+            peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+            await db.rollback()
+
+    best = min(timings)
+    print(f"{name:<10} best {best:8.3f}s  {amount / best:12,.0f} rows/s  peak python memory {peak_memory / 2 ** 20:8.1f} MiB")
+
+
+async def main(amount: int, runs: int) -> None:
+    await migrate(engine)
+
+    print(f"{amount:,} rows, best of {runs}, driver {engine.dialect.driver}")
+    await measure("chunked", chunked_insert, amount, runs)
+    await measure("streamed", streamed_insert, amount, runs)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--amount", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.amount, args.repeat))
@@ -0,0 +1,453 @@
+"""
+Throughput and p50/p95/p99 latency of every route in src/tickets/router.py and src/users/router.py,
+driven in-process through an ASGI client against the real src.main:app.
+
+Run from backend/ against a dedicated database in DATABASE_URL (needs httpx, see benchmarks/requirements.txt):
+    python -m benchmarks.endpoints --tickets 1000000 --requests 200 --concurrency 10
+    python -m benchmarks.endpoints --tickets 1000000 --save-baseline
+
+Seeded rows are kept, a later run with the same --tickets only tops the tables up, so the seeding of a
+large dataset is paid once. The write routes add and change rows on every run.
+
+Results are compared with the baseline of the same dataset size (benchmarks/baselines/endpoints_<tickets>.json
+unless --baseline says otherwise). Exits with 1 when a route's p95 grew or its throughput dropped by more
+than --tolerance, when a request failed, or when a route has no scenario here.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, UTC, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+from sqlalchemy import select, insert, func
+
+import src.models  # noqa: F401  resolves the User <-> Ticket relationship
+from src.bulk import bulk_insert
+from src.database import engine, AsyncSessionLocal
+from src.jobs.constants import JOB_COMPLETED
+from src.jobs.models import Job
+from src.main import app
+from src.migrations import migrate
+from src.tickets.constants import BULK_TICKET_JOB
+from src.tickets.models import Ticket
+from src.tickets.router import router as ticket_router
+from src.tickets.stats import StatsDelta, ticket_stats_service
+from src.users.models import User
+from src.users.router import router as user_router
+
+BASELINES_DIR = Path(__file__).parent / "baselines"
+
+# Ids sampled from the seeded tables, the read and update scenarios pick from these
+SAMPLE_SIZE = 1000
+
+# Ids / rows per request of the batch and bulk scenarios
+BATCH = 10
+
+# Heavy scenarios (full exports, password hashing in bulk) run this fraction of --requests
+HEAVY = 0.1
+
+NOW = datetime.now(UTC)
+
+
+@dataclass
+class Fixtures:
+    run_id: str
+    user_ids: List[int]
+    # (id, email) of seeded users, PUT has to send the user's own email back
+    users: List[Tuple[int, str]]
+    ticket_ids: List[int]
+    job_ids: List[int]
+    # Rows only the delete scenarios consume, one list per scenario
+    disposable: Dict[str, list] = field(default_factory=dict)
+
+    def take(self, scenario: str, amount: int = 1) -> list:
+        rows = self.disposable[scenario]
+        taken, self.disposable[scenario] = rows[:amount], rows[amount:]
+
+        return taken
+
+
+# Builds (path, httpx request kwargs) for the i-th request of a scenario
+RequestBuilder = Callable[[Fixtures, int], Tuple[str, dict]]
+
+
+@dataclass
+class Scenario:
+    route: str  # "<METHOD> <route template>", the key of the results and baselines
+    build: RequestBuilder
+    heavy: bool = False
+    # Disposable rows consumed per request: "tickets", "named_tickets" or "users"
+    consumes: str = ""
+
+    @property
+    def method(self) -> str:
+        return self.route.split(" ", 1)[0]
+
+
+def _ticket_body(fixtures: Fixtures, i: int) -> dict:
+    return {
+        "name": f"bench {fixtures.run_id} {i}",
+        "price": round(random.uniform(1, 1000), 2),
+        "is_valid": True,
+        "user_id": random.choice(fixtures.user_ids),
+    }
+
+
+def _import_file(fixtures: Fixtures, i: int) -> dict:
+    lines = "\n".join(json.dumps(_ticket_body(fixtures, i)) for _ in range(BATCH))
+
+    return {"files": {"file": ("tickets.ndjson", lines.encode(), "application/x-ndjson")}}
+
+
+def _user(fixtures: Fixtures, i: int) -> dict:
+    return {
+        "username": f"bench {i}",
+        "email": f"bench-{fixtures.run_id}-{i}-{uuid.uuid4().hex[:8]}@example.com",
+        "password": "benchmark-password",
+    }
+
+
+def _put_user(user: Tuple[int, str], i: int) -> Tuple[str, dict]:
+    user_id, email = user
+
+    return f"/users/{user_id}", {"json": {"username": f"bench {i}", "email": email}}
+
+
+SCENARIOS = [
+    # Tickets
+    Scenario("GET /tickets", lambda f, i: ("/tickets", {"params": {"page": random.randint(1, 5)}})),
+    Scenario("GET /tickets/export", lambda f, i: (
+        "/tickets/export", {"params": {"user_id": random.choice(f.user_ids)}})),
+    Scenario("GET /tickets/stats", lambda f, i: ("/tickets/stats", {})),
+    Scenario("POST /tickets/batch-get", lambda f, i: (
+        "/tickets/batch-get", {"json": {"ids": random.sample(f.ticket_ids, BATCH)}})),
+    Scenario("GET /tickets/{ticket_id}", lambda f, i: (f"/tickets/{random.choice(f.ticket_ids)}", {})),
+    Scenario("GET /tickets/bulk/jobs/{job_id}", lambda f, i: (f"/tickets/bulk/jobs/{random.choice(f.job_ids)}", {})),
+    Scenario("POST /tickets", lambda f, i: ("/tickets", {"json": _ticket_body(f, i)})),
+    Scenario("POST /tickets/bulk", lambda f, i: (
+        "/tickets/bulk", {"json": {"name": f"bench {f.run_id}", "price": 10.0, "is_valid": True, "amount": 100}})),
+    Scenario("POST /tickets/import", lambda f, i: ("/tickets/import", _import_file(f, i))),
+    Scenario("PATCH /tickets/batch", lambda f, i: (
+        "/tickets/batch",
+        {"json": {"items": [{"id": ticket_id, "price": 10.0} for ticket_id in random.sample(f.ticket_ids, BATCH)]}})),
+    Scenario("POST /tickets/bulk-update", lambda f, i: (
+        "/tickets/bulk-update",
+        {"json": {"filter": {"user_id": random.choice(f.user_ids)}, "changes": {"is_valid": True}}})),
+    Scenario("PUT /tickets/{ticket_id}", lambda f, i: (
+        f"/tickets/{random.choice(f.ticket_ids)}", {"json": _ticket_body(f, i)})),
+    Scenario("PATCH /tickets/{ticket_id}", lambda f, i: (
+        f"/tickets/{random.choice(f.ticket_ids)}", {"json": {"price": round(random.uniform(1, 1000), 2)}})),
+    Scenario("DELETE /tickets/bulk/jobs/{job_id}", lambda f, i: (
+        f"/tickets/bulk/jobs/{random.choice(f.job_ids)}", {})),
+    Scenario("DELETE /tickets/{ticket_id}", lambda f, i: (
+        f"/tickets/{f.take('tickets')[0]}", {}), consumes="tickets"),
+    Scenario("DELETE /tickets/batch", lambda f, i: (
+        "/tickets/batch", {"json": {"ids": f.take("tickets", BATCH)}}), consumes="tickets"),
+    Scenario("POST /tickets/bulk-delete", lambda f, i: (
+        "/tickets/bulk-delete", {"json": {"filter": {"name": f.take("named_tickets")[0]}}}), consumes="named_tickets"),
+    # Users
+    Scenario("GET /users", lambda f, i: ("/users", {"params": {"page": random.randint(1, 5)}})),
+    Scenario("GET /users/export", lambda f, i: ("/users/export", {}), heavy=True),
+    Scenario("POST /users/batch-get", lambda f, i: (
+        "/users/batch-get", {"json": {"ids": random.sample(f.user_ids, BATCH)}})),
+    Scenario("GET /users/{user_id}", lambda f, i: (
+        f"/users/{random.choice(f.user_ids)}", {"params": {"include": "tickets"} if i % 2 else {}})),
+    Scenario("GET /users/{user_id}/ticket-stats", lambda f, i: (f"/users/{random.choice(f.user_ids)}/ticket-stats", {})),
+    Scenario("POST /users", lambda f, i: ("/users", {"json": _user(f, i)})),
+    Scenario("POST /users/bulk", lambda f, i: (
+        "/users/bulk", {"json": {"users": [_user(f, i * BATCH + n) for n in range(BATCH)]}}), heavy=True),
+    Scenario("PATCH /users/batch", lambda f, i: (
+        "/users/batch",
+        {"json": {"items": [{"id": user_id, "username": f"bench {i}"} for user_id in random.sample(f.user_ids, BATCH)]}})),
+    Scenario("PUT /users/{user_id}", lambda f, i: _put_user(random.choice(f.users), i)),
+    Scenario("PATCH /users/{user_id}", lambda f, i: (
+        f"/users/{random.choice(f.user_ids)}", {"json": {"username": f"bench {i}"}})),
+    Scenario("DELETE /users/{user_id}", lambda f, i: (f"/users/{f.take('users')[0]}", {}), consumes="users"),
+    Scenario("DELETE /users/batch", lambda f, i: (
+        "/users/batch", {"json": {"ids": f.take("users", BATCH)}}), consumes="users"),
+]
+
+
+def missing_scenarios() -> List[str]:
+    """Routes of the two routers nobody benchmarks, a new route has to come with its scenario"""
+    covered = {scenario.route for scenario in SCENARIOS}
+    routes = [
+        f"{method} {route.path}"
+        for route in (*ticket_router.routes, *user_router.routes)
+        for method in sorted(route.methods)
+    ]
+
+    return [route for route in routes if route not in covered]
+
+
+def requests_of(scenario: Scenario, requests: int) -> int:
+    return max(1, int(requests * HEAVY)) if scenario.heavy else requests
+
+
+async def seed(tickets: int) -> None:
+    """Tops users and tickets up to the requested size, ticket_stats is kept in step"""
+    users = max(100, tickets // 100)
+
+    async with AsyncSessionLocal() as db:
+        missing_users = users - await db.scalar(select(func.count()).select_from(User))
+
+        if missing_users > 0:
+            print(f"seeding {missing_users:,} users")
+            run = uuid.uuid4().hex[:8]
+            await bulk_insert(
+                db,
+                User.__table__,
+                ("username", "email", "password", "created_at", "updated_at"),
+                ((f"seed {i}", f"seed-{run}-{i}@example.com", "-", NOW, NOW) for i in range(missing_users)),
+            )
+            await db.commit()
+
+        missing_tickets = tickets - await db.scalar(select(func.count()).select_from(Ticket))
+
+        if missing_tickets > 0:
+            print(f"seeding {missing_tickets:,} tickets")
+            user_ids = list((await db.scalars(select(User.id))).all())
+            delta = StatsDelta()
+
+            def rows():
+                for i in range(missing_tickets):
+                    user_id = random.choice(user_ids)
+                    price = round(random.uniform(1, 1000), 2)
+                    is_valid = random.random() > 0.05
+                    created_at = NOW - timedelta(days=365) * random.random()
+                    delta.add(user_id, is_valid, price)
+
+                    yield user_id, price, f"seed {i}", is_valid, created_at, created_at
+
+            await bulk_insert(
+                db,
+                Ticket.__table__,
+                ("user_id", "price", "name", "is_valid", "created_at", "updated_at"),
+                rows(),
+            )
+            await ticket_stats_service.apply(db, delta)
+            await db.commit()
+
+
+async def _insert_ids(db, model, rows: List[dict]) -> List[int]:
+    if not rows:
+        return []
+
+    return list((await db.scalars(insert(model).returning(model.id), rows)).all())
+
+
+async def prepare(iterations: int) -> Fixtures:
+    """Samples ids to read and update, and writes the rows the delete scenarios are going to consume"""
+    run_id = uuid.uuid4().hex[:8]
+    consumed = {"tickets": 0, "named_tickets": 0, "users": 0}
+
+    for scenario in SCENARIOS:
+        if scenario.consumes:
+            per_request = BATCH if "batch" in scenario.route else 1
+            consumed[scenario.consumes] += per_request * iterations
+
+    async with AsyncSessionLocal() as db:
+        users = (await db.execute(select(User.id, User.email).order_by(func.random()).limit(SAMPLE_SIZE))).all()
+        ticket_ids = list((await db.scalars(select(Ticket.id).order_by(func.random()).limit(SAMPLE_SIZE))).all())
+
+        job_ids = list((await db.scalars(
+            insert(Job).returning(Job.id),
+            [
+                {"kind": BULK_TICKET_JOB, "status": JOB_COMPLETED, "total": 100, "done": 100, "payload": {}}
+                for _ in range(BATCH)
+            ],
+        )).all())
+
+        disposable_tickets = await _insert_ids(db, Ticket, [
+            {"name": f"bench {run_id} delete", "price": 1.0, "is_valid": True} for _ in range(consumed["tickets"])
+        ])
+        # The bulk-delete filter matches one name, each name is shared by BATCH tickets
+        names = [f"bench {run_id} bulk-delete {i}" for i in range(consumed["named_tickets"])]
+        await _insert_ids(db, Ticket, [{"name": name, "price": 1.0, "is_valid": True} for name in names for _ in range(BATCH)])
+
+        delta = StatsDelta()
+        delta.add(None, True, 1.0, consumed["tickets"] + len(names) * BATCH)
+        await ticket_stats_service.apply(db, delta)
+
+        disposable_users = await _insert_ids(db, User, [
+            {"username": "bench delete", "email": f"bench-{run_id}-delete-{i}@example.com", "password": "-"}
+            for i in range(consumed["users"])
+        ])
+
+        await db.commit()
+
+    return Fixtures(
+        run_id=run_id,
+        user_ids=[user_id for user_id, _ in users],
+        users=[(user_id, email) for user_id, email in users],
+        ticket_ids=ticket_ids,
+        job_ids=job_ids,
+        disposable={
+            "tickets": disposable_tickets,
+            "named_tickets": names,
+            "users": disposable_users,
+        },
+    )
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, fixtures: Fixtures, requests: int,
+                       warmup: int, concurrency: int) -> dict:
+    latencies = []
+    errors = {}
+    counter = iter(range(warmup + requests))
+
+    async def send(i: int) -> None:
+        path, kwargs = scenario.build(fixtures, i)
+        started = time.perf_counter()
+        response = await client.request(scenario.method, path, **kwargs)
+        elapsed = time.perf_counter() - started
+
+        if response.status_code >= 400:
+            errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+        if i >= warmup:
+            latencies.append(elapsed)
+
+    async def worker() -> None:
+        for i in counter:
+            await send(i)
+
+    # Warm-up requests go first and alone, so connection pools and caches are filled before timing starts
+    for i in range(warmup):
+        await send(next(counter))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    regressions = []
+
+    for route, result in results.items():
+        before = baseline.get(route)
+
+        if not before:
+            continue
+
+        if result["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {before['p95'] * 1000:.2f}ms -> {result['p95'] * 1000:.2f}ms")
+
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{route}: throughput {before['throughput']:.1f}/s -> {result['throughput']:.1f}/s")
+
+    return regressions
+
+
+def print_results(results: Dict[str, dict], baseline: Dict[str, dict]) -> None:
+    print(f"\n{'route':<40} {'req':>5} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'p95 vs base':>12}")
+
+    for route, result in results.items():
+        before = baseline.get(route)
+        change = f"{(result['p95'] / before['p95'] - 1) * 100:+.1f}%" if before and before["p95"] else "-"
+        print(
+            f"{route:<40} {result['requests']:>5} {sum(result['errors'].values()):>4} {result['throughput']:>8.1f} "
+            f"{result['p50'] * 1000:>8.2f} {result['p95'] * 1000:>8.2f} {result['p99'] * 1000:>8.2f} {change:>12}"
+        )
+
+
+async def main(args) -> int:
+    missing = missing_scenarios()
+
+    if missing:
+        print(f"No scenario for {', '.join(missing)}")
+        return 1
+
+    baseline_path = Path(args.baseline) if args.baseline else BASELINES_DIR / f"endpoints_{args.tickets}.json"
+    baseline = json.loads(baseline_path.read_text())["routes"] if baseline_path.exists() else {}
+    scenarios = [scenario for scenario in SCENARIOS if not args.route or scenario.route in args.route]
+
+    await migrate(engine)
+    await seed(args.tickets)
+    fixtures = await prepare(args.warmup + args.requests)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+
+    # httpx doesn't run the lifespan, the app gets its startup and shutdown from here
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for scenario in scenarios:
+                results[scenario.route] = await run_scenario(
+                    client,
+                    scenario,
+                    fixtures,
+                    requests_of(scenario, args.requests),
+                    min(args.warmup, requests_of(scenario, args.requests)),
+                    args.concurrency,
+                )
+
+    print(f"{args.tickets:,} tickets, {args.requests} requests per route, concurrency {args.concurrency}, "
+          f"driver {engine.dialect.driver}")
+    print_results(results, baseline)
+
+    failed = [f"{route}: {result['errors']}" for route, result in results.items() if result["errors"]]
+    regressions = compare(results, baseline, args.tolerance)
+
+    for line in failed:
+        print(f"FAILED REQUESTS {line}")
+
+    for line in regressions:
+        print(f"REGRESSION {line}")
+
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps({
+            "tickets": args.tickets,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "driver": engine.dialect.driver,
+            "recorded_at": datetime.now(UTC).isoformat(),
+            "routes": {**baseline, **results},
+        }, indent=2) + "\n")
+        print(f"\nbaseline written to {baseline_path}")
+    elif not baseline:
+        print(f"\nno baseline at {baseline_path}, run with --save-baseline to record one")
+
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=10000, help="Dataset size, e.g. 10000 up to 10000000")
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per route")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests per route before timing")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth / throughput drop")
+    parser.add_argument("--baseline", help="Baseline file, default benchmarks/baselines/endpoints_<tickets>.json")
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the new baseline")
+    parser.add_argument("--route", action="append", help="Only this route, e.g. 'GET /tickets' (repeatable)")
+
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,169 @@
+"""
+Checks that every filter and sort combination of GET /tickets is served by an index.
+
+Seeds users and tickets inside a transaction, runs ANALYZE, prints the plan of the listing
+query for each combination and flags the ones whose plan scans the whole tickets table.
+Works on PostgreSQL (EXPLAIN) and SQLite (EXPLAIN QUERY PLAN).
+
+Run from backend/ against the database in DATABASE_URL:
+    python -m benchmarks.explain_ticket_filters --rows 200000
+
+Everything is rolled back, nothing is left behind. Exits with 1 when a full scan was found.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+from datetime import datetime, UTC, timedelta
+
+from sqlalchemy import insert, select, text
+
+import src.models  # noqa: F401  resolves the User <-> Ticket relationship
+from src.bulk import bulk_insert
+from src.database import engine, AsyncSessionLocal
+from src.migrations import migrate
+from src.pagination import PaginationParams, CountStrategy
+from src.tickets.models import Ticket
+from src.tickets.schemas import TicketFilterParams, TicketSort
+from src.users.models import User
+
+USERS = 1000
+NOW = datetime.now(UTC)
+
+FILTERS = {
+    "none": {},
+    "user_id": {"user_id": None},  # filled in with a seeded user
+    "is_valid": {"is_valid": False},
+    "price range": {"min_price": 990.0, "max_price": 1000.0},
+    "created range": {"created_after": NOW - timedelta(days=1), "created_before": NOW},
+    "user_id + price range": {"user_id": None, "min_price": 100.0, "max_price": 200.0},
+    "user_id + created range": {"user_id": None, "created_after": NOW - timedelta(days=30)},
+    "is_valid + price range": {"is_valid": True, "min_price": 990.0},
+}
+
+
+def listing_query(filters: dict, sort: TicketSort):
+    """The first page query GET /tickets sends, without the count"""
+    params = TicketFilterParams(**{
+        "user_id": None,
+        "is_valid": None,
+        "min_price": None,
+        "max_price": None,
+        "created_after": None,
+        "created_before": None,
+        **filters,
+        "sort": sort,
+    })
+    pagination = PaginationParams(page=1, page_size=20, after=None, before=None, count=CountStrategy.NONE)
+
+    return pagination.apply(params.apply(select(Ticket)), Ticket, params.sort_order)
+
+
+def ticket_rows(amount: int, user_ids: list):
+    for i in range(amount):
+        created_at = NOW - timedelta(days=365) * random.random()
+
+        yield (
+            random.choice(user_ids),
+            round(random.uniform(1, 1000), 2),
+            f"ticket {i}",
+            random.random() > 0.05,
+            created_at,
+            created_at,
+        )
+
+
+async def seed(db, rows: int) -> list:
+    result = await db.execute(
+        insert(User).returning(User.id),
+        [
+            {
+                "username": f"explain {i}",
+                "email": f"explain-{i}-{NOW.timestamp()}@example.com",
+                "password": "-",
+                "created_at": NOW,
+                "updated_at": NOW,
+            }
+            for i in range(USERS)
+        ],
+    )
+    user_ids = list(result.scalars().all())
+
+    await bulk_insert(
+        db,
+        Ticket.__table__,
+        ("user_id", "price", "name", "is_valid", "created_at", "updated_at"),
+        ticket_rows(rows, user_ids),
+    )
+    await db.execute(text("ANALYZE tickets"))
+
+    return user_ids
+
+
+async def explain(db, query) -> tuple[list[str], bool]:
+    """Plan lines and whether one of them reads the whole tickets table"""
+    compiled = query.compile(db.bind, compile_kwargs={"literal_binds": True})
+
+    if db.bind.dialect.name == "postgresql":
+        plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        nodes, lines = [(plan[0]["Plan"], 0)], []
+        full_scan = False
+
+        while nodes:
+            node, depth = nodes.pop()
+            relation = node.get("Relation Name", "")
+            index = node.get("Index Name", "")
+            lines.append(f"{'  ' * depth}{node['Node Type']} {relation} {index}".rstrip())
+            full_scan |= node["Node Type"] == "Seq Scan" and relation == "tickets"
+            nodes.extend((child, depth + 1) for child in reversed(node.get("Plans", [])))
+
+        return lines, full_scan
+
+    rows = (await db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+    lines = [row[-1] for row in rows]
+
+    return lines, any(line.startswith("SCAN tickets") and "INDEX" not in line for line in lines)
+
+
+async def main(rows: int) -> int:
+    await migrate(engine)
+
+    full_scans = []
+
+    async with AsyncSessionLocal() as db:
+        user_ids = await seed(db, rows)
+        print(f"{rows:,} tickets, {USERS:,} users, driver {engine.dialect.driver}\n")
+
+        for name, filters in FILTERS.items():
+            if "user_id" in filters:
+                filters = {**filters, "user_id": user_ids[0]}
+
+            for sort in TicketSort:
+                lines, full_scan = await explain(db, listing_query(filters, sort))
+                marker = "FULL SCAN" if full_scan else "ok"
+                print(f"[{marker}] filter={name} sort={sort.value}")
+                print("\n".join(f"    {line}" for line in lines))
+
+                if full_scan:
+                    full_scans.append((name, sort.value))
+
+        await db.rollback()
+
+    await engine.dispose()
+
+    print(f"\n{len(full_scans)} combination(s) scan the whole table")
+
+    for name, sort in full_scans:
+        print(f"    filter={name} sort={sort}")
+
+    return 1 if full_scans else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.rows)))
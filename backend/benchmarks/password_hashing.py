@@ -0,0 +1,67 @@
+"""
+Event-loop latency during a signup burst, hashing inline on the loop vs through src.users.utils.password_hasher.
+
+A probe task sleeps 1ms in a loop and records how late it wakes up; that lateness is what every
+other request on the worker would see. No database is needed:
+    python -m benchmarks.password_hashing --signups 200 --cost 16384
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from src.users.utils import PasswordHasher
+
+PROBE_INTERVAL = 0.001
+
+
+async def probe(lags: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+
+async def burst(name: str, hash_one, signups: int) -> None:
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(hash_one(f"password-{i}") for i in range(signups)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe_task
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0
+    print(
+        f"{name:<9} {signups / elapsed:8.1f} hashes/s  loop lag p50 {statistics.median(lags) * 1000:7.2f}ms"
+        f"  p99 {p99 * 1000:7.2f}ms  max {max(lags) * 1000:7.2f}ms"
+    )
+
+
+async def main(signups: int, cost: int, workers: int) -> None:
+    hasher = PasswordHasher(cost=cost, workers=workers)
+
+    async def inline(password: str) -> str:
+        # What create_user would do if it called the KDF directly
+        return hasher._hash_sync(password)
+
+    print(f"{signups} signups, scrypt n={cost}, {workers} hashing threads")
+    await burst("inline", inline, signups)
+    await burst("executor", hasher.hash, signups)
+
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signups", type=int, default=200)
+    parser.add_argument("--cost", type=int, default=2 ** 14)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.signups, args.cost, args.workers))
@@ -0,0 +1,145 @@
+"""
+Connection usage of a burst of identical reads, with and without single-flight coalescing.
+
+Fires --clients concurrent requests at one ticket, one user and one filtered count through the real app
+(httpx ASGI transport) and reports per scenario: SQL statements run, peak connections checked out of the
+primary pool, and p50/p99 latency. The entity cache is off, every request has to reach the database,
+and so is admission control, so the pool is what the requests compete for.
+
+Run from backend/ against the database in DATABASE_URL (needs httpx, see benchmarks/requirements.txt):
+    python -m benchmarks.single_flight --clients 200 --rounds 5
+"""
+import os
+
+os.environ.setdefault("ADMISSION_CONTROL", "false")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import statistics  # noqa: E402
+import time  # noqa: E402
+
+import httpx  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+
+from src.cache import entity_cache  # noqa: E402
+from src.database import engine, AsyncSessionLocal  # noqa: E402
+from src.main import app  # noqa: E402
+from src.migrations import migrate  # noqa: E402
+from src.singleflight import ticket_flights, user_flights, count_flights  # noqa: E402
+from src.tickets.models import Ticket  # noqa: E402
+from src.tickets.stats import StatsDelta, ticket_stats_service  # noqa: E402
+from src.users.models import User  # noqa: E402
+
+FLIGHTS = (ticket_flights, user_flights, count_flights)
+
+
+class PoolUsage:
+    """Statements executed and the most connections checked out at once"""
+
+    def __init__(self):
+        self.statements = 0
+        self.checked_out = 0
+        self.peak = 0
+
+        event.listen(engine.sync_engine, "before_cursor_execute", self.on_statement)
+        event.listen(engine.sync_engine, "checkout", self.on_checkout)
+        event.listen(engine.sync_engine, "checkin", self.on_checkin)
+
+    def on_statement(self, *args):
+        self.statements += 1
+
+    def on_checkout(self, *args):
+        self.checked_out += 1
+        self.peak = max(self.peak, self.checked_out)
+
+    def on_checkin(self, *args):
+        self.checked_out -= 1
+
+    def reset(self):
+        self.statements = 0
+        self.peak = self.checked_out
+
+
+async def seed() -> tuple:
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(
+            insert(User).returning(User.id),
+            {"username": "single flight", "email": f"single-flight-{time.time()}@example.com", "password": "-"},
+        )
+        ticket_id = await db.scalar(
+            insert(Ticket).returning(Ticket.id),
+            {"name": "single flight", "price": 1.0, "is_valid": True, "user_id": user_id},
+        )
+        delta = StatsDelta()
+        delta.add(user_id, True, 1.0)
+        await ticket_stats_service.apply(db, delta)
+        await db.commit()
+
+    return ticket_id, user_id
+
+
+async def burst(client: httpx.AsyncClient, path: str, clients: int, rounds: int, usage: PoolUsage) -> dict:
+    latencies = []
+    statements = []
+    peaks = []
+
+    async def one() -> None:
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+    for _ in range(rounds):
+        usage.reset()
+        await asyncio.gather(*(one() for _ in range(clients)))
+        statements.append(usage.statements)
+        peaks.append(usage.peak)
+
+    latencies.sort()
+
+    return {
+        "statements": statistics.mean(statements),
+        "peak": max(peaks),
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+async def main(clients: int, rounds: int) -> None:
+    await migrate(engine)
+    ticket_id, user_id = await seed()
+    usage = PoolUsage()
+    entity_cache.enabled = False
+
+    scenarios = {
+        "GET /tickets/{id}": f"/tickets/{ticket_id}",
+        "GET /users/{id}": f"/users/{user_id}",
+        # Filtered, so count=estimated falls back to count(*)
+        "GET /tickets count": f"/tickets?user_id={user_id}&count=estimated",
+    }
+
+    print(f"{clients} concurrent clients x {rounds} rounds, pool {engine.pool.size()}+{engine.pool._max_overflow}, "
+          f"driver {engine.dialect.driver}\n")
+    print(f"{'scenario':<22} {'coalescing':<11} {'stmts/burst':>11} {'peak conns':>10} {'p50 ms':>8} {'p99 ms':>8}")
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+            for name, path in scenarios.items():
+                for enabled in (False, True):
+                    for flight in FLIGHTS:
+                        flight.enabled = enabled
+
+                    result = await burst(client, path, clients, rounds, usage)
+                    print(
+                        f"{name:<22} {'on' if enabled else 'off':<11} {result['statements']:>11.0f} "
+                        f"{result['peak']:>10} {result['p50'] * 1000:>8.2f} {result['p99'] * 1000:>8.2f}"
+                    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.clients, args.rounds))
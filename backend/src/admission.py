@@ -0,0 +1,308 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.responses import JSONResponse
+
+from src.config import settings as main_config
+from src.database import engine, replica_engines, POOL_SIZE, MAX_OVERFLOW, READ_ONLY_METHODS
+from src.metrics import Counter, Gauge, Histogram
+
+# Last path segment -> route class, everything else is read or write by its method
+SEGMENT_CLASSES = {
+    "export": "heavy",
+    "bulk": "heavy",
+    "import": "heavy",
+    "bulk-update": "heavy",
+    "bulk-delete": "heavy",
+    "batch-get": "read",
+}
+
+# Only the API is admission controlled, /metrics, /docs etc. stay reachable under any load
+CONTROLLED_PREFIXES = ("/tickets", "/users")
+
+# A waiting request re-checks the pool this often, connections also come back from outside requests (jobs)
+POLL_INTERVAL = 0.01
+
+# Token buckets kept, the least recently seen clients are forgotten first
+MAX_RATE_LIMITED_CLIENTS = 10000
+
+admission_decisions = Counter(
+    "admission_decisions_total", "Requests admitted at once, after queueing, shed or rate limited",
+    ("route_class", "decision"))
+admission_queue_wait = Histogram(
+    "admission_queue_wait_seconds", "Time requests waited for admission", ("route_class",))
+admission_in_flight = Gauge(
+    "admission_in_flight", "Admitted requests still running", ("route_class",),
+    collect=lambda: [((name, ), limiter.in_flight) for name, limiter in admission.limiters.items()])
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    if not path.startswith(CONTROLLED_PREFIXES):
+        return None
+
+    segment = path.rstrip("/").rsplit("/", 1)[-1]
+
+    return SEGMENT_CLASSES.get(segment) or ("read" if method in READ_ONLY_METHODS else "write")
+
+
+def _saturated(pooled_engine: AsyncEngine) -> bool:
+    pool = pooled_engine.pool
+    # Pools without a limit (NullPool, StaticPool) are never saturated
+    checkedout = getattr(pool, "checkedout", None)
+
+    return checkedout is not None and checkedout() >= POOL_SIZE + MAX_OVERFLOW
+
+
+class PoolBudget:
+    """Requests in flight on a group of pools, shared by every route class using them"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+
+
+class ConcurrencyLimiter:
+    """
+    At most `limit` requests of one route class in flight, as long as the budget of the pools they
+    use, which other classes draw from as well, has room left, and none admitted while every pool they
+    could use has all its connections checked out. Waiters are admitted in arrival order
+    """
+
+    def __init__(self, name: str, limit: int, engines: List[AsyncEngine], budget: PoolBudget):
+        self.name = name
+        self.limit = limit
+        self.engines = engines
+        self.budget = budget
+        self.in_flight = 0
+        self.waiters: deque[asyncio.Future] = deque()
+
+    def has_room(self) -> bool:
+        return (
+            self.in_flight < self.limit
+            and self.budget.in_flight < self.budget.limit
+            and not all(_saturated(pooled_engine) for pooled_engine in self.engines)
+        )
+
+    async def acquire(self, timeout: float) -> bool:
+        if not self.waiters and self.has_room():
+            self._take()
+            return True
+
+        ticket = asyncio.get_running_loop().create_future()
+        self.waiters.append(ticket)
+        deadline = time.monotonic() + timeout
+
+        try:
+            while not ticket.done():
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    self.waiters.remove(ticket)
+                    return False
+
+                try:
+                    # shield: a timeout must not cancel a ticket that was granted at the same moment
+                    await asyncio.wait_for(asyncio.shield(ticket), min(remaining, POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    self.wake()
+        except asyncio.CancelledError:
+            # Client went away while waiting
+            if ticket.done():
+                self.release()
+            else:
+                self.waiters.remove(ticket)
+
+            raise
+
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.budget.in_flight -= 1
+        self.wake()
+
+    def wake(self) -> None:
+        while self.waiters and self.has_room():
+            self._take()
+            self.waiters.popleft().set_result(True)
+
+    def _take(self) -> None:
+        self.in_flight += 1
+        self.budget.in_flight += 1
+
+
+class TokenBuckets:
+    """RATE_LIMIT_PER_SECOND requests per client with bursts up to RATE_LIMIT_BURST"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        # client -> (tokens, monotonic time of the last refill), least recently seen first
+        self._buckets: OrderedDict[str, Tuple[float, float]] = OrderedDict()
+
+    def take(self, client: str) -> float:
+        """0 when the request may go, otherwise the seconds until the client has a token again"""
+        now = time.monotonic()
+        tokens, refilled_at = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - refilled_at) * self.rate)
+        wait = 0.0
+
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+
+        self._buckets[client] = (tokens, now)
+
+        if len(self._buckets) > MAX_RATE_LIMITED_CLIENTS:
+            self._buckets.popitem(last=False)
+
+        return wait
+
+
+class AdmissionController:
+    """
+    `capacity` is the connections of one pool. The classes on the primary share one budget of that
+    size, so together they never admit more requests than the pool can serve; with replicas, reads
+    get a budget of their own, one capacity per replica
+    """
+
+    def __init__(
+            self,
+            limits: Dict[str, int],
+            queue_timeout: float,
+            buckets: Optional[TokenBuckets],
+            capacity: int = POOL_SIZE + MAX_OVERFLOW,
+    ):
+        defaults = {"read": capacity, "write": capacity, "heavy": max(1, capacity // 4)}
+        # Reads may be served by any replica, so they only wait while all of them are saturated
+        engines = {"read": replica_engines or [engine], "write": [engine], "heavy": [engine]}
+        primary = PoolBudget(capacity)
+        budgets = {
+            "read": PoolBudget(capacity * len(replica_engines)) if replica_engines else primary,
+            "write": primary,
+            "heavy": primary,
+        }
+
+        self.limiters = {
+            name: ConcurrencyLimiter(name, limits.get(name, default), engines[name], budgets[name])
+            for name, default in defaults.items()
+        }
+        self.queue_timeout = queue_timeout
+        self.buckets = buckets
+
+    def release(self, limiter: ConcurrencyLimiter) -> None:
+        limiter.release()
+
+        # A finished request may have given back a connection other classes are waiting for
+        for other in self.limiters.values():
+            if other is not limiter:
+                other.wake()
+
+
+admission = AdmissionController(
+    main_config.ADMISSION_LIMITS,
+    main_config.ADMISSION_QUEUE_TIMEOUT,
+    TokenBuckets(main_config.RATE_LIMIT_PER_SECOND, main_config.RATE_LIMIT_BURST)
+    if main_config.RATE_LIMIT_PER_SECOND else None,
+)
+
+
+class AdmissionSlot:
+    """
+    The admission of one request, put into the ASGI scope as scope["admission"]. A request waiting on
+    something that needs no connection gives its slot to others meanwhile and takes one again after
+    """
+
+    def __init__(self, controller: AdmissionController, limiter: ConcurrencyLimiter):
+        self.controller = controller
+        self.limiter = limiter
+        self.held = True
+
+    def release(self) -> None:
+        if self.held:
+            self.held = False
+            self.controller.release(self.limiter)
+
+    async def reacquire(self) -> bool:
+        """False once the wait exceeded the queue timeout, the request should then be shed with 503"""
+        if not self.held:
+            self.held = await self.limiter.acquire(self.controller.queue_timeout)
+
+            if not self.held:
+                admission_decisions.inc(self.limiter.name, "shed")
+
+        return self.held
+
+
+def _client_key(scope) -> str:
+    if main_config.RATE_LIMIT_CLIENT_HEADER:
+        header = main_config.RATE_LIMIT_CLIENT_HEADER.lower().encode()
+
+        for name, value in scope["headers"]:
+            if name == header:
+                return value.decode("latin-1")
+
+    client = scope.get("client")
+
+    return client[0] if client else "unknown"
+
+
+class AdmissionMiddleware:
+    """
+    Plain ASGI middleware, the slot is held until the last chunk of a streamed response is sent unless
+    the request gives it up through scope["admission"].
+    Rejected requests never reach a route or the pool: 429 for a client over its rate limit,
+    503 once the wait for admission exceeds ADMISSION_QUEUE_TIMEOUT, both with Retry-After
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        name = route_class(scope["method"], scope["path"]) if scope["type"] == "http" else None
+
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        if self.controller.buckets:
+            wait = self.controller.buckets.take(_client_key(scope))
+
+            if wait:
+                admission_decisions.inc(name, "rate_limited")
+                await self._reject(scope, receive, send, 429, "Rate limit exceeded", wait)
+                return
+
+        limiter = self.controller.limiters[name]
+        started = time.perf_counter()
+        immediate = not limiter.waiters and limiter.has_room()
+
+        if not await limiter.acquire(self.controller.queue_timeout):
+            admission_decisions.inc(name, "shed")
+            admission_queue_wait.observe(time.perf_counter() - started, name)
+            await self._reject(scope, receive, send, 503, "Server busy, retry later", self.controller.queue_timeout)
+            return
+
+        admission_decisions.inc(name, "admitted" if immediate else "queued")
+        admission_queue_wait.observe(time.perf_counter() - started, name)
+        slot = scope["admission"] = AdmissionSlot(self.controller, limiter)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            slot.release()
+
+    @staticmethod
+    async def _reject(scope, receive, send, status: int, detail: str, retry_after: float) -> None:
+        response = JSONResponse(
+            {"detail": detail},
+            status_code=status,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
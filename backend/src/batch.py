@@ -0,0 +1,31 @@
+from typing import Generic, TypeVar, List
+
+from pydantic import BaseModel, Field
+
+
+T = TypeVar("T")
+
+# Upper bound for the ids/items of one batch request, keeps the IN (...) lists reasonable
+MAX_BATCH_SIZE = 1000
+
+
+class BatchIdsSchema(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class BatchResponse(BaseModel, Generic[T]):
+    items: List[T]
+    # Requested ids that don't exist, in request order
+    not_found: List[int]
+
+
+class BatchDeleteResponseSchema(BaseModel):
+    deleted: List[int]
+    not_found: List[int]
+
+
+def missing_ids(requested: List[int], found) -> List[int]:
+    found = set(found)
+
+    # dict.fromkeys drops repeated ids but keeps the request order
+    return [item_id for item_id in dict.fromkeys(requested) if item_id not in found]
@@ -0,0 +1,74 @@
+import logging
+from itertools import islice
+from typing import Iterable, Sequence, Any, Tuple
+
+from sqlalchemy import Table, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Dialects whose insert() construct supports ON CONFLICT
+CONFLICT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+# Rows sent per COPY / multi-row INSERT, also the point where we yield back to the event loop
+BULK_BATCH_SIZE = 10000
+
+
+async def bulk_insert(
+        db: AsyncSession,
+        table: Table,
+        columns: Sequence[str],
+        rows: Iterable[Tuple[Any, ...]],
+        batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """
+    Write `rows` (tuples ordered like `columns`) into `table` and return how many were written.
+    On asyncpg the rows are streamed through the binary COPY protocol, any other driver gets
+    multi-row INSERTs. `rows` is consumed lazily one batch at a time, so it can be a generator
+    of any length. Runs inside the session's transaction, committing is up to the caller.
+    Python-side column defaults are NOT applied, every non-nullable column must be in `columns`.
+    """
+    rows = iter(rows)
+    written = 0
+
+    if db.bind.dialect.driver == "asyncpg":
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        # The adapted connection wraps the real asyncpg one, which is the only thing that speaks COPY
+        asyncpg_connection = raw_connection.driver_connection
+
+        # The adapter only opens its transaction with the first statement it runs. A COPY sent before
+        # that would commit on its own and survive the caller's rollback, so a statement goes first
+        if not asyncpg_connection.is_in_transaction():
+            await connection.exec_driver_sql("SELECT 1")
+
+        while batch := list(islice(rows, batch_size)):
+            await asyncpg_connection.copy_records_to_table(
+                table.name,
+                records=batch,
+                columns=list(columns),
+                schema_name=table.schema,
+            )
+            written += len(batch)
+    else:
+        while batch := list(islice(rows, batch_size)):
+            await db.execute(insert(table), [dict(zip(columns, row)) for row in batch])
+            written += len(batch)
+
+    logger.info(f"Bulk insert wrote {written} rows into {table.name}")
+
+    return written
+
+
+def conflict_insert(db: AsyncSession, target):
+    """insert() of the session's dialect, the one that has on_conflict_do_nothing()"""
+    dialect = db.bind.dialect.name
+
+    if dialect not in CONFLICT_INSERTS:
+        raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
+
+    return CONFLICT_INSERTS[dialect](target)
@@ -0,0 +1,164 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional, Dict, Tuple, Type
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.config import settings as main_config
+
+
+class CacheBackend(ABC):
+    """
+    Storage behind EntityCache. Values are plain dicts of column values, so a shared backend
+    (redis, memcached) only has to serialize them, no ORM objects ever cross the boundary.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        ...
+
+
+class LRUCacheBackend(CacheBackend):
+    """In-process backend, least recently used entries go first once max_entries is reached"""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (value, monotonic expiry time), ordered from least to most recently used
+        self._entries: OrderedDict[str, Tuple[dict, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return value
+
+    async def set(self, key: str, value: dict) -> None:
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class EntityCache:
+    """
+    Read-through cache for rows looked up by primary key.
+    Services call get() before querying and set() with what they loaded. Every write calls
+    invalidate() with the exact keys it touched after committing.
+    """
+
+    def __init__(self, backend: CacheBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        # Bumped by every invalidation, a load that overlapped one must not be cached
+        # because it may have read the row before the write committed
+        self.epoch = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+
+        return await self.backend.get(key)
+
+    async def set(self, key: str, value: dict, epoch: int) -> None:
+        if self.enabled and epoch == self.epoch:
+            await self.backend.set(key, value)
+
+    async def invalidate(self, *keys: str) -> None:
+        self.epoch += 1
+
+        if self.enabled:
+            await self.backend.delete(*keys)
+
+    def stats(self) -> Dict[str, int]:
+        return self.backend.stats()
+
+
+def entity_to_dict(instance: Any) -> dict:
+    """Column values of an ORM object, the form entities are cached in"""
+    return {attr.key: getattr(instance, attr.key) for attr in inspect(instance).mapper.column_attrs}
+
+
+def detached_entity(model: Type, data: dict) -> Any:
+    # Built as if it was loaded by a query and the session closed, so it carries no pending changes
+    instance = model(**data)
+    make_transient_to_detached(instance)
+
+    return instance
+
+
+async def attach_entity(db: AsyncSession, model: Type, data: dict, **relationships: list) -> Any:
+    """
+    Turn cached column values back into an ORM object owned by `db`, without a SELECT.
+    `relationships` are already detached objects set as loaded collections.
+    Every request gets its own instance, nothing mutable is shared through the cache.
+    """
+    instance = detached_entity(model, data)
+
+    for name, value in relationships.items():
+        set_committed_value(instance, name, value)
+
+    return await db.merge(instance, load=False)
+
+
+def ticket_key(ticket_id: int) -> str:
+    return f"ticket:{ticket_id}"
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+entity_cache = EntityCache(
+    LRUCacheBackend(max_entries=main_config.CACHE_MAX_ENTRIES, ttl=main_config.CACHE_TTL),
+    enabled=main_config.CACHE_ENABLED,
+)
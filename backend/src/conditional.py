@@ -0,0 +1,89 @@
+from datetime import datetime, UTC, timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional
+
+from fastapi import Header, HTTPException, Request, Response
+
+# updated_at is the version of a row, its ETag is the number of microseconds since this instant
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def _aware(updated_at: datetime) -> datetime:
+    # SQLite hands timestamps back without their zone, they are stored in UTC
+    return updated_at if updated_at.tzinfo else updated_at.replace(tzinfo=UTC)
+
+
+def entity_tag(updated_at: datetime) -> str:
+    return f'"{(_aware(updated_at) - EPOCH) // timedelta(microseconds=1)}"'
+
+
+def _tag_version(tag: str) -> Optional[datetime]:
+    """updated_at a strong tag stands for, None for weak or foreign tags"""
+    tag = tag.strip()
+
+    if len(tag) < 3 or tag[0] != '"' or tag[-1] != '"' or not tag[1:-1].isdigit():
+        return None
+
+    return EPOCH + timedelta(microseconds=int(tag[1:-1]))
+
+
+def validators(updated_at: datetime) -> Dict[str, str]:
+    return {
+        "ETag": entity_tag(updated_at),
+        "Last-Modified": format_datetime(_aware(updated_at).astimezone(UTC), usegmt=True),
+    }
+
+
+def set_validators(response: Response, updated_at: datetime) -> None:
+    response.headers.update(validators(updated_at))
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def check_not_modified(request: Request, updated_at: datetime) -> None:
+    """
+    Raises 304 when the client's copy is current. If-None-Match wins over If-Modified-Since,
+    and compares weakly, a W/ prefix is ignored
+    """
+    if_none_match = request.headers.get("if-none-match")
+
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        fresh = "*" in tags or entity_tag(updated_at) in tags
+    else:
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+        except (TypeError, ValueError):
+            return
+
+        # Last-Modified only has whole seconds
+        fresh = _aware(updated_at).replace(microsecond=0) <= _aware(since)
+
+    if fresh:
+        raise HTTPException(304, headers=validators(updated_at))
+
+
+def if_match_versions(
+        if_match: Optional[str] = Header(
+            None, description="ETag the change is based on, answered with 412 when the resource moved on"),
+) -> Optional[List[datetime]]:
+    """
+    updated_at values a PUT/PATCH may overwrite, None when any version will do (no header or `*`).
+    Weak and unknown tags never match, they end up as an empty list and a 412
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+
+    versions = (_tag_version(tag) for tag in if_match.split(","))
+
+    return [version for version in versions if version is not None]
+
+
+def matches_expected(updated_at: datetime, expected: List[datetime]) -> bool:
+    return _aware(updated_at) in expected
+
+
+def precondition_failed() -> HTTPException:
+    return HTTPException(412, "The resource was changed since the given ETag")
@@ -1,3 +1,5 @@
+from typing import Dict, List, Literal
+
 from cachetools.func import lru_cache
 from pydantic_settings import BaseSettings
 
@@ -6,11 +8,81 @@ class Settings(BaseSettings):
     APP_NAME: str = "Ticketing System Gateway"
     APP_VERSION: str = "1.0.0"
 
+    # PostgreSQL (asyncpg) in production, SQLite (aiosqlite) for local runs; ticket and idempotency writes rely on
+    # INSERT ... ON CONFLICT, any other database is refused at startup
     DATABASE_URL: str
+    # read replicas, as a JSON list in the env: DATABASE_REPLICA_URLS='["postgresql+asyncpg://..."]'
+    DATABASE_REPLICA_URLS: List[str] = []
+    # how GET requests pick a replica: round_robin or least_busy (fewest checked out connections)
+    REPLICA_BALANCING: Literal["round_robin", "least_busy"] = "round_robin"
+    # seconds a client keeps reading from the primary after its own write, 0 turns it off
+    READ_YOUR_WRITES_WINDOW: float = 0
+    # apply pending migrations in the lifespan instead of only checking the schema version, for local development
+    MIGRATE_ON_STARTUP: bool = False
+    # pool of the primary and of every replica, per process
     POOL_SIZE: int = 10
     MAX_OVERFLOW: int = 15
+    # connections all workers together may hold to each database, split evenly between them and in the
+    # POOL_SIZE:MAX_OVERFLOW proportion; 0 keeps POOL_SIZE/MAX_OVERFLOW per process
+    DB_CONNECTION_BUDGET: int = 0
+    # open the whole pool before the process accepts traffic
+    POOL_WARMUP: bool = True
+    # seconds a shutdown waits for checked out connections to come back before closing the pools
+    POOL_DRAIN_TIMEOUT: float = 5
+    # processes started by `python -m src.server`, 0 means one per CPU core. The launcher exports the
+    # resolved number, so every worker knows its share of DB_CONNECTION_BUDGET
+    WORKERS: int = 0
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    # seconds a worker keeps serving in-flight requests after SIGTERM
+    GRACEFUL_SHUTDOWN_TIMEOUT: int = 30
     EXPIRE_ON_COMMIT : bool = False
-    SQL_ECHO: bool = True
+    # echo writes every statement to stdout synchronously, debugging only, /metrics has the timings
+    SQL_ECHO: bool = False
+    # seconds before the in-process row count used by ?count=cached is re-read from the database
+    COUNT_CACHE_TTL: int = 300
+    # concurrent background jobs per process, each one holds a pooled connection while it writes
+    JOB_WORKERS: int = 2
+    # seconds without progress after which a running job of another (dead) process is taken over
+    JOB_STALE_AFTER: int = 300
+    # seconds a shutdown waits for running jobs to commit their current batch before cancelling them
+    JOB_SHUTDOWN_GRACE: int = 10
+    # POST /tickets writes are collected for up to GROUP_COMMIT_WINDOW seconds or GROUP_COMMIT_MAX_ROWS rows
+    # and written by one INSERT and one commit, trades a few ms of latency for far fewer commits
+    TICKET_GROUP_COMMIT: bool = False
+    GROUP_COMMIT_WINDOW: float = 0.005
+    GROUP_COMMIT_MAX_ROWS: int = 500
+    # seconds a response stored for an Idempotency-Key is replayed to retries of the same request
+    IDEMPOTENCY_TTL: int = 86400
+    # seconds a duplicate waits for the first request with its key to finish, answered with 409 after that
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 30
+    # seconds after which a key whose request never finished (crashed worker) may be claimed again
+    IDEMPOTENCY_LOCK_TIMEOUT: int = 300
+    # read-through cache of tickets/users looked up by id
+    CACHE_ENABLED: bool = True
+    CACHE_TTL: int = 30
+    CACHE_MAX_ENTRIES: int = 10000
+    # concurrent identical reads (ticket/user by id, counts) share one query instead of one connection each
+    SINGLE_FLIGHT_ENABLED: bool = True
+    # scrypt cost (n, power of two) and the threads password hashing may occupy per process
+    PASSWORD_HASH_COST: int = 2 ** 14
+    PASSWORD_HASH_WORKERS: int = 4
+    # requests of one route class (read, write, heavy) in flight at once per process, queued beyond that;
+    # classes left out get the pool capacity, heavy a quarter of it. The classes using a pool also share its
+    # capacity, so all of them together never exceed it. JSON in the env: ADMISSION_LIMITS='{"heavy": 2}'
+    ADMISSION_CONTROL: bool = True
+    ADMISSION_LIMITS: Dict[str, int] = {}
+    # seconds a request may wait for admission (or a saturated pool) before it's shed with 503
+    ADMISSION_QUEUE_TIMEOUT: float = 0.5
+    # per-client token bucket, 0 turns it off. Clients are told apart by RATE_LIMIT_CLIENT_HEADER
+    # (e.g. X-API-Key) or, without it, by their address
+    RATE_LIMIT_PER_SECOND: float = 0
+    RATE_LIMIT_BURST: int = 20
+    RATE_LIMIT_CLIENT_HEADER: str = ""
+    # request, statement and pool metrics served at /metrics, off means no hooks are installed at all
+    METRICS_ENABLED: bool = True
+    # statements taking at least this many seconds are logged and counted as slow
+    SLOW_QUERY_SECONDS: float = 0.5
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,82 @@
+import time
+from typing import Dict, Tuple, Optional
+
+from sqlalchemy import Select, select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings as main_config
+from src.singleflight import count_flights
+
+
+async def exact_count(db: AsyncSession, query: Select) -> int:
+    """
+    count(*) over whatever the listing query selects, ordering/limits are dropped.
+    Concurrent counts of the same statement and parameters on the same database share one query
+    """
+    count_query = select(func.count()).select_from(query.order_by(None).limit(None).offset(None).subquery())
+    compiled = count_query.compile(dialect=db.bind.dialect)
+    key = (db.bind, str(compiled), repr(sorted(compiled.params.items())))
+
+    async def load() -> int:
+        result = await db.execute(count_query)
+
+        return result.scalar()
+
+    return await count_flights.do(key, load)
+
+
+async def estimated_count(db: AsyncSession, table_name: str) -> Optional[int]:
+    """
+    Row estimate from planner statistics, costs one catalog lookup instead of a table scan.
+    Returns None when the estimate is not available (other dialects, table never analyzed)
+    """
+    if db.bind.dialect.name != "postgresql":
+        return None
+
+    result = await db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table_name AS regclass)"),
+        {"table_name": table_name},
+    )
+    estimate = result.scalar()
+
+    # reltuples is -1 until the table is vacuumed/analyzed for the first time
+    if estimate is None or estimate < 0:
+        return None
+
+    return estimate
+
+
+class RowCounter:
+    """
+    In-process row counts per table. Seeded with one count(*) and then kept up to date by
+    the services on every create/delete. Other workers don't see our writes, so the seed
+    is refreshed every COUNT_CACHE_TTL seconds to bound the drift.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        # table name -> (count, monotonic time when it was seeded)
+        self._counts: Dict[str, Tuple[int, float]] = {}
+
+    async def get(self, db: AsyncSession, table_name: str, query: Select) -> int:
+        cached = self._counts.get(table_name)
+
+        if cached and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+
+        total = await exact_count(db, query)
+        self._counts[table_name] = (total, time.monotonic())
+
+        return total
+
+    def add(self, table_name: str, delta: int) -> None:
+        cached = self._counts.get(table_name)
+
+        if cached:
+            self._counts[table_name] = (max(cached[0] + delta, 0), cached[1])
+
+    def invalidate(self, table_name: str) -> None:
+        self._counts.pop(table_name, None)
+
+
+row_counter = RowCounter(ttl=main_config.COUNT_CACHE_TTL)
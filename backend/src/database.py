@@ -1,17 +1,91 @@
-from typing import Annotated
+import asyncio
+import itertools
+import math
+import time
+from typing import Annotated, List, Tuple
 
-from fastapi import Depends
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from fastapi import Depends, Request, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 from sqlalchemy.orm import declarative_base
 
+from src.bulk import CONFLICT_INSERTS
 from src.config import settings as main_config
+from src.metrics import TimedQueuePool, instrument_engine
+
+# Requests with these methods only read, they are served by a replica when there is one
+READ_ONLY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Set on write responses while READ_YOUR_WRITES_WINDOW is on, holds the unix time until which
+# the client's reads stay on the primary
+PRIMARY_UNTIL_COOKIE = "db_primary_until"
+
+# SQLSTATE of a foreign key violation
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    """asyncpg reports the SQLSTATE, SQLite only a message"""
+    sqlstate = getattr(error.orig, "sqlstate", None)
+
+    if sqlstate is not None:
+        return sqlstate == FOREIGN_KEY_VIOLATION
+
+    return "FOREIGN KEY" in str(error.orig).upper()
+
+
+def pool_limits(workers: int) -> Tuple[int, int]:
+    """pool_size and max_overflow of one of `workers` processes"""
+    if not main_config.DB_CONNECTION_BUDGET:
+        return main_config.POOL_SIZE, main_config.MAX_OVERFLOW
+
+    share = main_config.DB_CONNECTION_BUDGET // workers
+
+    if share < 1:
+        raise ValueError(f"DB_CONNECTION_BUDGET={main_config.DB_CONNECTION_BUDGET} can't give {workers} workers a connection each")
+
+    # Same steady/burst proportion as the unbudgeted settings, at least one steady connection
+    pool_size = max(1, share * main_config.POOL_SIZE // (main_config.POOL_SIZE + main_config.MAX_OVERFLOW))
+
+    return pool_size, share - pool_size
+
+
+# Processes started without the launcher (plain uvicorn, scripts) don't share the budget
+POOL_SIZE, MAX_OVERFLOW = pool_limits(main_config.WORKERS or 1)
+
+
+def _create_engine(url: str, name: str) -> AsyncEngine:
+    options = {}
+
+    if main_config.METRICS_ENABLED:
+        # The pool's logging name labels its metrics, it survives the pool being recreated by dispose()
+        options = {"poolclass": TimedQueuePool, "pool_logging_name": name}
+
+    new_engine = create_async_engine(
+        url,
+        echo=main_config.SQL_ECHO,  # printing SQL Queries (good for debugging)
+        pool_size=POOL_SIZE,  # connection pool size
+        max_overflow=MAX_OVERFLOW,  # max extra connections
+        **options,
+    )
+
+    if main_config.METRICS_ENABLED:
+        instrument_engine(new_engine, name)
+
+    return new_engine
+
+
+engine = _create_engine(main_config.DATABASE_URL, "primary")
+
+# Every ticket write upserts ticket_stats with ON CONFLICT, refuse to start rather than fail mid-write
+if engine.dialect.name not in CONFLICT_INSERTS:
+    raise ValueError(
+        f"DATABASE_URL uses {engine.dialect.name}, only {' and '.join(sorted(CONFLICT_INSERTS))} are supported")
+# Every replica gets its own pool of the same size as the primary's
+replica_engines = [
+    _create_engine(url, f"replica{number}") for number, url in enumerate(main_config.DATABASE_REPLICA_URLS)
+]
 
-engine = create_async_engine(
-    main_config.DATABASE_URL,
-    echo=main_config.SQL_ECHO,  # printing SQL Queries (good for debugging)
-    pool_size=main_config.POOL_SIZE,  # connection pool size
-    max_overflow=main_config.MAX_OVERFLOW,  # max extra connections
-)
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
@@ -24,8 +98,69 @@ AsyncSessionLocal = async_sessionmaker(
 Base = declarative_base()
 
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
+class ReplicaRouter:
+    """
+    Picks the engine a read-only session is bound to. Without replicas every read goes to the primary.
+    round_robin rotates through the replicas, least_busy takes the one with the fewest checked out
+    connections (ties go round robin, so an idle cluster still spreads the load).
+    """
+
+    def __init__(self, primary: AsyncEngine, replicas: List[AsyncEngine], balancing: str):
+        self.primary = primary
+        self.replicas = replicas
+        self.balancing = balancing
+        self._turn = itertools.count()
+
+    def choose(self) -> AsyncEngine:
+        if not self.replicas:
+            return self.primary
+
+        start = next(self._turn) % len(self.replicas)
+        rotated = self.replicas[start:] + self.replicas[:start]
+
+        if self.balancing == "least_busy":
+            return min(rotated, key=lambda replica: replica.pool.checkedout())
+
+        return rotated[0]
+
+
+replica_router = ReplicaRouter(engine, replica_engines, main_config.REPLICA_BALANCING)
+
+
+def on_primary(db: AsyncSession) -> bool:
+    """False for a session on a replica, whose rows may lag behind the primary and must not be cached"""
+    return db.bind is engine
+
+
+def read_session() -> AsyncSession:
+    """Session on a replica, for reads that run outside a request (e.g. streamed exports)"""
+    return AsyncSessionLocal(bind=replica_router.choose())
+
+
+def _pinned_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_UNTIL_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_db(request: Request, response: Response):
+    # Reads go to a replica unless the client wrote within READ_YOUR_WRITES_WINDOW, writes always go to the primary
+    if request.method in READ_ONLY_METHODS:
+        bind = engine if _pinned_to_primary(request) else replica_router.choose()
+    else:
+        bind = engine
+
+        if main_config.READ_YOUR_WRITES_WINDOW and replica_engines:
+            window = main_config.READ_YOUR_WRITES_WINDOW
+            response.set_cookie(
+                PRIMARY_UNTIL_COOKIE,
+                str(time.time() + window),
+                max_age=math.ceil(window),
+                httponly=True,
+            )
+
+    async with AsyncSessionLocal(bind=bind) as session:
         try:
             # yield is used here to kinda pause the function and then resume from the place it stopped
             # useful for closing the connection for db after route handler executes even if fails
@@ -34,4 +169,27 @@ async def get_db():
             await session.close()
 
 
+async def _open_and_return(pooled_engine: AsyncEngine) -> None:
+    async with pooled_engine.connect():
+        pass
+
+
+async def warm_pools() -> None:
+    """Open the steady connections of every pool at once, so the first requests don't pay for the connects"""
+    for pooled_engine in (engine, *replica_engines):
+        # All of them are checked out together, otherwise the pool would hand the same connection back every time
+        await asyncio.gather(*(_open_and_return(pooled_engine) for _ in range(pooled_engine.pool.size())))
+
+
+async def dispose_engines(timeout: float = 0) -> None:
+    """Waits up to `timeout` seconds for checked out connections to be returned, then closes every pool"""
+    deadline = time.monotonic() + timeout
+
+    for pooled_engine in (engine, *replica_engines):
+        while pooled_engine.pool.checkedout() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        await pooled_engine.dispose()
+
+
 DB_Session = Annotated[AsyncSession, Depends(get_db)]
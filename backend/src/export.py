@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+from enum import Enum
+from typing import AsyncIterator, Sequence
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, Row
+
+from src.database import read_session
+
+# Rows fetched from the server-side cursor per round trip, every batch is flushed to the client right away
+EXPORT_BATCH_SIZE = 2000
+
+
+class FileFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+MEDIA_TYPES = {
+    FileFormat.NDJSON: "application/x-ndjson",
+    FileFormat.CSV: "text/csv",
+}
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _ndjson(rows: Sequence[Row]) -> str:
+    return "".join(json.dumps({key: _plain(value) for key, value in row._mapping.items()}) + "\n" for row in rows)
+
+
+def _csv(rows: Sequence[Row]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_plain(value) for value in row] for row in rows)
+
+    return buffer.getvalue()
+
+
+async def stream_rows(query: Select, export_format: FileFormat) -> AsyncIterator[str]:
+    """
+    Run `query` on a server-side cursor and yield it serialized batch by batch.
+    The dump is a single SELECT, so it reads one consistent snapshot however long streaming takes.
+    Opens its own session (on a replica when there is one) because it outlives the request handler.
+    """
+    if export_format == FileFormat.CSV:
+        yield _csv([query.selected_columns.keys()])
+
+    serialize = _csv if export_format == FileFormat.CSV else _ndjson
+
+    async with read_session() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+        async for rows in result.partitions():
+            yield serialize(rows)
+
+
+def export_response(query: Select, name: str, export_format: FileFormat) -> StreamingResponse:
+    extension = "csv" if export_format == FileFormat.CSV else "ndjson"
+
+    return StreamingResponse(
+        stream_rows(query, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'},
+    )
@@ -0,0 +1,38 @@
+# POST endpoints whose Idempotency-Key header is honored
+IDEMPOTENT_ROUTES = frozenset({
+    ("POST", "/tickets"),
+    ("POST", "/tickets/bulk"),
+    ("POST", "/users"),
+})
+
+# Response headers not stored for a replay: hop-by-hop ones, those the replayed response sets itself
+# and content-type, which has a column of its own
+REPLAYED_HEADERS_EXCLUDED = frozenset({
+    b"connection",
+    b"keep-alive",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"te",
+    b"trailer",
+    b"transfer-encoding",
+    b"upgrade",
+    b"content-length",
+    b"content-type",
+    b"date",
+    b"server",
+})
+
+# Longest Idempotency-Key accepted, UUIDs and the like fit easily
+MAX_KEY_LENGTH = 255
+
+# How often a waiting duplicate looks at the key again when the first request runs in another process
+WAIT_POLL_INTERVAL = 0.1
+
+# Seconds between two purges of expired keys by the same process
+PURGE_INTERVAL = 60
+
+# Outcomes of IdempotencyStore.claim()
+CLAIMED = "claimed"
+COMPLETED = "completed"
+IN_PROGRESS = "in_progress"
+MISMATCH = "mismatch"
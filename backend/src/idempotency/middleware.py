@@ -0,0 +1,179 @@
+import hashlib
+import math
+from typing import List, Optional
+
+from starlette.responses import JSONResponse, Response
+
+from src.config import settings as main_config
+from src.idempotency.constants import IDEMPOTENT_ROUTES, REPLAYED_HEADERS_EXCLUDED, MAX_KEY_LENGTH, CLAIMED, \
+    COMPLETED, IN_PROGRESS, MISMATCH
+from src.idempotency.service import IdempotencyStore, idempotency_store
+from src.metrics import Counter
+
+idempotent_requests = Counter(
+    "idempotent_requests_total", "Requests with an Idempotency-Key that ran, were replayed or refused",
+    ("outcome",))
+
+# Not a result of the request itself, the client should get the chance to retry it
+UNSTORED_STATUSES = frozenset({408, 429})
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for header, value in scope["headers"]:
+        if header == name:
+            return value.decode("latin-1")
+
+    return None
+
+
+class IdempotencyMiddleware:
+    """
+    Plain ASGI middleware for the create endpoints in IDEMPOTENT_ROUTES. A request with an
+    Idempotency-Key header runs once per key and request body: a retry gets the stored response
+    back with its headers (marked with Idempotent-Replayed), a duplicate arriving while the first
+    request still runs waits for its response for up to IDEMPOTENCY_WAIT_TIMEOUT and then gets 409
+    with Retry-After, and the key reused with a different body gets 422. Server errors are not
+    stored, the key is released and the request may be retried. Requests without the header are
+    not touched. Runs inside admission control; a waiting duplicate gives its admission slot up while
+    it waits and gets 503 should it have to run the request itself and find no slot again
+    """
+
+    def __init__(self, app, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        path = (scope["path"].rstrip("/") or "/") if scope["type"] == "http" else None
+
+        if path is None or (scope["method"], path) not in IDEMPOTENT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        client_key = _header(scope, b"idempotency-key")
+
+        if client_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not client_key or len(client_key) > MAX_KEY_LENGTH:
+            await JSONResponse(
+                {"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"}, status_code=400,
+            )(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        key = f"{scope['method']} {path} {client_key}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        outcome, record = await self.store.claim(key, fingerprint)
+
+        if outcome == IN_PROGRESS:
+            slot = scope.get("admission")
+
+            # Waiting holds no connection, the slot may serve other requests meanwhile
+            if slot is not None:
+                slot.release()
+
+            outcome, record = await self.store.wait(key, fingerprint, main_config.IDEMPOTENCY_WAIT_TIMEOUT)
+
+            # The first request failed and gave the key up, this one runs it and needs a slot again
+            if outcome == CLAIMED and slot is not None and not await slot.reacquire():
+                await self.store.release(key)
+                idempotent_requests.inc("shed")
+                await JSONResponse(
+                    {"detail": "Server busy, retry later"},
+                    status_code=503,
+                    headers={"Retry-After": str(max(1, math.ceil(slot.controller.queue_timeout)))},
+                )(scope, receive, send)
+                return
+
+        if outcome == COMPLETED:
+            idempotent_requests.inc("replayed")
+            response = Response(
+                record.body,
+                status_code=record.status_code,
+                headers={"Idempotent-Replayed": "true"},
+                media_type=record.content_type,
+            )
+            # Appended as they were sent, repeated ones like Set-Cookie included
+            response.raw_headers.extend(
+                (name.encode("latin-1"), value.encode("latin-1")) for name, value in record.headers or ())
+            await response(scope, receive, send)
+        elif outcome == MISMATCH:
+            idempotent_requests.inc("mismatch")
+            await JSONResponse(
+                {"detail": "Idempotency-Key was already used for a different request"}, status_code=422,
+            )(scope, receive, send)
+        elif outcome == IN_PROGRESS:
+            idempotent_requests.inc("conflict")
+            await JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still in progress"},
+                status_code=409,
+                headers={"Retry-After": str(max(1, math.ceil(main_config.IDEMPOTENCY_WAIT_TIMEOUT)))},
+            )(scope, receive, send)
+        else:
+            idempotent_requests.inc("executed")
+            await self._run(scope, receive, send, body, key)
+
+    async def _run(self, scope, receive, send, body: bytes, key: str) -> None:
+        status_code = 500
+        content_type = None
+        headers: List[List[str]] = []
+        chunks: List[bytes] = []
+        replayed = False
+
+        async def replay_body():
+            nonlocal replayed
+
+            # After the body only the disconnect is left to wait for
+            if replayed:
+                return await receive()
+
+            replayed = True
+
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture(message):
+            nonlocal status_code, content_type
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = _header(message, b"content-type")
+                headers.extend(
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", ())
+                    if name.lower() not in REPLAYED_HEADERS_EXCLUDED
+                )
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, capture)
+        except BaseException:
+            # Also on cancellation (client gone): the request did not finish, a retry has to run it
+            await self.store.release(key)
+            raise
+
+        if status_code >= 500 or status_code in UNSTORED_STATUSES:
+            await self.store.release(key)
+        else:
+            await self.store.complete(key, status_code, content_type, headers, b"".join(chunks))
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+
+        while True:
+            message = await receive()
+
+            if message["type"] != "http.request":
+                break
+
+            chunks.append(message.get("body", b""))
+
+            if not message.get("more_body", False):
+                break
+
+        return b"".join(chunks)
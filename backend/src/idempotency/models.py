@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, Index, JSON
+
+from src.database import Base
+
+
+class IdempotencyKey(Base):
+    """
+    Response of a request sent with an Idempotency-Key, replayed to its retries until expires_at.
+    status_code is NULL while the first request is still running, locked_until bounds how long
+    a request that never finished (crashed worker) keeps the key
+    """
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        # Expired keys are purged in batches
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    # "<method> <path> <client key>", the same client key may be used on different endpoints
+    key = Column(String, primary_key=True)
+    # sha256 of the request body, a key reused for a different request is refused
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    content_type = Column(String, nullable=True)
+    # [name, value] pairs of the other response headers worth replaying, see REPLAYED_HEADERS_EXCLUDED
+    headers = Column(JSON, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
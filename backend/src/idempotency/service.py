@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, UTC, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, delete, or_, and_
+
+from src.bulk import conflict_insert
+from src.config import settings as main_config
+from src.database import AsyncSessionLocal
+from src.idempotency.constants import CLAIMED, COMPLETED, IN_PROGRESS, MISMATCH, WAIT_POLL_INTERVAL, \
+    PURGE_INTERVAL
+from src.idempotency.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStore:
+    """
+    Keys live in the database, so retries and duplicates are recognised by every worker process.
+    A key is claimed by inserting it without a response, the claimer runs the request and stores the
+    response with complete() or gives the key up with release(). Keys expire `ttl` seconds after their
+    response was stored and are purged lazily; a key still without a response after `lock_timeout`
+    seconds (its worker died) may be claimed again.
+
+    Every call uses a short session of its own, no connection is held while the request runs or a
+    duplicate waits.
+    """
+
+    def __init__(self, ttl: int, lock_timeout: int):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        # key -> set once the request this process runs with it finished
+        self._running: Dict[str, asyncio.Event] = {}
+        self._purged_at = 0.0
+
+    async def claim(self, key: str, fingerprint: str) -> Tuple[str, Optional[IdempotencyKey]]:
+        """CLAIMED when the caller has to run the request, otherwise the outcome and the stored key"""
+        now = datetime.now(UTC)
+        values = {
+            "fingerprint": fingerprint,
+            "status_code": None,
+            "content_type": None,
+            "headers": None,
+            "body": None,
+            "locked_until": now + timedelta(seconds=self.lock_timeout),
+            "expires_at": now + timedelta(seconds=self.ttl),
+        }
+
+        async with AsyncSessionLocal() as db:
+            await self._purge_expired(db, now)
+
+            while True:
+                claimed = await db.scalar(
+                    conflict_insert(db, IdempotencyKey)
+                    .values(key=key, **values)
+                    .on_conflict_do_nothing(index_elements=[IdempotencyKey.key])
+                    .returning(IdempotencyKey.key)
+                )
+
+                if claimed is None:
+                    # Expired, or abandoned by a request that never finished
+                    claimed = await db.scalar(
+                        update(IdempotencyKey)
+                        .where(
+                            IdempotencyKey.key == key,
+                            or_(
+                                IdempotencyKey.expires_at < now,
+                                and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.locked_until < now),
+                            ),
+                        )
+                        .values(**values)
+                        .returning(IdempotencyKey.key)
+                    )
+
+                if claimed is not None:
+                    await db.commit()
+                    self._running[key] = asyncio.Event()
+
+                    return CLAIMED, None
+
+                record = await db.scalar(select(IdempotencyKey).where(IdempotencyKey.key == key))
+                await db.commit()
+
+                # Released or purged in between, try again
+                if record is None:
+                    continue
+
+                if record.fingerprint != fingerprint:
+                    return MISMATCH, record
+
+                return (COMPLETED if record.status_code is not None else IN_PROGRESS), record
+
+    async def wait(self, key: str, fingerprint: str, timeout: float) -> Tuple[str, Optional[IdempotencyKey]]:
+        """
+        Claims the key again until it is no longer IN_PROGRESS or `timeout` passed. A request run by this
+        process wakes its duplicates as soon as it finishes, one run by another process is polled for
+        """
+        deadline = time.monotonic() + timeout
+
+        while True:
+            remaining = deadline - time.monotonic()
+            running = self._running.get(key)
+
+            try:
+                if running is not None:
+                    await asyncio.wait_for(running.wait(), remaining)
+                else:
+                    await asyncio.sleep(min(remaining, WAIT_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+
+            outcome, record = await self.claim(key, fingerprint)
+
+            if outcome != IN_PROGRESS or deadline <= time.monotonic():
+                return outcome, record
+
+    async def complete(
+            self,
+            key: str,
+            status_code: int,
+            content_type: Optional[str],
+            headers: List[List[str]],
+            body: bytes,
+    ) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(IdempotencyKey)
+                    .where(IdempotencyKey.key == key)
+                    .values(
+                        status_code=status_code,
+                        content_type=content_type,
+                        headers=headers,
+                        body=body,
+                        expires_at=datetime.now(UTC) + timedelta(seconds=self.ttl),
+                    )
+                )
+                await db.commit()
+        finally:
+            self._finished(key)
+
+    async def release(self, key: str) -> None:
+        """Forgets a key whose request failed, a retry runs the request again"""
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    delete(IdempotencyKey)
+                    .where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+                )
+                await db.commit()
+        finally:
+            self._finished(key)
+
+    def _finished(self, key: str) -> None:
+        running = self._running.pop(key, None)
+
+        if running is not None:
+            running.set()
+
+    async def _purge_expired(self, db, now: datetime) -> None:
+        # Every process purges on its own, at most once per PURGE_INTERVAL
+        if time.monotonic() - self._purged_at < PURGE_INTERVAL:
+            return
+
+        self._purged_at = time.monotonic()
+        result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < now))
+        await db.commit()
+
+        if result.rowcount:
+            logger.info(f"Purged {result.rowcount} expired idempotency keys")
+
+
+idempotency_store = IdempotencyStore(main_config.IDEMPOTENCY_TTL, main_config.IDEMPOTENCY_LOCK_TIMEOUT)
@@ -0,0 +1,78 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Optional, Tuple
+
+from fastapi import UploadFile
+from pydantic import ValidationError
+
+from src.export import FileFormat
+
+# Bytes read from the upload at a time, the file itself stays spooled on disk
+READ_CHUNK_SIZE = 64 * 1024
+
+# Per-line outcome of parsing: (line number, record, error), exactly one of record/error is set
+ParsedLine = Tuple[int, Optional[dict], Optional[str]]
+
+
+async def iter_lines(file: UploadFile) -> AsyncIterator[str]:
+    """Decode the upload as UTF-8 and yield it line by line without reading it whole"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+
+    while chunk := await file.read(READ_CHUNK_SIZE):
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+
+        for line in lines:
+            yield line.rstrip("\r")
+
+    pending += decoder.decode(b"", final=True)
+
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def read_records(file: UploadFile, file_format: FileFormat) -> AsyncIterator[ParsedLine]:
+    """
+    Yield every non-blank line of an NDJSON or CSV (header row first) upload as a dict.
+    CSV values are strings, empty cells become None. Quoted CSV values can't span lines.
+    """
+    header = None
+    line_number = 0
+
+    async for line in iter_lines(file):
+        line_number += 1
+
+        if not line.strip():
+            continue
+
+        if file_format == FileFormat.NDJSON:
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+
+            if not isinstance(record, dict):
+                yield line_number, None, "Expected a JSON object"
+                continue
+
+            yield line_number, record, None
+            continue
+
+        values = next(csv.reader([line]))
+
+        if header is None:
+            header = values
+            continue
+
+        if len(values) != len(header):
+            yield line_number, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+
+        yield line_number, {key: value if value != "" else None for key, value in zip(header, values)}, None
+
+
+def describe_validation_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors())
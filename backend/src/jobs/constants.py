@@ -0,0 +1,9 @@
+# Job lifecycle: pending -> running -> completed | failed | cancelled
+# A running job goes back to pending when the process shuts down, so the next start picks it up again
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+UNFINISHED_JOB_STATUSES = (JOB_PENDING, JOB_RUNNING)
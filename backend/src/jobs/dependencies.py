@@ -0,0 +1,16 @@
+from fastapi import HTTPException
+from fastapi.params import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database import get_db
+from src.jobs.models import Job
+from src.jobs.service import job_service
+
+
+async def is_job_id_valid(job_id: int, db: AsyncSession = Depends(get_db)) -> Job:
+    job = await job_service.get_job_by_id(db, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from datetime import datetime, UTC
+
+from src.database import Base
+from src.jobs.constants import JOB_PENDING
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Startup looks for unfinished jobs to resume
+        Index("ix_jobs_status_updated_at", "status", "updated_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default=JOB_PENDING)
+    # Progress is measured in rows, done is bumped in the same transaction that writes them
+    total = Column(Integer, nullable=False)
+    done = Column(Integer, nullable=False, default=0)
+    # Whatever the handler needs to (re)start the job
+    payload = Column(JSON, nullable=False)
+    error = Column(String, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(UTC),
+        nullable=False
+    )
+    # Doubles as a heartbeat, a running job that hasn't moved for JOB_STALE_AFTER seconds is considered orphaned
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(UTC),
+        nullable=False
+    )
@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class JobResponseSchema(BaseModel):
+    id: int
+    kind: str
+    status: str
+    total: int
+    done: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
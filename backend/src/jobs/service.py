@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from datetime import datetime, UTC, timedelta
+from typing import Optional, Callable, Awaitable, Dict, Set
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings as main_config
+from src.database import AsyncSessionLocal
+from src.jobs.constants import JOB_PENDING, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED, \
+    UNFINISHED_JOB_STATUSES
+from src.jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Job], Awaitable[None]]
+
+
+class JobService:
+    async def create_job(self, db: AsyncSession, kind: str, total: int, payload: dict) -> Job:
+        db_job = Job(kind=kind, total=total, payload=payload, status=JOB_PENDING)
+
+        db.add(db_job)
+        await db.commit()
+        await db.refresh(db_job)
+
+        return db_job
+
+    async def get_job_by_id(self, db: AsyncSession, job_id: int) -> Optional[Job]:
+        job_result = await db.execute(
+            select(Job)
+            .where(Job.id == job_id)
+        )
+
+        return job_result.scalar_one_or_none()
+
+    async def cancel_job(self, db: AsyncSession, job: Job) -> Job:
+        # Only the status flips here, the worker notices it on its next add_progress() and stops
+        await db.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status.in_(UNFINISHED_JOB_STATUSES))
+            .values(status=JOB_CANCELLED, updated_at=datetime.now(UTC))
+        )
+        await db.commit()
+        await db.refresh(job)
+
+        return job
+
+    async def add_progress(self, db: AsyncSession, job_id: int, rows: int) -> bool:
+        """
+        Count `rows` as done, meant to run in the transaction that wrote them.
+        Returns False when the job is not running anymore (cancelled), the caller must roll back and stop.
+        """
+        result = await db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == JOB_RUNNING)
+            .values(done=Job.done + rows, updated_at=datetime.now(UTC))
+        )
+
+        return result.rowcount == 1
+
+    async def claim_job(self, db: AsyncSession, job_id: int) -> bool:
+        # Atomic, so a job resumed by several processes at once still runs only once
+        stale_before = datetime.now(UTC) - timedelta(seconds=main_config.JOB_STALE_AFTER)
+        result = await db.execute(
+            update(Job)
+            .where(
+                Job.id == job_id,
+                or_(
+                    Job.status == JOB_PENDING,
+                    and_(Job.status == JOB_RUNNING, Job.updated_at < stale_before),
+                ),
+            )
+            .values(status=JOB_RUNNING, updated_at=datetime.now(UTC))
+        )
+        await db.commit()
+
+        return result.rowcount == 1
+
+    async def finish_job(self, db: AsyncSession, job_id: int, status: str, error: Optional[str] = None) -> None:
+        # A cancelled job stays cancelled
+        await db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == JOB_RUNNING)
+            .values(status=status, error=error, updated_at=datetime.now(UTC))
+        )
+        await db.commit()
+
+
+class JobRunner:
+    """
+    Bounded pool of asyncio workers executing jobs stored in the jobs table.
+    Handlers are registered per job kind and have to commit their work in steps, reporting each
+    step through JobService.add_progress(), so an interrupted job can continue from `done`.
+    Handlers should also return between steps once `is_stopping` is set.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._idle: Set[asyncio.Task] = set()
+        self._running: Set[int] = set()
+        self._stopping = asyncio.Event()
+
+    @property
+    def is_stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    def submit(self, job_id: int) -> None:
+        self._queue.put_nowait(job_id)
+
+    async def start(self) -> None:
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        # Pick up what the previous run left behind, claiming decides who actually runs it
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Job.id)
+                .where(Job.status.in_(UNFINISHED_JOB_STATUSES))
+                .order_by(Job.id)
+            )
+
+            for job_id in result.scalars().all():
+                self.submit(job_id)
+
+    async def stop(self) -> None:
+        self._stopping.set()
+
+        # Idle workers are parked on the queue, busy ones get the grace period to commit their current step
+        for task in self._idle:
+            task.cancel()
+
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=main_config.JOB_SHUTDOWN_GRACE)
+
+            for task in pending:
+                task.cancel()
+
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        self._tasks = []
+        self._idle.clear()
+
+        # The interrupted batch was rolled back, handing the jobs back as pending lets the next start resume them at once
+        if self._running:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Job)
+                    .where(Job.id.in_(self._running), Job.status == JOB_RUNNING)
+                    .values(status=JOB_PENDING, updated_at=datetime.now(UTC))
+                )
+                await db.commit()
+
+            self._running.clear()
+
+    async def _worker(self) -> None:
+        task = asyncio.current_task()
+
+        while not self._stopping.is_set():
+            self._idle.add(task)
+            job_id = await self._queue.get()
+            self._idle.discard(task)
+
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} crashed the worker: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: int) -> None:
+        async with AsyncSessionLocal() as db:
+            if not await job_service.claim_job(db, job_id):
+                return
+
+            job = await job_service.get_job_by_id(db, job_id)
+
+        handler = self._handlers.get(job.kind)
+        self._running.add(job_id)
+
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind '{job.kind}'")
+
+            await handler(job)
+
+            # The handler returned early because of the shutdown, stop() hands the job back as pending
+            if self._stopping.is_set():
+                return
+
+            status, error = JOB_COMPLETED, None
+        except asyncio.CancelledError:
+            # Shutdown, stop() hands the job back as pending
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            status, error = JOB_FAILED, str(e)
+
+        async with AsyncSessionLocal() as db:
+            await job_service.finish_job(db, job_id, status, error)
+
+        self._running.discard(job_id)
+
+
+job_service = JobService()
+job_runner = JobRunner(workers=main_config.JOB_WORKERS)
@@ -2,27 +2,51 @@ from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
-from src.database import engine, Base
-from src.users.router import router as user_router
-from src.tickets.router import router as ticket_router
+from src.admission import AdmissionMiddleware
+from src.cache import entity_cache
+from src.config import settings as main_config
+from src.database import engine, dispose_engines, warm_pools
+from src.idempotency.middleware import IdempotencyMiddleware
+from src.jobs.service import job_runner
+from src.metrics import MetricsMiddleware, registry
+from src.migrations import migrate, check_schema_version
+from src.tickets.batcher import ticket_batcher
+from src.users.utils import password_hasher
 
 # IMPORTANT: Import order matters for cross-references
 # Import schemas to trigger Pydantic model rebuilding for forward references
 # This resolves "TicketResponseSchema" string reference in UserResponseSchema
+# and has to happen before the routers build PaginatedResponse[UserResponseSchema]
 import src.schemas
 
 # Import all models together to resolve SQLAlchemy relationships  
 # This allows User.tickets relationship to find the Ticket class
 import src.models
 
+from src.users.router import router as user_router
+from src.tickets.router import router as ticket_router
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if main_config.MIGRATE_ON_STARTUP:
+        await migrate(engine)
+    else:
+        # One lookup of the stored schema version instead of reflecting every table,
+        # migrations are applied by `python -m src.migrations upgrade` before the app starts
+        await check_schema_version(engine)
+    if main_config.POOL_WARMUP:
+        await warm_pools()
+    # Resumes bulk jobs interrupted by the previous shutdown
+    await job_runner.start()
     yield
-    await engine.dispose()
+    # Creates still collected for a group commit are written before the pools close
+    await ticket_batcher.drain()
+    await job_runner.stop()
+    password_hasher.shutdown()
+    await dispose_engines(timeout=main_config.POOL_DRAIN_TIMEOUT)
 
 
 app = FastAPI(title="Ticketing System", lifespan=lifespan)
@@ -30,5 +54,36 @@ app = FastAPI(title="Ticketing System", lifespan=lifespan)
 app.include_router(user_router)
 app.include_router(ticket_router)
 
+
+@app.get(
+    "/cache/stats",
+    tags=["Cache"],
+    summary="Hit, miss and eviction counters of the entity cache",
+    status_code=200)
+async def get_cache_stats():
+    return entity_cache.stats()
+
+
+# Inside admission control, the key lookups and stores take pool connections like any other write. A duplicate
+# waiting for the first request's response gives its admission slot up meanwhile
+app.add_middleware(IdempotencyMiddleware)
+
+if main_config.ADMISSION_CONTROL:
+    app.add_middleware(AdmissionMiddleware)
+
+# Added last, so it is the outermost middleware and also sees the requests admission control rejects
+if main_config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get(
+        "/metrics",
+        tags=["Metrics"],
+        summary="Request, SQL statement and connection pool metrics in the Prometheus text format",
+        response_class=PlainTextResponse,
+        status_code=200)
+    async def get_metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    # Development only, production runs `python -m src.server`
     uvicorn.run("main:app", host="0.0.0.0", port=4000, reload=True)
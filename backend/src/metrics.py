@@ -0,0 +1,263 @@
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.config import settings as main_config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets, +Inf is implied
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# First word of a statement -> operation label, everything else is counted as OTHER
+STATEMENT_OPERATIONS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """
+    Base of the in-process metrics rendered by /metrics in the Prometheus text format.
+    Everything runs on the event loop thread, so plain dicts are enough, no locking.
+    """
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self.samples()]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """Either set directly or, with `collect`, read only when scraped"""
+    type = "gauge"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            collect: Optional[Callable[[], Iterable[Tuple[Labels, float]]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._collect = collect
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def samples(self) -> Iterable[str]:
+        values = self._collect() if self._collect else self._values.items()
+
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+
+        # Only the bucket the value falls in is bumped, the cumulative counts are built when scraped
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time until the last byte of the response was sent", ("method", "route"))
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress", "Requests currently being handled", ("method",))
+db_statement_duration = Histogram(
+    "db_statement_duration_seconds", "Execution time of SQL statements", ("pool", "operation"))
+db_slow_statements = Counter(
+    "db_slow_statements_total", "Statements slower than SLOW_QUERY_SECONDS", ("pool", "operation"))
+db_pool_wait = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled connection", ("pool",))
+
+# name -> engine, read by the pool gauges at scrape time
+_engines: Dict[str, AsyncEngine] = {}
+
+
+def _pool_gauge(read: Callable) -> Callable[[], Iterable[Tuple[Labels, float]]]:
+    return lambda: [((name, ), read(engine.pool)) for name, engine in _engines.items()]
+
+
+db_pool_size = Gauge(
+    "db_pool_size", "Connections the pool keeps open", ("pool",), collect=_pool_gauge(lambda pool: pool.size()))
+db_pool_checked_out = Gauge(
+    "db_pool_checked_out", "Connections currently in use", ("pool",), collect=_pool_gauge(lambda pool: pool.checkedout()))
+db_pool_overflow = Gauge(
+    "db_pool_overflow", "Connections opened beyond the pool size (negative while below it)", ("pool",),
+    collect=_pool_gauge(lambda pool: pool.overflow()))
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Records how long every checkout waited in db_pool_wait_seconds, labeled with the pool's logging name"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait.observe(time.perf_counter() - started, self.logging_name or "default")
+
+
+def _operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].upper() if words else ""
+
+    return operation if operation in STATEMENT_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """Time every statement `engine` runs and expose its pool gauges under the label pool=`name`"""
+    _engines[name] = engine
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "metrics_started", None)
+
+        if started is None:
+            return
+
+        elapsed = time.perf_counter() - started
+        operation = _operation(statement)
+        db_statement_duration.observe(elapsed, name, operation)
+
+        if elapsed >= main_config.SLOW_QUERY_SECONDS:
+            db_slow_statements.inc(name, operation)
+            logger.warning(f"Slow query on {name} ({elapsed:.3f}s): {statement[:1000]}")
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware, so streamed responses pass through untouched and are timed until their
+    last chunk. Routes are labeled by their template (/tickets/{ticket_id}), unmatched paths share one label
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+
+            await send(message)
+
+        http_requests_in_progress.inc(method)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_progress.dec(method)
+            # Set by the router once a route matched
+            route = scope.get("route")
+            route = getattr(route, "path", "unmatched")
+            http_request_duration.observe(time.perf_counter() - started, method, route)
+            http_requests.inc(method, route, status)
@@ -0,0 +1,4 @@
+# Versioned schema migrations, the scripts live in versions/ and are applied by `python -m src.migrations upgrade`
+from src.migrations.runner import migrate, check_schema_version, SchemaVersionError, LATEST_VERSION
+
+__all__ = ["migrate", "check_schema_version", "SchemaVersionError", "LATEST_VERSION"]
@@ -0,0 +1,51 @@
+"""
+Applies the versioned schema migrations in src/migrations/versions to the database in DATABASE_URL.
+
+Run from backend/ before starting the app:
+    python -m src.migrations upgrade             # everything pending
+    python -m src.migrations upgrade --target 3  # up to a version
+    python -m src.migrations status
+"""
+import argparse
+import asyncio
+import logging
+
+from src.database import engine
+from src.migrations.runner import MIGRATIONS, LATEST_VERSION, migrate, current_version
+
+
+async def status() -> None:
+    async with engine.connect() as conn:
+        version = await current_version(conn) or 0
+
+    for migration in MIGRATIONS:
+        state = "applied" if migration.version <= version else "pending"
+        print(f"{migration.version:>4}  {state:<8} {migration.description}")
+
+    print(f"database at {version}, latest {LATEST_VERSION}")
+
+
+async def upgrade(target: int) -> None:
+    applied = await migrate(engine, target)
+    print(f"applied {applied}" if applied else "nothing to apply")
+
+
+async def main(args: argparse.Namespace) -> None:
+    try:
+        if args.command == "status":
+            await status()
+        else:
+            await upgrade(args.target)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    # Progress of the migrations only, not the pool chatter
+    logging.getLogger("src.migrations").setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["upgrade", "status"])
+    parser.add_argument("--target", type=int, default=LATEST_VERSION)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,42 @@
+import logging
+from typing import Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+
+async def create_index_concurrently(
+        conn: AsyncConnection,
+        name: str,
+        table: str,
+        columns: Sequence[str],
+        where: Optional[str] = None,
+) -> None:
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS on Postgres, so the table keeps taking writes while the index
+    builds. `conn` has to be in autocommit. A build that failed earlier leaves an INVALID index behind
+    which IF NOT EXISTS would happily keep, that one is dropped and rebuilt. Other databases get a plain
+    CREATE INDEX IF NOT EXISTS
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    column_list = ", ".join(quote(column) for column in columns)
+    predicate = f" WHERE {where}" if where else ""
+
+    if conn.dialect.name != "postgresql":
+        await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} ({column_list}){predicate}"))
+        return
+
+    invalid = await conn.scalar(
+        text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": name},
+    )
+
+    if invalid:
+        logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {quote(name)}"))
+
+    await conn.execute(
+        text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(name)} ON {quote(table)} ({column_list}){predicate}")
+    )
@@ -0,0 +1,152 @@
+import importlib
+import logging
+import pkgutil
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from types import ModuleType
+from typing import List, Optional
+
+from sqlalchemy import Table, MetaData, Column, Integer, String, DateTime, select, func, insert, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncConnection
+
+from src.migrations import versions
+
+logger = logging.getLogger(__name__)
+
+# Key of the Postgres advisory lock that keeps two deploys from migrating at the same time
+MIGRATION_LOCK_ID = 7_318_020_001
+
+# Kept out of Base.metadata on purpose, the models describe the schema, this table describes its history
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    module: ModuleType
+
+    @property
+    def transactional(self) -> bool:
+        # Steps like CREATE INDEX CONCURRENTLY can't run inside a transaction block
+        return getattr(self.module, "TRANSACTIONAL", True)
+
+
+def load_migrations() -> List[Migration]:
+    """Every module in src/migrations/versions, ordered by VERSION, which has to count up from 1 without gaps"""
+    migrations = []
+
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        module = importlib.import_module(f"{versions.__name__}.{module_info.name}")
+        description = (module.__doc__ or module_info.name).strip().splitlines()[0]
+        migrations.append(Migration(module.VERSION, description, module))
+
+    migrations.sort(key=lambda migration: migration.version)
+    numbers = [migration.version for migration in migrations]
+
+    if numbers != list(range(1, len(numbers) + 1)):
+        raise SchemaVersionError(f"Migration versions must be 1..n without gaps, found {numbers}")
+
+    return migrations
+
+
+MIGRATIONS = load_migrations()
+LATEST_VERSION = MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+async def current_version(conn: AsyncConnection) -> Optional[int]:
+    """Highest applied version, None when the database was never migrated"""
+    try:
+        return await conn.scalar(select(func.max(schema_migrations.c.version)))
+    except DBAPIError:
+        # No schema_migrations table yet
+        await conn.rollback()
+        return None
+
+
+async def check_schema_version(engine: AsyncEngine) -> int:
+    """
+    Startup check: one lookup instead of reflecting every table. A database behind this build is refused,
+    one ahead of it is fine because migrations only ever add what older code can ignore
+    """
+    async with engine.connect() as conn:
+        version = await current_version(conn)
+
+    if version is None or version < LATEST_VERSION:
+        raise SchemaVersionError(
+            f"Database schema is at version {version or 0}, this build needs {LATEST_VERSION}. "
+            f"Run `python -m src.migrations upgrade` first"
+        )
+
+    if version > LATEST_VERSION:
+        logger.info(f"Database schema is at version {version}, ahead of this build ({LATEST_VERSION})")
+
+    return version
+
+
+async def migrate(engine: AsyncEngine, target: Optional[int] = None) -> List[int]:
+    """
+    Apply every pending migration up to `target` (default: all) and return the versions applied.
+    A transactional migration commits together with its schema_migrations row. Non-transactional
+    ones run on an autocommit connection and are recorded afterwards, so they must be idempotent
+    """
+    target = LATEST_VERSION if target is None else target
+    applied = []
+
+    async with engine.connect() as lock_conn:
+        # Session-level lock on a connection that never holds a transaction open,
+        # CREATE INDEX CONCURRENTLY would otherwise wait for it
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+
+        if engine.dialect.name == "postgresql":
+            await lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_ID})
+
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(schema_migrations.metadata.create_all)
+
+            async with engine.connect() as conn:
+                version = await current_version(conn) or 0
+
+            for migration in MIGRATIONS:
+                if migration.version <= version or migration.version > target:
+                    continue
+
+                logger.info(f"Applying migration {migration.version}: {migration.description}")
+
+                if migration.transactional:
+                    async with engine.begin() as conn:
+                        await migration.module.upgrade(conn)
+                        await _record(conn, migration)
+                else:
+                    async with engine.connect() as conn:
+                        autocommit = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                        await migration.module.upgrade(autocommit)
+
+                    async with engine.begin() as conn:
+                        await _record(conn, migration)
+
+                applied.append(migration.version)
+        finally:
+            if engine.dialect.name == "postgresql":
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_ID})
+
+    return applied
+
+
+async def _record(conn: AsyncConnection, migration: Migration) -> None:
+    await conn.execute(
+        insert(schema_migrations)
+        .values(version=migration.version, description=migration.description, applied_at=datetime.now(UTC))
+    )
@@ -0,0 +1,38 @@
+"""Initial schema: users and tickets
+
+Frozen copy of the tables as the first release created them with create_all. checkfirst makes it a no-op
+on databases that already have them, which is how existing deployments adopt the migrations.
+"""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, Float, Boolean, ForeignKey
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 1
+
+metadata = MetaData()
+
+Table(
+    "users",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True, autoincrement=True),
+    Column("username", String, nullable=False),
+    Column("email", String, nullable=False, index=True, unique=True),
+    Column("password", String, nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+)
+
+Table(
+    "tickets",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("price", Float, nullable=False),
+    Column("name", String, nullable=False),
+    Column("is_valid", Boolean, nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.run_sync(metadata.create_all, checkfirst=True)
@@ -0,0 +1,26 @@
+"""Jobs table of the background job runner"""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, JSON, Index
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 2
+
+metadata = MetaData()
+
+Table(
+    "jobs",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True, autoincrement=True),
+    Column("kind", String, nullable=False),
+    Column("status", String, nullable=False),
+    Column("total", Integer, nullable=False),
+    Column("done", Integer, nullable=False),
+    Column("payload", JSON, nullable=False),
+    Column("error", String, nullable=True),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+    Index("ix_jobs_status_updated_at", "status", "updated_at"),
+)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.run_sync(metadata.create_all, checkfirst=True)
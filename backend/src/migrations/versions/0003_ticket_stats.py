@@ -0,0 +1,23 @@
+"""Per-owner ticket counters
+
+Starts empty, `python -m src.tickets.reconcile_stats` fills it from the tickets already there.
+"""
+from sqlalchemy import MetaData, Table, Column, Integer, Float
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 3
+
+metadata = MetaData()
+
+Table(
+    "ticket_stats",
+    metadata,
+    Column("user_id", Integer, primary_key=True, autoincrement=False),
+    Column("tickets", Integer, nullable=False),
+    Column("valid_tickets", Integer, nullable=False),
+    Column("total_price", Float, nullable=False),
+)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.run_sync(metadata.create_all, checkfirst=True)
@@ -0,0 +1,27 @@
+"""Keyset pagination, listing filter and bulk mutation indexes
+
+Built with CREATE INDEX CONCURRENTLY, users and tickets keep taking writes meanwhile.
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.migrations.operations import create_index_concurrently
+
+VERSION = 4
+TRANSACTIONAL = False
+
+# (name, table, columns)
+INDEXES = [
+    ("ix_users_created_at_id", "users", ("created_at", "id")),
+    ("ix_tickets_created_at_id", "tickets", ("created_at", "id")),
+    ("ix_tickets_user_id_created_at_id", "tickets", ("user_id", "created_at", "id")),
+    ("ix_tickets_user_id_price_id", "tickets", ("user_id", "price", "id")),
+    ("ix_tickets_price_id", "tickets", ("price", "id")),
+    ("ix_tickets_is_valid_created_at_id", "tickets", ("is_valid", "created_at", "id")),
+    ("ix_tickets_is_valid_price_id", "tickets", ("is_valid", "price", "id")),
+    ("ix_tickets_name_id", "tickets", ("name", "id")),
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for name, table, columns in INDEXES:
+        await create_index_concurrently(conn, name, table, columns)
@@ -0,0 +1,24 @@
+"""Stored responses of requests sent with an Idempotency-Key"""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, LargeBinary, Index
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 5
+
+metadata = MetaData()
+
+Table(
+    "idempotency_keys",
+    metadata,
+    Column("key", String, primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("status_code", Integer, nullable=True),
+    Column("content_type", String, nullable=True),
+    Column("body", LargeBinary, nullable=True),
+    Column("locked_until", DateTime(timezone=True), nullable=False),
+    Column("expires_at", DateTime(timezone=True), nullable=False),
+    Index("ix_idempotency_keys_expires_at", "expires_at"),
+)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.run_sync(metadata.create_all, checkfirst=True)
@@ -0,0 +1,13 @@
+"""Response headers replayed with a stored idempotent response"""
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 6
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns("idempotency_keys"))
+
+    # Nullable, keys stored before keep replaying their status, content type and body only
+    if "headers" not in {column["name"] for column in columns}:
+        await conn.execute(text("ALTER TABLE idempotency_keys ADD COLUMN headers JSON"))
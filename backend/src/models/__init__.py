@@ -2,6 +2,8 @@
 # Both models must be imported together so relationship() can find referenced classes
 # This prevents "expression 'Ticket' failed to locate a name" errors
 from src.users.models import User
-from src.tickets.models import Ticket
+from src.tickets.models import Ticket, TicketStats
+from src.jobs.models import Job
+from src.idempotency.models import IdempotencyKey
 
-__all__ = ["User", "Ticket"]
\ No newline at end of file
+__all__ = ["User", "Ticket", "TicketStats", "Job", "IdempotencyKey"]
\ No newline at end of file
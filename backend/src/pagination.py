@@ -1,16 +1,91 @@
+import base64
+import json
 import math
-from typing import Generic, TypeVar, List
+from datetime import datetime
+from enum import Enum
+from typing import Generic, TypeVar, List, Optional, Tuple, Sequence, Any
 
-from fastapi import Query
+from fastapi import Query, HTTPException
 from pydantic import BaseModel, Field
+from sqlalchemy import Select, select, tuple_, func, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.counting import exact_count, estimated_count, row_counter
 
 
 T = TypeVar("T")
 
 
+class SortOrder(BaseModel):
+    """Column a listing is ordered by, id always follows as the tie-breaker"""
+    key: str = "created_at"
+    descending: bool = False
+
+    @classmethod
+    def parse(cls, value: str) -> "SortOrder":
+        # "price" -> ascending, "-price" -> descending
+        return cls(key=value.lstrip("-"), descending=value.startswith("-"))
+
+
+DEFAULT_SORT = SortOrder()
+
+
+class Cursor(BaseModel):
+    """Position of a row in the (sort column, id) ordering of a listing"""
+    key: str
+    value: Any
+    id: int
+
+    # Token is just base64 of a small json array, "opaque" only in the sense that clients shouldn't build it themselves
+    def encode(self) -> str:
+        value = self.value.isoformat() if isinstance(self.value, datetime) else self.value
+        raw = json.dumps([self.key, value, self.id], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "Cursor":
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            key, value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+            return cls(key=key, value=value, id=row_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    @classmethod
+    def from_item(cls, item: Any, sort: SortOrder) -> "Cursor":
+        return cls(key=sort.key, value=getattr(item, sort.key), id=item.id)
+
+    def value_for(self, column) -> Any:
+        if self.key != column.key:
+            raise HTTPException(status_code=400, detail="Cursor does not match the sort order")
+
+        if isinstance(column.type, DateTime):
+            try:
+                return datetime.fromisoformat(self.value)
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        return self.value
+
+
+class CountStrategy(str, Enum):
+    # count(*) folded into the page query as a window function
+    EXACT = "exact"
+    # planner statistics, cheap but approximate
+    ESTIMATED = "estimated"
+    # in-process counter kept up to date by the services
+    CACHED = "cached"
+    # no total at all, has_next still works
+    NONE = "none"
+
+
 class PaginationParams(BaseModel):
     page: int = Field(ge=1, description="The page number")
     page_size: int = Field(ge=5, le=100, description="The number of items to return")
+    after: Optional[str] = Field(None, description="Cursor of the last item of the previous page")
+    before: Optional[str] = Field(None, description="Cursor of the first item of the next page")
+    count: CountStrategy = Field(CountStrategy.EXACT, description="How total_items is computed")
 
     # With @property can be called without ()
     @property
@@ -21,20 +96,142 @@ class PaginationParams(BaseModel):
     def limit(self):
         return self.page_size
 
+    @property
+    def is_cursor(self) -> bool:
+        return self.after is not None or self.before is not None
+
+    @property
+    def cursor(self) -> Optional[Cursor]:
+        token = self.after or self.before
+
+        return Cursor.decode(token) if token else None
+
     def __init__(
             self,
             page: int = Query(1, ge=1, description="The page number"),
-            page_size: int = Query(5, ge=5, le=100, description="The number of items to return")):
-        super().__init__(page=page, page_size=page_size)
+            page_size: int = Query(5, ge=5, le=100, description="The number of items to return"),
+            after: Optional[str] = Query(None, description="Cursor of the last item of the previous page"),
+            before: Optional[str] = Query(None, description="Cursor of the first item of the next page"),
+            count: Optional[CountStrategy] = Query(
+                None, description="How total_items is computed, exact for pages and none for cursors by default")):
+        if after and before:
+            raise HTTPException(status_code=400, detail="Use either 'after' or 'before', not both")
+
+        # Cursor pages cost the same at any depth, an exact count by default would scan the whole listing each time
+        if count is None:
+            count = CountStrategy.NONE if after or before else CountStrategy.EXACT
+
+        super().__init__(page=page, page_size=page_size, after=after, before=before, count=count)
+        # Fail on a malformed token before any query is sent
+        self.cursor
+
+    def apply(self, query: Select, model, sort: SortOrder = DEFAULT_SORT) -> Select:
+        """
+        Order the query by (sort column, id) and cut out the requested page.
+        One extra row is fetched so PaginatedResponse can tell whether there is more data.
+        In cursor mode the row comparison is served straight from a (sort column, id) index,
+        so every page costs the same no matter how deep it is.
+        """
+        column = getattr(model, sort.key)
+        id_column = model.id
+        # 'before' walks backwards from the cursor, rows are flipped back into order in window()
+        descending = sort.descending != bool(self.before)
+
+        if descending:
+            query = query.order_by(column.desc(), id_column.desc())
+        else:
+            query = query.order_by(column, id_column)
+
+        cursor = self.cursor
+
+        if cursor:
+            position = tuple_(cursor.value_for(column), cursor.id)
+            row = tuple_(column, id_column)
+            query = query.where(row < position if descending else row > position)
+        else:
+            query = query.offset(self.skip)
+
+        return query.limit(self.limit + 1)
+
+    def window(self, items: Sequence[T]) -> Tuple[List[T], bool]:
+        """Drop the extra row fetched by apply(), returns the page and whether the extra row existed"""
+        has_more = len(items) > self.limit
+        page_items = list(items[:self.limit])
+
+        if self.before:
+            page_items.reverse()
+
+        return page_items, has_more
+
+
+async def paginate(
+        db: AsyncSession,
+        model,
+        pagination: PaginationParams,
+        query: Optional[Select] = None,
+        sort: SortOrder = DEFAULT_SORT,
+) -> Tuple[List[Any], Optional[int]]:
+    """
+    Fetch one page of `model` rows (plus the extra row used for has_next) and the total
+    computed with the requested count strategy. The total is None for count=none.
+    """
+    query = query if query is not None else select(model)
+    table_name = model.__tablename__
+    # Estimates and the cached counter only know the size of the whole table
+    is_filtered = query.whereclause is not None
+
+    if pagination.count == CountStrategy.EXACT and not pagination.is_cursor:
+        # The window is evaluated before LIMIT/OFFSET, so every row carries the full total
+        page_query = pagination.apply(query.add_columns(func.count().over().label("total")), model, sort)
+        rows = (await db.execute(page_query)).all()
+        items = [row[0] for row in rows]
+
+        # Past the last page there are no rows to carry the total
+        total = rows[0].total if rows else await exact_count(db, query)
+
+        return items, total
+
+    if pagination.count == CountStrategy.EXACT:
+        # The cursor condition would narrow a window count, so the total goes in as a scalar subquery
+        total_column = select(func.count()).select_from(query.subquery()).scalar_subquery().label("total")
+        page_query = pagination.apply(query.add_columns(total_column), model, sort)
+        rows = (await db.execute(page_query)).all()
+        items = [row[0] for row in rows]
+        total = rows[0].total if rows else await exact_count(db, query)
+
+        return items, total
+
+    result = await db.execute(pagination.apply(query, model, sort))
+    items = list(result.scalars().all())
+
+    if pagination.count == CountStrategy.NONE:
+        return items, None
+
+    if pagination.count == CountStrategy.CACHED and not is_filtered:
+        total = await row_counter.get(db, table_name, query)
+    else:
+        estimate = None if is_filtered else await estimated_count(db, table_name)
+        total = estimate if estimate is not None else await exact_count(db, query)
+
+    # Neither an estimate nor a counter may contradict the rows we've just seen
+    if items and not pagination.is_cursor:
+        total = max(total, pagination.skip + len(items))
+
+    return items, total
 
 
 class PaginationMeta(BaseModel):
-    page: int
+    # None when the page was requested by cursor
+    page: Optional[int]
     page_size: int
-    total_items: int
-    total_pages: int
+    count: CountStrategy = CountStrategy.EXACT
+    # Both None for count=none
+    total_items: Optional[int]
+    total_pages: Optional[int]
     has_next: bool
     has_previous: bool
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
 
 class PaginatedResponse(BaseModel, Generic[T]):
@@ -46,19 +243,36 @@ class PaginatedResponse(BaseModel, Generic[T]):
     @classmethod
     def create(
             cls,
-            items: List[T],
-            total: int,
+            items: Sequence[T],
+            total: Optional[int],
             pagination: PaginationParams,
+            sort: SortOrder = DEFAULT_SORT,
     ):
-        total_pages = math.ceil(total / pagination.page_size) if total > 0 else 0
+        items, has_more = pagination.window(items)
+
+        if total is None:
+            total_pages = None
+        else:
+            total_pages = math.ceil(total / pagination.page_size) if total > 0 else 0
+
+        if pagination.after:
+            has_next, has_previous = has_more, True
+        elif pagination.before:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, pagination.page > 1
 
+        # Page mode hands out cursors as well, so old clients can switch to cursors after the first page
         meta = PaginationMeta(
-            page=pagination.page,
+            page=None if pagination.is_cursor else pagination.page,
             page_size=pagination.page_size,
+            count=pagination.count,
             total_items=total,
             total_pages=total_pages,
-            has_next=pagination.page < total_pages,
-            has_previous=pagination.page > 1
+            has_next=has_next,
+            has_previous=has_previous,
+            next_cursor=Cursor.from_item(items[-1], sort).encode() if has_next and items else None,
+            prev_cursor=Cursor.from_item(items[0], sort).encode() if has_previous and items else None,
         )
 
-        return cls(items=items, meta=meta)
\ No newline at end of file
+        return cls(items=items, meta=meta)
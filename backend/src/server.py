@@ -0,0 +1,48 @@
+"""
+Production entry point, pre-forks WORKERS uvicorn processes (one per CPU core by default) on a shared socket:
+    python -m src.server
+
+Every worker gets DB_CONNECTION_BUDGET // WORKERS connections per database, opens them before it
+accepts its first request (POOL_WARMUP) and on SIGTERM finishes its in-flight requests
+(GRACEFUL_SHUTDOWN_TIMEOUT) and waits for its connections to come back before closing them (POOL_DRAIN_TIMEOUT).
+Migrations are not applied here, run `python -m src.migrations upgrade` first.
+"""
+import logging
+import os
+
+import uvicorn
+
+from src.config import settings as main_config
+from src.database import pool_limits
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    logging.basicConfig()
+    logger.setLevel(logging.INFO)
+
+    workers = main_config.WORKERS or os.cpu_count() or 1
+    pool_size, max_overflow = pool_limits(workers)
+
+    # Spawned workers read their settings from the environment again, this is how they learn their share
+    os.environ["WORKERS"] = str(workers)
+
+    databases = 1 + len(main_config.DATABASE_REPLICA_URLS)
+    logger.info(
+        f"Starting {workers} workers, pool {pool_size}+{max_overflow} each, "
+        f"up to {workers * (pool_size + max_overflow)} connections per database ({databases} databases)"
+    )
+
+    uvicorn.run(
+        "src.main:app",
+        host=main_config.SERVER_HOST,
+        port=main_config.SERVER_PORT,
+        workers=workers,
+        timeout_graceful_shutdown=main_config.GRACEFUL_SHUTDOWN_TIMEOUT,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
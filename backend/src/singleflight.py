@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from src.config import settings as main_config
+from src.metrics import Counter
+
+T = TypeVar("T")
+
+single_flight_calls = Counter(
+    "single_flight_calls_total", "Reads that ran a query (leader) or joined one already in flight (follower)",
+    ("flight", "role"))
+
+
+class SingleFlight:
+    """
+    Concurrent do() calls with the same key share one run of `load` and its result or exception.
+
+    The first caller (the leader) runs `load` in a task and awaits it, so the query runs on the leader's
+    session and only takes the leader's connection. Followers wait on the task through a shield: a
+    follower that is cancelled just stops waiting. When the leader is cancelled its query is cancelled
+    with it, and the followers start over, one of them becoming the new leader.
+
+    `generation` keeps callers from joining a query that started before a write they must see,
+    e.g. the entity cache epoch: a newer generation starts its own query.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        # key -> (task of the query in flight, generation it started in)
+        self._calls: Dict[Hashable, Tuple[asyncio.Task, Any]] = {}
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[T]], generation: Any = None) -> T:
+        if not self.enabled:
+            return await load()
+
+        while True:
+            call = self._calls.get(key)
+
+            # A cancelled query may still be listed until its done callback runs
+            if call is None or call[1] != generation or call[0].cancelled():
+                task = asyncio.create_task(load())
+                self._calls[key] = (task, generation)
+                task.add_done_callback(lambda done, key=key: self._forget(key, done))
+                single_flight_calls.inc(self.name, "leader")
+
+                return await task
+
+            task = call[0]
+            single_flight_calls.inc(self.name, "follower")
+
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # The leader went away, not us: run the query ourselves
+                if task.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+
+                raise
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        call = self._calls.get(key)
+
+        if call is not None and call[0] is task:
+            del self._calls[key]
+
+        # Every waiter re-raises the exception itself, this only keeps asyncio from logging it as unretrieved
+        if not task.cancelled():
+            task.exception()
+
+
+ticket_flights = SingleFlight("ticket", main_config.SINGLE_FLIGHT_ENABLED)
+user_flights = SingleFlight("user", main_config.SINGLE_FLIGHT_ENABLED)
+count_flights = SingleFlight("count", main_config.SINGLE_FLIGHT_ENABLED)
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from typing import List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import entity_to_dict
+from src.config import settings as main_config
+from src.counting import row_counter
+from src.database import AsyncSessionLocal
+from src.metrics import Histogram
+from src.tickets.models import Ticket
+from src.tickets.stats import StatsDelta, ticket_stats_service
+from src.users.models import User
+
+logger = logging.getLogger(__name__)
+
+group_commit_rows = Histogram(
+    "ticket_group_commit_rows", "Tickets written per group commit",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+# (column values, future of the caller waiting for the written row)
+Pending = Tuple[dict, asyncio.Future]
+
+
+class TicketCreateBatcher:
+    """
+    Group commit for single ticket creates. Rows are collected for up to `window` seconds or `max_rows`
+    rows, then written by one multi-row INSERT ... RETURNING and one commit, and every caller gets its
+    own row (as column values) back. A row with an unknown user_id fails only its own caller: such rows
+    are filtered out up front, and should the foreign key still trip (user deleted meanwhile) the batch
+    is retried row by row in savepoints. A caller that went away before the flush has its row dropped
+    """
+
+    def __init__(self, window: float, max_rows: int):
+        self.window = window
+        self.max_rows = max_rows
+        self._pending: List[Pending] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: Set[asyncio.Task] = set()
+
+    async def create(self, values: dict) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((values, future))
+
+        if len(self._pending) >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+        return await future
+
+    async def drain(self) -> None:
+        """Write what is still collected and wait for the writes in flight, for shutdown"""
+        self._flush()
+
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = [(values, future) for values, future in self._pending if not future.done()]
+        self._pending = []
+
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+            # A write cancelled before it started never gets to fail its callers itself
+            task.add_done_callback(lambda done, batch=batch: _fail_unresolved(batch))
+
+    async def _write(self, batch: List[Pending]) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                batch = await self._reject_unknown_users(db, batch)
+
+                if not batch:
+                    return
+
+                try:
+                    rows = await self._insert(db, batch)
+                except IntegrityError:
+                    await db.rollback()
+                    rows = await self._insert_one_by_one(db, batch)
+
+                delta = StatsDelta()
+
+                for row in rows:
+                    if row is not None:
+                        delta.add(row["user_id"], row["is_valid"], row["price"])
+
+                await ticket_stats_service.apply(db, delta)
+                await db.commit()
+        except BaseException as e:
+            # Whatever went wrong, no caller may be left waiting: every future not resolved yet gets a 500
+            if isinstance(e, SQLAlchemyError):
+                logger.error(f"Group commit of {len(batch)} tickets failed: {str(e)}")
+            else:
+                logger.exception(f"Group commit of {len(batch)} tickets failed")
+
+            _fail_unresolved(batch)
+
+            # Cancellation (shutdown) still has to reach the task
+            if not isinstance(e, Exception):
+                raise
+
+            return
+
+        written = 0
+
+        for (_, future), row in zip(batch, rows):
+            if row is None:
+                _resolve(future, exception=HTTPException(400, "Invalid user_id"))
+            else:
+                written += 1
+                _resolve(future, row)
+
+        group_commit_rows.observe(written)
+        row_counter.add(Ticket.__tablename__, written)
+
+    async def _reject_unknown_users(self, db: AsyncSession, batch: List[Pending]) -> List[Pending]:
+        user_ids = {values["user_id"] for values, _ in batch if values["user_id"]}
+
+        if not user_ids:
+            return batch
+
+        existing = set((await db.scalars(select(User.id).where(User.id.in_(user_ids)))).all())
+        accepted = []
+
+        for values, future in batch:
+            if values["user_id"] and values["user_id"] not in existing:
+                _resolve(future, exception=HTTPException(400, "Invalid user_id"))
+            else:
+                accepted.append((values, future))
+
+        return accepted
+
+    async def _insert(self, db: AsyncSession, batch: List[Pending]) -> List[dict]:
+        # sort_by_parameter_order lines the returned rows up with the callers
+        result = await db.scalars(
+            insert(Ticket).returning(Ticket, sort_by_parameter_order=True),
+            [values for values, _ in batch],
+        )
+
+        return [entity_to_dict(ticket) for ticket in result.all()]
+
+    async def _insert_one_by_one(self, db: AsyncSession, batch: List[Pending]) -> List[Optional[dict]]:
+        """None for the rows the database refused, the others are kept"""
+        rows = []
+
+        for values, _ in batch:
+            try:
+                async with db.begin_nested():
+                    ticket = await db.scalar(insert(Ticket).values(**values).returning(Ticket))
+                rows.append(entity_to_dict(ticket))
+            except IntegrityError:
+                rows.append(None)
+
+        return rows
+
+
+def _fail_unresolved(batch: List[Pending]) -> None:
+    for _, future in batch:
+        _resolve(future, exception=HTTPException(500, "Failed to create ticket"))
+
+
+def _resolve(future: asyncio.Future, result: Optional[dict] = None, exception: Optional[Exception] = None) -> None:
+    # The caller may have been cancelled meanwhile
+    if future.done():
+        return
+
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+ticket_batcher = TicketCreateBatcher(main_config.GROUP_COMMIT_WINDOW, main_config.GROUP_COMMIT_MAX_ROWS)
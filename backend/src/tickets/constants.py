@@ -0,0 +1,26 @@
+# Upper bound for TicketCreateBulkSchema.amount, rows are streamed so this only guards against typos
+MAX_BULK_AMOUNT = 1_000_000
+
+# Amounts above this are handed to the job runner and answered with 202 + job id
+BACKGROUND_BULK_THRESHOLD = 5000
+
+# Column order of the tuples produced for bulk writes
+BULK_TICKET_COLUMNS = ("price", "name", "is_valid", "created_at", "updated_at")
+
+# Job kind of the background bulk creation
+BULK_TICKET_JOB = "ticket_bulk"
+
+# Column order of the tuples produced by the upload import
+IMPORT_TICKET_COLUMNS = ("user_id", "price", "name", "is_valid", "created_at", "updated_at")
+
+# Rows validated, foreign-key checked and written together by POST /tickets/import
+IMPORT_BATCH_SIZE = 5000
+
+# The import report keeps at most this many row errors, the rest are only counted
+MAX_IMPORT_ERRORS = 1000
+
+# Rows locked, changed and committed together by POST /tickets/bulk-update and /tickets/bulk-delete
+BULK_MUTATION_BATCH_SIZE = 5000
+
+# ticket_stats row of the tickets that have no owner, user ids start at 1
+UNOWNED_STATS_ID = 0
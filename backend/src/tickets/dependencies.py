@@ -1,7 +1,8 @@
-from fastapi import HTTPException
+from fastapi import HTTPException, Request, Response
 from fastapi.params import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.conditional import is_conditional, check_not_modified, set_validators
 from src.database import get_db
 from src.tickets.models import Ticket
 from src.tickets.service import ticket_service
@@ -14,3 +15,24 @@ async def is_ticket_id_valid(ticket_id: int, db: AsyncSession = Depends(get_db))
         raise HTTPException(status_code=404, detail="Ticket not found")
 
     return ticket
+
+
+async def get_fresh_ticket(
+        ticket_id: int,
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+) -> Ticket:
+    """is_ticket_id_valid for GETs: a client whose copy is current gets a 304 decided on updated_at alone"""
+    if is_conditional(request):
+        updated_at = await ticket_service.get_ticket_version(db, ticket_id)
+
+        if updated_at is None:
+            raise HTTPException(status_code=404, detail="Ticket not found")
+
+        check_not_modified(request, updated_at)
+
+    ticket = await is_ticket_id_valid(ticket_id, db)
+    set_validators(response, ticket.updated_at)
+
+    return ticket
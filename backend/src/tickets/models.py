@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Index, ForeignKey, Float, Boolean
 from datetime import datetime, UTC
 
 from sqlalchemy.orm import relationship
@@ -8,6 +8,19 @@ from src.database import Base
 
 class Ticket(Base):
     __tablename__ = "tickets"
+    __table_args__ = (
+        # Backs the (created_at, id) keyset pagination of the listing
+        Index("ix_tickets_created_at_id", "created_at", "id"),
+        # One (filter, sort column, id) index per listing filter and sort combination,
+        # the user_id ones also serve the per-user lookups and the FK check on user deletes
+        Index("ix_tickets_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_tickets_user_id_price_id", "user_id", "price", "id"),
+        Index("ix_tickets_price_id", "price", "id"),
+        Index("ix_tickets_is_valid_created_at_id", "is_valid", "created_at", "id"),
+        Index("ix_tickets_is_valid_price_id", "is_valid", "price", "id"),
+        # Bulk mutations by name walk the matching rows in id order
+        Index("ix_tickets_name_id", "name", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -19,10 +32,27 @@ class Ticket(Base):
         default=lambda: datetime.now(UTC),
         nullable=False
     )
+    # Also the version behind the ETag, every UPDATE statement bumps it
     updated_at = Column(
         DateTime(timezone=True),
         default=lambda: datetime.now(UTC),
+        onupdate=lambda: datetime.now(UTC),
         nullable=False
     )
 
     user = relationship("User", back_populates="tickets")
+
+
+class TicketStats(Base):
+    """
+    Ticket count, valid ticket count and price sum per owner, kept up to date by every ticket write
+    in its own transaction (see src/tickets/stats.py). Tickets without an owner are counted under
+    UNOWNED_STATS_ID. Rebuilt from the tickets table by `python -m src.tickets.reconcile_stats`.
+    """
+    __tablename__ = "ticket_stats"
+
+    # No foreign key, the unowned row has no user behind it
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    tickets = Column(Integer, nullable=False, default=0)
+    valid_tickets = Column(Integer, nullable=False, default=0)
+    total_price = Column(Float, nullable=False, default=0)
@@ -0,0 +1,52 @@
+"""
+Rebuilds ticket_stats from the tickets table and reports every owner whose counters had drifted.
+
+Run from backend/ against the database in DATABASE_URL:
+    python -m src.tickets.reconcile_stats            # report and fix
+    python -m src.tickets.reconcile_stats --dry-run  # only report
+
+Also the way to fill the table for tickets written before it existed.
+Exits with 1 when drift was found.
+"""
+import argparse
+import asyncio
+import sys
+
+import src.models  # noqa: F401  resolves the User <-> Ticket relationship
+from src.database import AsyncSessionLocal, engine
+from src.migrations import check_schema_version
+from src.tickets.stats import ticket_stats_service
+
+
+def _describe(counters) -> str:
+    if counters is None:
+        return "-"
+
+    tickets, valid_tickets, total_price = counters
+
+    return f"tickets={tickets} valid={valid_tickets} price={total_price:.2f}"
+
+
+async def main(fix: bool) -> int:
+    await check_schema_version(engine)
+
+    async with AsyncSessionLocal() as db:
+        drift = await ticket_stats_service.reconcile(db, fix=fix)
+
+    await engine.dispose()
+
+    for entry in drift:
+        print(f"user_id={entry['user_id']}: stored {_describe(entry['stored'])}, actual {_describe(entry['actual'])}")
+
+    action = "rebuilt" if fix else "left unchanged (dry run)"
+    print(f"{len(drift)} owner(s) drifted, ticket_stats {action}")
+
+    return 1 if drift else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only report the drift")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(fix=not args.dry_run)))
@@ -1,14 +1,28 @@
-from fastapi import APIRouter
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Response, Query, UploadFile
+from fastapi.responses import StreamingResponse
 from fastapi.params import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.batch import BatchIdsSchema, BatchResponse, BatchDeleteResponseSchema
+from src.conditional import if_match_versions, set_validators
 from src.database import get_db
+from src.export import FileFormat, export_response
+from src.jobs.dependencies import is_job_id_valid
+from src.jobs.models import Job
+from src.jobs.schemas import JobResponseSchema
+from src.jobs.service import job_service
 from src.pagination import PaginatedResponse, PaginationParams
-from src.tickets.dependencies import is_ticket_id_valid
+from src.tickets.dependencies import is_ticket_id_valid, get_fresh_ticket
 from src.tickets.models import Ticket
 from src.tickets.schemas import TicketResponseSchema, TicketCreateSchema, TicketBulkResponseSchema, \
-    TicketCreateBulkSchema, TicketUpdateSchema, TicketPATCHSchema
+    TicketCreateBulkSchema, TicketUpdateSchema, TicketPATCHSchema, TicketImportResponseSchema, TicketBatchPatchSchema, \
+    TicketFilterParams, TicketBulkUpdateSchema, TicketBulkDeleteSchema, TicketBulkMutationResponseSchema, \
+    TicketStatsResponseSchema
 from src.tickets.service import ticket_service
+from src.tickets.stats import ticket_stats_service
 
 router = APIRouter()
 
@@ -21,20 +35,87 @@ router = APIRouter()
     status_code=200)
 async def get_paginated_tickets(
         pagination: PaginationParams = Depends(),
+        filters: TicketFilterParams = Depends(),
         db: AsyncSession = Depends(get_db)):
-    tickets, total = await ticket_service.get_tickets(db, pagination)
+    tickets, total = await ticket_service.get_tickets(db, pagination, filters)
+
+    return PaginatedResponse.create(tickets, total, pagination, filters.sort_order)
+
 
-    return PaginatedResponse.create(tickets, total, pagination)
+@router.get(
+    "/tickets/export",
+    tags=["Tickets"],
+    description="Stream every ticket matching the filters as NDJSON or CSV",
+    response_class=StreamingResponse,
+    status_code=200)
+async def export_tickets(
+        filters: TicketFilterParams = Depends(),
+        export_format: FileFormat = Query(FileFormat.NDJSON, alias="format")):
+    return export_response(ticket_service.export_query(filters), "tickets", export_format)
+
+
+@router.get(
+    "/tickets/stats",
+    tags=["Tickets"],
+    description="Ticket count, valid ticket count and price sum over all tickets",
+    response_model=TicketStatsResponseSchema,
+    status_code=200)
+async def get_ticket_stats(
+        db: AsyncSession = Depends(get_db)):
+    return await ticket_stats_service.get_totals(db)
+
+
+@router.post(
+    "/tickets/batch-get",
+    tags=["Tickets"],
+    description="Get many tickets by id",
+    response_model=BatchResponse[TicketResponseSchema],
+    status_code=200)
+async def get_tickets_batch(
+        batch: BatchIdsSchema,
+        db: AsyncSession = Depends(get_db)):
+    tickets, not_found = await ticket_service.get_tickets_by_ids(db, batch.ids)
+
+    return BatchResponse(items=tickets, not_found=not_found)
+
+
+@router.patch(
+    "/tickets/batch",
+    tags=["Tickets"],
+    description="PATCH many tickets in one transaction",
+    response_model=BatchResponse[TicketResponseSchema],
+    status_code=200)
+async def patch_tickets_batch(
+        batch: TicketBatchPatchSchema,
+        db: AsyncSession = Depends(get_db)):
+    tickets, not_found = await ticket_service.patch_tickets(db, batch.items)
+
+    return BatchResponse(items=tickets, not_found=not_found)
+
+
+@router.delete(
+    "/tickets/batch",
+    tags=["Tickets"],
+    description="Delete many tickets in one statement",
+    response_model=BatchDeleteResponseSchema,
+    status_code=200)
+async def delete_tickets_batch(
+        batch: BatchIdsSchema,
+        db: AsyncSession = Depends(get_db)):
+    deleted, not_found = await ticket_service.delete_tickets(db, batch.ids)
+
+    return BatchDeleteResponseSchema(deleted=deleted, not_found=not_found)
 
 
 @router.get(
     "/tickets/{ticket_id}",
     tags=["Tickets"],
-    description="Get ticket by id",
+    description="Get ticket by id. Answers If-None-Match / If-Modified-Since with 304 when the ticket is unchanged",
     response_model=TicketResponseSchema,
-    status_code=200)
+    status_code=200,
+    responses={304: {"description": "Not modified"}})
 async def get_ticket_by_id(
-        ticket: Ticket = Depends(is_ticket_id_valid)):
+        ticket: Ticket = Depends(get_fresh_ticket)):
     return ticket
 
 
@@ -55,40 +136,125 @@ async def create_ticket(
     tags=["Tickets"],
     description="Create a new ticket",
     response_model=TicketBulkResponseSchema,
-    status_code=201)
+    status_code=201,
+    responses={202: {"description": "Accepted, the tickets are created by a background job"}})
 async def create_tickets_bulk(
         bulk_ticket: TicketCreateBulkSchema,
+        response: Response,
+        db: AsyncSession = Depends(get_db)
+):
+    result = await ticket_service.create_ticket_bulk(db, bulk_ticket)
+
+    if result.get("job_id"):
+        response.status_code = 202
+
+    return result
+
+
+@router.post(
+    "/tickets/bulk-update",
+    tags=["Tickets"],
+    description="Apply one change set to every ticket matching the filter",
+    response_model=TicketBulkMutationResponseSchema,
+    status_code=200)
+async def bulk_update_tickets(
+        data: TicketBulkUpdateSchema,
+        db: AsyncSession = Depends(get_db)):
+    affected = await ticket_service.bulk_update_tickets(db, data)
+
+    return {"affected": affected}
+
+
+@router.post(
+    "/tickets/bulk-delete",
+    tags=["Tickets"],
+    description="Delete every ticket matching the filter",
+    response_model=TicketBulkMutationResponseSchema,
+    status_code=200)
+async def bulk_delete_tickets(
+        data: TicketBulkDeleteSchema,
+        db: AsyncSession = Depends(get_db)):
+    affected = await ticket_service.bulk_delete_tickets(db, data.filter)
+
+    return {"affected": affected}
+
+
+@router.post(
+    "/tickets/import",
+    tags=["Tickets"],
+    description="Create tickets from an NDJSON or CSV upload, one ticket per line",
+    response_model=TicketImportResponseSchema,
+    status_code=201)
+async def import_tickets(
+        file: UploadFile,
+        file_format: FileFormat = Query(FileFormat.NDJSON, alias="format"),
         db: AsyncSession = Depends(get_db)
 ):
-    return await ticket_service.create_ticket_bulk(db, bulk_ticket)
+    return await ticket_service.import_tickets(db, file, file_format)
+
+
+@router.get(
+    "/tickets/bulk/jobs/{job_id}",
+    tags=["Tickets"],
+    description="Get the progress of a background bulk creation",
+    response_model=JobResponseSchema,
+    status_code=200)
+async def get_bulk_job(
+        job: Job = Depends(is_job_id_valid)):
+    return job
+
+
+@router.delete(
+    "/tickets/bulk/jobs/{job_id}",
+    tags=["Tickets"],
+    description="Cancel a background bulk creation, batches already written are kept",
+    response_model=JobResponseSchema,
+    status_code=200)
+async def cancel_bulk_job(
+        job: Job = Depends(is_job_id_valid),
+        db: AsyncSession = Depends(get_db)
+):
+    return await job_service.cancel_job(db, job)
 
 
 @router.put(
     "/tickets/{ticket_id}",
     tags=["Tickets"],
-    description="Update the ticket",
+    description="Update the ticket, with If-Match only if it is still at that version",
     response_model=TicketResponseSchema,
-    status_code=200)
+    status_code=200,
+    responses={412: {"description": "The ticket changed since the If-Match ETag"}})
 async def update_ticket(
+        ticket_id: int,
         update_data: TicketUpdateSchema,
-        ticket: Ticket = Depends(is_ticket_id_valid),
+        response: Response,
+        expected: Optional[List[datetime]] = Depends(if_match_versions),
         db: AsyncSession = Depends(get_db)
 ):
-    return await ticket_service.update_ticket(db, ticket, update_data)
+    ticket = await ticket_service.update_ticket(db, ticket_id, update_data, expected)
+    set_validators(response, ticket.updated_at)
+
+    return ticket
 
 
 @router.patch(
     "/tickets/{ticket_id}",
     tags=["Tickets"],
-    description="PATCH the ticket",
+    description="PATCH the ticket, with If-Match only if it is still at that version",
     response_model=TicketResponseSchema,
-    status_code=200)
+    status_code=200,
+    responses={412: {"description": "The ticket changed since the If-Match ETag"}})
 async def patch_ticket(
+        ticket_id: int,
         update_data: TicketPATCHSchema,
-        ticket: Ticket = Depends(is_ticket_id_valid),
+        response: Response,
+        expected: Optional[List[datetime]] = Depends(if_match_versions),
         db: AsyncSession = Depends(get_db)
 ):
-    return await ticket_service.patch_ticket(db, ticket, update_data)
+    ticket = await ticket_service.patch_ticket(db, ticket_id, update_data, expected)
+    set_validators(response, ticket.updated_at)
+
+    return ticket
 
 
 @router.delete(
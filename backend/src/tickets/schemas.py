@@ -1,6 +1,15 @@
-from typing import Optional
+from datetime import datetime
+from enum import Enum
+from typing import Optional, List
 
-from pydantic import BaseModel, ConfigDict, Field
+from fastapi import Query
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from sqlalchemy import Select
+
+from src.batch import MAX_BATCH_SIZE
+from src.pagination import SortOrder
+from src.tickets.constants import MAX_BULK_AMOUNT
+from src.tickets.models import Ticket
 
 
 class TicketBaseSchema(BaseModel):
@@ -18,7 +27,7 @@ class TicketUpdateSchema(TicketBaseSchema):
 
 
 class TicketCreateBulkSchema(TicketBaseSchema):
-    amount: Optional[int] = Field(None, ge=10, le=10000)
+    amount: Optional[int] = Field(None, ge=10, le=MAX_BULK_AMOUNT)
 
 
 class TicketPATCHSchema(BaseModel):
@@ -27,6 +36,25 @@ class TicketPATCHSchema(BaseModel):
     is_valid: Optional[bool] = None
     user_id: Optional[int] = Field(None, ge=1)
 
+    @model_validator(mode="after")
+    def check_required_not_null(self) -> "TicketPATCHSchema":
+        # Leaving a field out keeps it, null only clears user_id, the other columns are NOT NULL
+        nulls = [name for name in ("name", "price", "is_valid")
+                 if name in self.model_fields_set and getattr(self, name) is None]
+
+        if nulls:
+            raise ValueError(f"{', '.join(nulls)} may not be null")
+
+        return self
+
+
+class TicketBatchPatchItemSchema(TicketPATCHSchema):
+    id: int
+
+
+class TicketBatchPatchSchema(BaseModel):
+    items: List[TicketBatchPatchItemSchema] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
 
 class TicketResponseSchema(TicketBaseSchema):
     id: int
@@ -38,6 +66,8 @@ class TicketResponseSchema(TicketBaseSchema):
 class TicketBulkResponseSchema(BaseModel):
     success: bool
     tickets_created: int
+    # Set when the tickets are written by a background job, poll GET /tickets/bulk/jobs/{job_id}
+    job_id: Optional[int] = None
 
 
 class TicketListResponseSchema(BaseModel):
@@ -45,3 +75,125 @@ class TicketListResponseSchema(BaseModel):
     tickets: list[TicketResponseSchema]
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class TicketImportErrorSchema(BaseModel):
+    line: int
+    error: str
+
+
+class TicketImportResponseSchema(BaseModel):
+    success: bool
+    tickets_created: int
+    rows_failed: int
+    # Capped at MAX_IMPORT_ERRORS, rows_failed has the full count
+    errors: list[TicketImportErrorSchema]
+
+
+class TicketStatsResponseSchema(BaseModel):
+    tickets: int
+    valid_tickets: int
+    total_price: float
+    # Users owning at least one ticket
+    owners: int
+    unowned_tickets: int
+
+
+class TicketSort(str, Enum):
+    # Every value is backed by a (column, id) index, see Ticket.__table_args__
+    CREATED_AT = "created_at"
+    CREATED_AT_DESC = "-created_at"
+    PRICE = "price"
+    PRICE_DESC = "-price"
+
+
+class TicketFilterParams(BaseModel):
+    user_id: Optional[int] = None
+    is_valid: Optional[bool] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    sort: TicketSort = TicketSort.CREATED_AT
+
+    @property
+    def sort_order(self) -> SortOrder:
+        return SortOrder.parse(self.sort.value)
+
+    def __init__(
+            self,
+            user_id: Optional[int] = Query(None, ge=1, description="Only tickets of this user"),
+            is_valid: Optional[bool] = Query(None, description="Only valid or only invalid tickets"),
+            min_price: Optional[float] = Query(None, description="Lowest price, inclusive"),
+            max_price: Optional[float] = Query(None, description="Highest price, inclusive"),
+            created_after: Optional[datetime] = Query(None, description="Created at or after"),
+            created_before: Optional[datetime] = Query(None, description="Created before"),
+            sort: TicketSort = Query(TicketSort.CREATED_AT, description="Sort column, '-' prefix for descending")):
+        super().__init__(
+            user_id=user_id,
+            is_valid=is_valid,
+            min_price=min_price,
+            max_price=max_price,
+            created_after=created_after,
+            created_before=created_before,
+            sort=sort,
+        )
+
+    def apply(self, query: Select) -> Select:
+        if self.user_id is not None:
+            query = query.where(Ticket.user_id == self.user_id)
+        if self.is_valid is not None:
+            query = query.where(Ticket.is_valid == self.is_valid)
+        if self.min_price is not None:
+            query = query.where(Ticket.price >= self.min_price)
+        if self.max_price is not None:
+            query = query.where(Ticket.price <= self.max_price)
+        if self.created_after is not None:
+            query = query.where(Ticket.created_at >= self.created_after)
+        if self.created_before is not None:
+            query = query.where(Ticket.created_at < self.created_before)
+
+        return query
+
+
+class TicketBulkFilterSchema(BaseModel):
+    user_id: Optional[int] = Field(None, ge=1)
+    name: Optional[str] = None
+    is_valid: Optional[bool] = None
+    id_from: Optional[int] = Field(None, ge=1, description="Lowest id, inclusive")
+    id_to: Optional[int] = Field(None, ge=1, description="Highest id, inclusive")
+
+    @model_validator(mode="after")
+    def check_not_empty(self) -> "TicketBulkFilterSchema":
+        # Touching the whole table has to be asked for explicitly, e.g. with an id range
+        if all(value is None for value in self.model_dump().values()):
+            raise ValueError("At least one filter is required")
+
+        return self
+
+    def apply(self, query: Select) -> Select:
+        if self.user_id is not None:
+            query = query.where(Ticket.user_id == self.user_id)
+        if self.name is not None:
+            query = query.where(Ticket.name == self.name)
+        if self.is_valid is not None:
+            query = query.where(Ticket.is_valid == self.is_valid)
+        if self.id_from is not None:
+            query = query.where(Ticket.id >= self.id_from)
+        if self.id_to is not None:
+            query = query.where(Ticket.id <= self.id_to)
+
+        return query
+
+
+class TicketBulkUpdateSchema(BaseModel):
+    filter: TicketBulkFilterSchema
+    changes: TicketPATCHSchema
+
+
+class TicketBulkDeleteSchema(BaseModel):
+    filter: TicketBulkFilterSchema
+
+
+class TicketBulkMutationResponseSchema(BaseModel):
+    affected: int
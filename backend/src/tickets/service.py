@@ -1,91 +1,190 @@
 import logging
-from typing import Tuple, Sequence, Optional
+from datetime import datetime, UTC
+from itertools import repeat, islice
+from typing import Tuple, Sequence, Optional, Iterator, List
 
-from fastapi import HTTPException
-from sqlalchemy import func, select, insert
+from fastapi import HTTPException, UploadFile
+from pydantic import ValidationError
+from sqlalchemy import Select, select, insert, update, delete
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import AsyncSessionLocal
-from src.pagination import PaginationParams
+from src.batch import missing_ids
+from src.database import AsyncSessionLocal, is_foreign_key_violation, on_primary
+from src.bulk import bulk_insert, BULK_BATCH_SIZE
+from src.config import settings as main_config
+from src.cache import entity_cache, attach_entity, entity_to_dict, ticket_key
+from src.conditional import precondition_failed, matches_expected
+from src.counting import row_counter
+from src.export import FileFormat
+from src.ingest import read_records, describe_validation_error
+from src.jobs.models import Job
+from src.jobs.service import job_service, job_runner
+from src.pagination import PaginationParams, paginate
+from src.singleflight import ticket_flights
 from src.users.models import User
-from src.utils import chunked
+from src.utils import achunked
+from src.tickets.constants import BACKGROUND_BULK_THRESHOLD, BULK_TICKET_COLUMNS, BULK_TICKET_JOB, \
+    IMPORT_TICKET_COLUMNS, IMPORT_BATCH_SIZE, MAX_IMPORT_ERRORS, BULK_MUTATION_BATCH_SIZE
+from src.tickets.batcher import ticket_batcher
 from src.tickets.models import Ticket
-from src.tickets.schemas import TicketCreateSchema, TicketCreateBulkSchema, TicketUpdateSchema, TicketPATCHSchema
+from src.tickets.stats import StatsDelta, ticket_stats_service
+from src.tickets.schemas import TicketCreateSchema, TicketCreateBulkSchema, TicketUpdateSchema, TicketPATCHSchema, \
+    TicketBatchPatchItemSchema, TicketFilterParams, TicketBulkFilterSchema, TicketBulkUpdateSchema
 
 logger = logging.getLogger(__name__)
 
 
 class TicketService:
     async def get_ticket_by_id(self, db: AsyncSession, ticket_id: int) -> Optional[Ticket]:
-        ticket_result = await db.execute(
-            select(Ticket)
-            .where(Ticket.id == ticket_id)
-        )
+        cached = await entity_cache.get(ticket_key(ticket_id))
+
+        if cached:
+            return await attach_entity(db, Ticket, cached)
+
+        epoch = entity_cache.epoch
+        ticket = None
+
+        async def load() -> Optional[dict]:
+            nonlocal ticket
+            ticket_result = await db.execute(
+                select(Ticket)
+                .where(Ticket.id == ticket_id)
+            )
+            ticket = ticket_result.scalar_one_or_none()
+
+            if not ticket:
+                return None
 
-        return ticket_result.scalar_one_or_none()
+            data = entity_to_dict(ticket)
 
-    async def get_tickets(self, db: AsyncSession, pagination: PaginationParams) -> Tuple[Sequence[Ticket], int]:
-        count_result = await db.execute(func.count(Ticket.id))
-        total = count_result.scalar()
+            # A lagging replica could put back a row a write just invalidated, only primary reads are cached
+            if on_primary(db):
+                await entity_cache.set(ticket_key(ticket_id), data, epoch)
+
+            return data
+
+        # Concurrent misses for the same ticket share one query, only the caller that ran it has `ticket` set
+        data = await ticket_flights.do((db.bind, ticket_id), load, epoch)
+
+        if ticket is not None or data is None:
+            return ticket
 
-        tickets_result = await db.execute(
-            select(Ticket)
-            .order_by(Ticket.created_at)
-            .offset(pagination.skip)
-            .limit(pagination.limit)
+        return await attach_entity(db, Ticket, data)
+
+    async def get_ticket_version(self, db: AsyncSession, ticket_id: int) -> Optional[datetime]:
+        """
+        updated_at only, enough to answer a conditional GET without loading the ticket. Always read from the
+        database: the entity cache is per process and misses writes handled by the other workers
+        """
+        updated_at = await db.scalar(select(Ticket.updated_at).where(Ticket.id == ticket_id))
+        cached = await entity_cache.get(ticket_key(ticket_id))
+
+        # The 200 that follows must not be served from a copy older than the version just read
+        if cached and cached["updated_at"] != updated_at:
+            await entity_cache.invalidate(ticket_key(ticket_id))
+
+        return updated_at
+
+    async def get_tickets(
+            self,
+            db: AsyncSession,
+            pagination: PaginationParams,
+            filters: TicketFilterParams,
+    ) -> Tuple[Sequence[Ticket], Optional[int]]:
+        return await paginate(db, Ticket, pagination, filters.apply(select(Ticket)), filters.sort_order)
+
+    def export_query(self, filters: Optional[TicketFilterParams] = None) -> Select:
+        # Plain columns instead of ORM objects, nothing piles up in a session while streaming
+        query = (
+            select(
+                Ticket.id,
+                Ticket.user_id,
+                Ticket.name,
+                Ticket.price,
+                Ticket.is_valid,
+                Ticket.created_at,
+                Ticket.updated_at,
+            )
+            .order_by(Ticket.id)
         )
-        tickets = tickets_result.scalars().all()
 
-        return list(tickets), total
+        return filters.apply(query) if filters else query
 
     async def create_ticket(self, db: AsyncSession, ticket: TicketCreateSchema) -> Ticket:
-        db_ticket = Ticket(
-            user_id=ticket.user_id if ticket.user_id else None,
-            price=ticket.price,
-            name=ticket.name,
-            is_valid=ticket.is_valid,
-        )
+        if main_config.TICKET_GROUP_COMMIT:
+            # Written together with the other creates of the next few milliseconds, see TicketCreateBatcher
+            data = await ticket_batcher.create({
+                "user_id": ticket.user_id if ticket.user_id else None,
+                "price": ticket.price,
+                "name": ticket.name,
+                "is_valid": ticket.is_valid,
+            })
+
+            return await attach_entity(db, Ticket, data)
+
+        try:
+            # Defaults are generated in Python and the row comes back from RETURNING, no refresh needed
+            db_ticket = await db.scalar(
+                insert(Ticket)
+                .values(
+                    user_id=ticket.user_id if ticket.user_id else None,
+                    price=ticket.price,
+                    name=ticket.name,
+                    is_valid=ticket.is_valid,
+                )
+                .returning(Ticket)
+            )
+            delta = StatsDelta()
+            delta.add(db_ticket.user_id, db_ticket.is_valid, db_ticket.price)
+            await ticket_stats_service.apply(db, delta)
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
 
-        db.add(db_ticket)
-        await db.commit()
-        await db.refresh(db_ticket)
+            if not is_foreign_key_violation(e):
+                raise
+
+            raise HTTPException(400, "Invalid user_id")
+
+        row_counter.add(Ticket.__tablename__, 1)
 
         return db_ticket
 
     async def create_ticket_bulk(self, db: AsyncSession, ticket: TicketCreateBulkSchema) -> dict:
-        if ticket.amount > 5000:
+        if ticket.amount > BACKGROUND_BULK_THRESHOLD:
             try:
-                await self.create_tickets_background(ticket.name, ticket.amount, ticket.is_valid, ticket.price)
+                job = await job_service.create_job(
+                    db,
+                    kind=BULK_TICKET_JOB,
+                    total=ticket.amount,
+                    payload={"name": ticket.name, "is_valid": ticket.is_valid, "price": ticket.price},
+                )
+                job_runner.submit(job.id)
 
                 return {
                     "success": True,
-                    "tickets_created": ticket.amount,
+                    "tickets_created": 0,
+                    "job_id": job.id,
                 }
             except SQLAlchemyError as e:
                 await db.rollback()
-                logger.error(f"Bulk ticket creation failed: {str(e)}")
+                logger.error(f"Bulk ticket job creation failed: {str(e)}")
 
                 raise HTTPException(500, "Failed to create tickets")
         else:
             try:
-                ticket_records = [
-                    {
-                        "price": ticket.price,
-                        "name": ticket.name,
-                        "is_valid": ticket.is_valid,
-                    }
-                    for _ in range(ticket.amount)
-                ]
-
-                CHUNK_SIZE = 500
-
-                for chunk in chunked(ticket_records, CHUNK_SIZE):
-                    stmt = insert(Ticket).values(chunk)
-
-                    await db.execute(stmt)
-
+                await bulk_insert(
+                    db,
+                    Ticket.__table__,
+                    BULK_TICKET_COLUMNS,
+                    self._bulk_rows(ticket.name, ticket.amount, ticket.is_valid, ticket.price),
+                )
+                delta = StatsDelta()
+                delta.add(None, ticket.is_valid, ticket.price, ticket.amount)
+                await ticket_stats_service.apply(db, delta)
                 await db.commit()
+                row_counter.add(Ticket.__tablename__, ticket.amount)
 
                 return {
                     "success": True,
@@ -97,74 +196,430 @@ class TicketService:
 
                 raise HTTPException(500, "Failed to create tickets")
 
-    async def update_ticket(self, db: AsyncSession, ticket: Ticket, update_data: TicketUpdateSchema) -> Ticket:
-        if update_data.user_id and not await self._validate_user_id(db, update_data.user_id):
-            raise HTTPException(400, "Invalid user_id")
+    async def import_tickets(self, db: AsyncSession, file: UploadFile, file_format: FileFormat) -> dict:
+        """
+        Create one ticket per line of an NDJSON/CSV upload. The file is read incrementally and handled
+        IMPORT_BATCH_SIZE rows at a time: validation, one set-based user_id lookup, one bulk write and a
+        commit per batch, so neither the file nor the rows are ever held whole
+        """
+        created = 0
+        failed = 0
+        errors = []
 
-        update_dict = update_data.model_dump(exclude_unset=False)
-        return await self._update_and_save(db, ticket, update_dict)
+        def reject(line: int, error: str) -> None:
+            nonlocal failed
+            failed += 1
 
-    async def patch_ticket(self, db: AsyncSession, ticket: Ticket, update_data: TicketPATCHSchema) -> Ticket:
-        if update_data.user_id and not await self._validate_user_id(db, update_data.user_id):
-            raise HTTPException(400, "Invalid user_id")
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": line, "error": error})
+
+        async for batch in achunked(read_records(file, file_format), IMPORT_BATCH_SIZE):
+            valid = []
 
+            for line, record, error in batch:
+                if error:
+                    reject(line, error)
+                    continue
+
+                try:
+                    valid.append((line, TicketCreateSchema.model_validate(record)))
+                except ValidationError as e:
+                    reject(line, describe_validation_error(e))
+
+            user_ids = {ticket.user_id for _, ticket in valid if ticket.user_id}
+            existing_user_ids = set()
+
+            if user_ids:
+                existing_user_ids = set((await db.scalars(select(User.id).where(User.id.in_(user_ids)))).all())
+
+            rows = []
+            now = datetime.now(UTC)
+
+            for line, ticket in valid:
+                if ticket.user_id and ticket.user_id not in existing_user_ids:
+                    reject(line, f"user_id {ticket.user_id} does not exist")
+                    continue
+
+                rows.append((line, (ticket.user_id or None, ticket.price, ticket.name, ticket.is_valid, now, now)))
+
+            if not rows:
+                continue
+
+            try:
+                await bulk_insert(db, Ticket.__table__, IMPORT_TICKET_COLUMNS, (row for _, row in rows))
+                delta = StatsDelta()
+
+                for _, (user_id, price, _, is_valid, _, _) in rows:
+                    delta.add(user_id, is_valid, price)
+
+                await ticket_stats_service.apply(db, delta)
+                await db.commit()
+            except SQLAlchemyError as e:
+                # e.g. a user deleted between the lookup and the write. The whole batch is rolled back,
+                # its COPY included, batches committed before stay
+                await db.rollback()
+                logger.error(f"Ticket import batch failed: {str(e)}")
+
+                for line, _ in rows:
+                    reject(line, "Batch rejected by the database")
+
+                continue
+
+            created += len(rows)
+            row_counter.add(Ticket.__tablename__, len(rows))
+
+        return {
+            "success": failed == 0,
+            "tickets_created": created,
+            "rows_failed": failed,
+            "errors": sorted(errors, key=lambda error: error["line"]),
+        }
+
+    async def update_ticket(
+            self,
+            db: AsyncSession,
+            ticket_id: int,
+            update_data: TicketUpdateSchema,
+            expected: Optional[List[datetime]] = None,
+    ) -> Ticket:
+        update_dict = update_data.model_dump(exclude_unset=False)
+        return await self._update_and_save(db, ticket_id, update_dict, expected)
+
+    async def patch_ticket(
+            self,
+            db: AsyncSession,
+            ticket_id: int,
+            update_data: TicketPATCHSchema,
+            expected: Optional[List[datetime]] = None,
+    ) -> Ticket:
         update_dict = update_data.model_dump(exclude_unset=True)
-        return await self._update_and_save(db, ticket, update_dict)
+
+        if not update_dict:
+            ticket = await self.get_ticket_by_id(db, ticket_id)
+
+            if not ticket:
+                raise HTTPException(404, "Ticket not found")
+
+            if expected is not None and not matches_expected(ticket.updated_at, expected):
+                raise precondition_failed()
+
+            return ticket
+
+        return await self._update_and_save(db, ticket_id, update_dict, expected)
 
     async def delete_ticket(self, db: AsyncSession, ticket: Ticket) -> None:
         try:
-            await db.delete(ticket)
+            # The counters are adjusted by what was actually deleted, `ticket` may come from the cache
+            result = await db.execute(
+                delete(Ticket)
+                .where(Ticket.id == ticket.id)
+                .returning(Ticket.user_id, Ticket.is_valid, Ticket.price)
+            )
+            deleted = result.all()
+            delta = StatsDelta()
+
+            for row in deleted:
+                delta.remove(row.user_id, row.is_valid, row.price)
+
+            await ticket_stats_service.apply(db, delta)
             await db.commit()
+            # Nothing is returned when a concurrent request deleted the ticket first
+            row_counter.add(Ticket.__tablename__, -len(deleted))
+            await entity_cache.invalidate(ticket_key(ticket.id))
         except SQLAlchemyError as e:
             await db.rollback()
             logger.error(f"Ticket deletion failed: {str(e)}")
 
             raise HTTPException(500, "Failed to delete ticket")
 
-    async def create_tickets_background(
-            self,
-            name: str,
-            amount: int,
-            is_valid: bool,
-            price: float
-    ):
-        async with AsyncSessionLocal() as db:
-            ticket_records = [
-                {
-                    "price": price,
-                    "name": name,
-                    "is_valid": is_valid,
-                }
-                for _ in range(amount)
-            ]
+    async def get_tickets_by_ids(self, db: AsyncSession, ticket_ids: List[int]) -> Tuple[List[Ticket], List[int]]:
+        """Cached tickets are served from the cache, all the others come from one WHERE id IN (...)"""
+        ticket_ids = list(dict.fromkeys(ticket_ids))
+        tickets = {}
+        misses = []
 
-            for chunk in chunked(ticket_records, 1000):
-                stmt = insert(Ticket).values(chunk)
-                await db.execute(stmt)
+        for ticket_id in ticket_ids:
+            cached = await entity_cache.get(ticket_key(ticket_id))
 
-            await db.commit()
+            if cached:
+                tickets[ticket_id] = await attach_entity(db, Ticket, cached)
+            else:
+                misses.append(ticket_id)
+
+        if misses:
+            epoch = entity_cache.epoch
+            result = await db.scalars(select(Ticket).where(Ticket.id.in_(misses)))
+
+            cacheable = on_primary(db)
 
-    async def _validate_user_id(self, db: AsyncSession, user_id: int) -> Optional[User]:
-        user = await db.execute(
-            select(User)
-            .where(User.id == user_id)
+            for ticket in result.all():
+                tickets[ticket.id] = ticket
+
+                if cacheable:
+                    await entity_cache.set(ticket_key(ticket.id), entity_to_dict(ticket), epoch)
+
+        return [tickets[ticket_id] for ticket_id in ticket_ids if ticket_id in tickets], missing_ids(ticket_ids, tickets)
+
+    async def patch_tickets(self, db: AsyncSession, items: List[TicketBatchPatchItemSchema]) -> Tuple[List[Ticket], List[int]]:
+        """
+        Apply a different PATCH to every ticket in one transaction: one lookup of all ids, one of all
+        target users, then a bulk UPDATE by primary key. An unknown user_id rejects the whole batch
+        """
+        changes = {}
+
+        for item in items:
+            changes.setdefault(item.id, {}).update(item.model_dump(exclude_unset=True, exclude={"id"}))
+
+        # Locked until the commit, the stats delta is computed from these values
+        result = await db.execute(
+            select(Ticket.id, Ticket.user_id, Ticket.is_valid, Ticket.price)
+            .where(Ticket.id.in_(changes))
+            .order_by(Ticket.id)
+            .with_for_update()
         )
+        previous = {row.id: row for row in result.all()}
+        found_ids = set(previous)
+        not_found = missing_ids(list(changes), found_ids)
 
-        return user.scalar_one_or_none()
+        target_user_ids = {change["user_id"] for change in changes.values() if change.get("user_id")}
 
-    async def _update_and_save(self, db: AsyncSession, ticket: Ticket, update_data: dict) -> Ticket:
-        for field, value in update_data.items():
-            setattr(ticket, field, value)
+        if target_user_ids:
+            existing_user_ids = set((await db.scalars(select(User.id).where(User.id.in_(target_user_ids)))).all())
+            invalid_user_ids = sorted(target_user_ids - existing_user_ids)
+
+            if invalid_user_ids:
+                raise HTTPException(400, f"Invalid user_id: {invalid_user_ids}")
+
+        update_params = [{"id": ticket_id, **changes[ticket_id]} for ticket_id in found_ids if changes[ticket_id]]
+        delta = StatsDelta()
+
+        for ticket_id in found_ids:
+            delta.replace(previous[ticket_id], changes[ticket_id])
 
         try:
-            db.add(ticket)
+            if update_params:
+                await db.execute(update(Ticket), update_params)
+                await ticket_stats_service.apply(db, delta)
+
+            result = await db.scalars(
+                select(Ticket)
+                .where(Ticket.id.in_(found_ids))
+                .order_by(Ticket.id)
+                .execution_options(populate_existing=True)
+            )
+            tickets = list(result.all())
             await db.commit()
-            await db.refresh(ticket)
+        except IntegrityError as e:
+            await db.rollback()
 
-            return ticket
+            if not is_foreign_key_violation(e):
+                raise
+
+            raise HTTPException(400, "Invalid user_id")
+
+        await entity_cache.invalidate(*[ticket_key(ticket.id) for ticket in tickets])
+
+        return tickets, not_found
+
+    async def delete_tickets(self, db: AsyncSession, ticket_ids: List[int]) -> Tuple[List[int], List[int]]:
+        try:
+            result = await db.execute(
+                delete(Ticket)
+                .where(Ticket.id.in_(ticket_ids))
+                .returning(Ticket.id, Ticket.user_id, Ticket.is_valid, Ticket.price)
+            )
+            deleted = result.all()
+            delta = StatsDelta()
+
+            for row in deleted:
+                delta.remove(row.user_id, row.is_valid, row.price)
+
+            await ticket_stats_service.apply(db, delta)
+            await db.commit()
+        except SQLAlchemyError as e:
+            await db.rollback()
+            logger.error(f"Batch ticket deletion failed: {str(e)}")
+
+            raise HTTPException(500, "Failed to delete tickets")
+
+        deleted_ids = sorted(row.id for row in deleted)
+        row_counter.add(Ticket.__tablename__, -len(deleted_ids))
+        await entity_cache.invalidate(*[ticket_key(ticket_id) for ticket_id in deleted_ids])
+
+        return deleted_ids, missing_ids(ticket_ids, deleted_ids)
+
+    async def bulk_update_tickets(self, db: AsyncSession, data: TicketBulkUpdateSchema) -> int:
+        """Apply one change set to every ticket matching the filter, returns how many were changed"""
+        changes = data.changes.model_dump(exclude_unset=True)
+
+        if not changes:
+            raise HTTPException(400, "No changes given")
+
+        # Checked once here instead of per row, the foreign key still guards against a user deleted meanwhile
+        if changes.get("user_id") and not await db.scalar(select(User.id).where(User.id == changes["user_id"])):
+            raise HTTPException(400, "Invalid user_id")
+
+        return await self._mutate_in_batches(db, data.filter, changes)
+
+    async def bulk_delete_tickets(self, db: AsyncSession, filters: TicketBulkFilterSchema) -> int:
+        """Delete every ticket matching the filter, returns how many were deleted"""
+        deleted = await self._mutate_in_batches(db, filters, None)
+        row_counter.add(Ticket.__tablename__, -deleted)
+
+        return deleted
+
+    async def create_tickets_background(self, job: Job) -> None:
+        """
+        Handler of BULK_TICKET_JOB. Every batch is committed together with its stats and the job progress,
+        so a job resumed after a shutdown or crash writes only the rows that are still missing
+        """
+        remaining = job.total - job.done
+        rows = self._bulk_rows(job.payload["name"], remaining, job.payload["is_valid"], job.payload["price"])
+
+        while remaining > 0 and not job_runner.is_stopping:
+            batch_size = min(BULK_BATCH_SIZE, remaining)
+
+            async with AsyncSessionLocal() as db:
+                # Progress first, a job cancelled in the meantime stops before writing the batch
+                if not await job_service.add_progress(db, job.id, batch_size):
+                    await db.rollback()
+                    return
+
+                await bulk_insert(db, Ticket.__table__, BULK_TICKET_COLUMNS, islice(rows, batch_size))
+                delta = StatsDelta()
+                delta.add(None, job.payload["is_valid"], job.payload["price"], batch_size)
+                await ticket_stats_service.apply(db, delta)
+                await db.commit()
+
+            row_counter.add(Ticket.__tablename__, batch_size)
+            remaining -= batch_size
+
+    def _bulk_rows(self, name: str, amount: int, is_valid: bool, price: float) -> Iterator[tuple]:
+        # Python-side column defaults don't run for COPY, so the timestamps are filled in here.
+        # repeat() hands out the same tuple lazily, nothing proportional to amount is kept in memory
+        now = datetime.now(UTC)
+
+        return repeat((price, name, is_valid, now, now), amount)
+
+    async def _mutate_in_batches(
+            self,
+            db: AsyncSession,
+            filters: TicketBulkFilterSchema,
+            changes: Optional[dict],
+    ) -> int:
+        """
+        Walk the tickets matching `filters` in id order, BULK_MUTATION_BATCH_SIZE at a time: lock the
+        batch with SELECT ... FOR UPDATE, UPDATE it with `changes` (or DELETE it when `changes` is None)
+        and commit together with the stats. No lock outlives its batch, so batches committed before
+        a failure stay committed. Returns the number of affected rows
+        """
+        affected = 0
+        last_id = 0
+
+        while True:
+            try:
+                result = await db.execute(
+                    filters.apply(select(Ticket.id, Ticket.user_id, Ticket.is_valid, Ticket.price))
+                    .where(Ticket.id > last_id)
+                    .order_by(Ticket.id)
+                    .limit(BULK_MUTATION_BATCH_SIZE)
+                    .with_for_update()
+                )
+                rows = result.all()
+
+                if not rows:
+                    break
+
+                ticket_ids = [row.id for row in rows]
+                delta = StatsDelta()
+
+                if changes is None:
+                    result = await db.execute(delete(Ticket).where(Ticket.id.in_(ticket_ids)))
+
+                    for row in rows:
+                        delta.remove(row.user_id, row.is_valid, row.price)
+                else:
+                    result = await db.execute(update(Ticket).where(Ticket.id.in_(ticket_ids)).values(**changes))
+
+                    for row in rows:
+                        delta.replace(row, changes)
+
+                await ticket_stats_service.apply(db, delta)
+                await db.commit()
+            except SQLAlchemyError as e:
+                await db.rollback()
+
+                if isinstance(e, IntegrityError) and is_foreign_key_violation(e):
+                    raise HTTPException(400, "Invalid user_id")
+
+                logger.error(f"Bulk ticket mutation failed after {affected} rows: {str(e)}")
+
+                raise HTTPException(500, "Failed to change tickets")
+
+            affected += result.rowcount
+            last_id = ticket_ids[-1]
+            await entity_cache.invalidate(*[ticket_key(ticket_id) for ticket_id in ticket_ids])
+
+            if len(ticket_ids) < BULK_MUTATION_BATCH_SIZE:
+                break
+
+        return affected
+
+    async def _update_and_save(
+            self,
+            db: AsyncSession,
+            ticket_id: int,
+            update_data: dict,
+            expected: Optional[List[datetime]] = None,
+    ) -> Ticket:
+        """
+        One UPDATE ... RETURNING, a missing ticket shows up as no returned row and an unknown
+        user_id as a foreign key violation, so nothing has to be loaded or validated beforehand.
+        Only a change of owner, validity or price first locks the row to read what the stats lose.
+        With `expected` (If-Match) the UPDATE only matches those versions, no row back means 404 or 412
+        """
+        delta = StatsDelta()
+        condition = Ticket.id == ticket_id
+
+        if expected is not None:
+            condition &= Ticket.updated_at.in_(expected)
+
+        try:
+            if update_data.keys() & {"user_id", "is_valid", "price"}:
+                previous = (await db.execute(
+                    select(Ticket.user_id, Ticket.is_valid, Ticket.price)
+                    .where(condition)
+                    .with_for_update()
+                )).one_or_none()
+
+                if previous:
+                    delta.replace(previous, update_data)
+
+            ticket = await db.scalar(
+                update(Ticket)
+                .where(condition)
+                .values(**update_data)
+                .returning(Ticket)
+            )
+            await ticket_stats_service.apply(db, delta)
+            await db.commit()
         except IntegrityError as e:
             await db.rollback()
-            raise ValueError(f"Database integrity error: {e}")
 
+            if not is_foreign_key_violation(e):
+                raise
+
+            raise HTTPException(400, "Invalid user_id")
+
+        if ticket is None:
+            if expected is not None and await db.scalar(select(Ticket.id).where(Ticket.id == ticket_id)):
+                raise precondition_failed()
+
+            raise HTTPException(404, "Ticket not found")
+
+        await entity_cache.invalidate(ticket_key(ticket.id))
+
+        return ticket
 
 ticket_service = TicketService()
+job_runner.register(BULK_TICKET_JOB, ticket_service.create_tickets_background)
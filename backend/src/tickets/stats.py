@@ -0,0 +1,167 @@
+import math
+from typing import Dict, List, Optional, Iterable
+
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.bulk import conflict_insert
+from src.tickets.constants import UNOWNED_STATS_ID
+from src.tickets.models import Ticket, TicketStats
+
+STATS_FIELDS = ("tickets", "valid_tickets", "total_price")
+
+
+class StatsDelta:
+    """Changes to ticket_stats collected while writing tickets, applied with one upsert before the commit"""
+
+    def __init__(self):
+        # owner -> [tickets, valid_tickets, total_price]
+        self.changes: Dict[int, List[float]] = {}
+
+    def add(self, user_id: Optional[int], is_valid: bool, price: float, count: int = 1) -> None:
+        change = self.changes.setdefault(user_id or UNOWNED_STATS_ID, [0, 0, 0.0])
+        change[0] += count
+        change[1] += count if is_valid else 0
+        change[2] += price * count
+
+    def remove(self, user_id: Optional[int], is_valid: bool, price: float, count: int = 1) -> None:
+        self.add(user_id, is_valid, price, -count)
+
+    def replace(self, old, new: dict) -> None:
+        """`old` is a row with user_id, is_valid and price, `new` the values written over it"""
+        self.remove(old.user_id, old.is_valid, old.price)
+        self.add(
+            new.get("user_id", old.user_id),
+            new.get("is_valid", old.is_valid),
+            new.get("price", old.price),
+        )
+
+    def __bool__(self) -> bool:
+        return any(any(change) for change in self.changes.values())
+
+
+class TicketStatsService:
+    async def apply(self, db: AsyncSession, delta: StatsDelta) -> None:
+        """
+        Add `delta` to the counters inside the caller's transaction. Rows are upserted in user_id order,
+        so concurrent writers touching the same owners lock them in the same order and can't deadlock
+        """
+        if not delta:
+            return
+
+        rows = [
+            {"user_id": user_id, "tickets": tickets, "valid_tickets": valid_tickets, "total_price": total_price}
+            for user_id, (tickets, valid_tickets, total_price) in sorted(delta.changes.items())
+            if tickets or valid_tickets or total_price
+        ]
+        stmt = conflict_insert(db, TicketStats).values(rows)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[TicketStats.user_id],
+                set_={field: getattr(TicketStats, field) + getattr(stmt.excluded, field) for field in STATS_FIELDS},
+            )
+        )
+
+    async def disown(self, db: AsyncSession, user_ids: List[int]) -> None:
+        """The tickets of `user_ids` lost their owner, their counters move to the unowned row"""
+        result = await db.execute(
+            select(TicketStats)
+            .where(TicketStats.user_id.in_(user_ids))
+            .order_by(TicketStats.user_id)
+            .with_for_update()
+        )
+        delta = StatsDelta()
+        unowned = delta.changes.setdefault(UNOWNED_STATS_ID, [0, 0, 0.0])
+
+        for stats in result.scalars().all():
+            counters = [stats.tickets, stats.valid_tickets, stats.total_price]
+            delta.changes[stats.user_id] = [-value for value in counters]
+            unowned[:] = [total + value for total, value in zip(unowned, counters)]
+
+        await self.apply(db, delta)
+
+    async def get_user_stats(self, db: AsyncSession, user_id: int) -> dict:
+        stats = await db.get(TicketStats, user_id)
+
+        return {
+            "user_id": user_id,
+            **{field: getattr(stats, field) if stats else 0 for field in STATS_FIELDS},
+        }
+
+    async def get_totals(self, db: AsyncSession) -> dict:
+        # One row per owner instead of one per ticket
+        row = (await db.execute(
+            select(
+                func.coalesce(func.sum(TicketStats.tickets), 0).label("tickets"),
+                func.coalesce(func.sum(TicketStats.valid_tickets), 0).label("valid_tickets"),
+                func.coalesce(func.sum(TicketStats.total_price), 0).label("total_price"),
+                func.count().filter(TicketStats.user_id != UNOWNED_STATS_ID, TicketStats.tickets > 0).label("owners"),
+            )
+        )).one()
+        unowned = await db.get(TicketStats, UNOWNED_STATS_ID)
+
+        return {
+            "tickets": row.tickets,
+            "valid_tickets": row.valid_tickets,
+            "total_price": row.total_price,
+            "owners": row.owners,
+            "unowned_tickets": unowned.tickets if unowned else 0,
+        }
+
+    async def reconcile(self, db: AsyncSession, fix: bool = True) -> List[dict]:
+        """
+        Recompute every counter from the tickets table and return the owners whose stored counters
+        were off. With `fix` the table is rebuilt from the recomputed values in the same transaction,
+        on Postgres ticket writes are blocked meanwhile so nothing slips in between
+        """
+        if fix and db.bind.dialect.name == "postgresql":
+            await db.execute(text("LOCK TABLE tickets IN SHARE MODE"))
+
+        owner = func.coalesce(Ticket.user_id, UNOWNED_STATS_ID)
+        actual_rows = await db.execute(
+            select(
+                owner.label("user_id"),
+                func.count().label("tickets"),
+                func.count().filter(Ticket.is_valid.is_(True)).label("valid_tickets"),
+                func.sum(Ticket.price).label("total_price"),
+            )
+            .group_by(owner)
+        )
+        actual = {row.user_id: (row.tickets, row.valid_tickets, row.total_price) for row in actual_rows}
+        stored = {
+            stats.user_id: (stats.tickets, stats.valid_tickets, stats.total_price)
+            for stats in (await db.scalars(select(TicketStats))).all()
+        }
+
+        drift = [
+            {"user_id": user_id, "stored": stored.get(user_id), "actual": actual.get(user_id)}
+            for user_id in sorted(actual.keys() | stored.keys())
+            if not _same_counters(stored.get(user_id), actual.get(user_id))
+        ]
+
+        if fix:
+            await db.execute(delete(TicketStats))
+
+            if actual:
+                await db.execute(
+                    TicketStats.__table__.insert(),
+                    [
+                        {"user_id": user_id, "tickets": tickets, "valid_tickets": valid, "total_price": price}
+                        for user_id, (tickets, valid, price) in actual.items()
+                    ],
+                )
+
+            await db.commit()
+
+        return drift
+
+
+def _same_counters(stored: Optional[Iterable], actual: Optional[Iterable]) -> bool:
+    stored = tuple(stored or (0, 0, 0.0))
+    actual = tuple(actual or (0, 0, 0.0))
+
+    # Prices are floats, the running sum and a fresh SUM() may differ in the last bits
+    return stored[:2] == actual[:2] and math.isclose(stored[2], actual[2], rel_tol=1e-9, abs_tol=1e-6)
+
+
+ticket_stats_service = TicketStatsService()
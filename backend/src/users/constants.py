@@ -0,0 +1,11 @@
+# Upper bound for the number of users in one POST /users/bulk request
+MAX_BULK_USERS = 10000
+
+# Users looked up, hashed and inserted together by POST /users/bulk
+USER_BULK_BATCH_SIZE = 1000
+
+# Tickets embedded per user by ?include=tickets, unless tickets_limit says otherwise
+DEFAULT_TICKETS_LIMIT = 10
+
+# Upper bound for tickets_limit
+MAX_TICKETS_LIMIT = 100
@@ -1,8 +1,10 @@
-from fastapi import HTTPException
+from fastapi import HTTPException, Request, Response
 from fastapi.param_functions import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.conditional import is_conditional, check_not_modified, set_validators
 from src.database import get_db
+from src.users.schemas import UserIncludeParams
 from src.users.service import user_service
 from src.users.models import User
 
@@ -14,3 +16,31 @@ async def is_user_id_valid(user_id: int, db: AsyncSession = Depends(get_db)) ->
         raise HTTPException(status_code=404, detail="User not found")
 
     return user
+
+
+async def get_fresh_user(
+        user_id: int,
+        request: Request,
+        response: Response,
+        include: UserIncludeParams = Depends(),
+        db: AsyncSession = Depends(get_db),
+) -> User:
+    """
+    is_user_id_valid for GETs: a client whose copy is current gets a 304 decided on updated_at alone.
+    Embedded tickets change without touching the user's updated_at, so ?include=tickets is never conditional
+    """
+    if include.tickets:
+        return await is_user_id_valid(user_id, db)
+
+    if is_conditional(request):
+        updated_at = await user_service.get_user_version(db, user_id)
+
+        if updated_at is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        check_not_modified(request, updated_at)
+
+    user = await is_user_id_valid(user_id, db)
+    set_validators(response, user.updated_at)
+
+    return user
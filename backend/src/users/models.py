@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index
 from datetime import datetime, UTC
 
 from sqlalchemy.orm import relationship
@@ -8,6 +8,10 @@ from src.database import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Backs the (created_at, id) keyset pagination of the listing
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     username = Column(String, nullable=False)
@@ -18,9 +22,11 @@ class User(Base):
         default=lambda: datetime.now(UTC),
         nullable=False
     )
+    # Also the version behind the ETag, every UPDATE statement bumps it
     updated_at = Column(
         DateTime(timezone=True),
         default=lambda: datetime.now(UTC),
+        onupdate=lambda: datetime.now(UTC),
         nullable=False
     )
 
@@ -28,3 +34,6 @@ class User(Base):
     # When Pydantic tries to serialize User objects, it won't trigger async DB calls
     # Load tickets explicitly in service methods when needed using async queries
     tickets = relationship("Ticket", back_populates="user", lazy="noload")
+
+    # Not a column, set by UserService.embed_tickets() along with a bounded `tickets`
+    tickets_total = None
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi.param_functions import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.batch import BatchIdsSchema, BatchResponse, BatchDeleteResponseSchema
+from src.conditional import if_match_versions, set_validators
 from src.database import get_db
+from src.export import FileFormat, export_response
+from src.tickets.stats import ticket_stats_service
 from src.users.models import User
 from src.users.service import user_service
-from src.users.schemas import UserResponseSchema, UserCreateSchema, UserBaseSchema, UserPatchSchema
-from src.users.dependencies import is_user_id_valid
+from src.users.schemas import UserResponseSchema, UserCreateSchema, UserBaseSchema, UserPatchSchema, \
+    UserBulkCreateSchema, UserBulkResponseSchema, UserBatchPatchSchema, UserIncludeParams, \
+    UserTicketStatsResponseSchema
+from src.users.dependencies import is_user_id_valid, get_fresh_user
 from src.pagination import PaginationParams, PaginatedResponse
 
 router = APIRouter()
@@ -20,23 +30,98 @@ router = APIRouter()
     status_code=200)
 async def get_users(
         db: AsyncSession = Depends(get_db),
-        pagination: PaginationParams = Depends()):
+        pagination: PaginationParams = Depends(),
+        include: UserIncludeParams = Depends()):
     users, total = await user_service.get_users(db, pagination)
 
+    if include.tickets:
+        await user_service.embed_tickets(db, users, include.tickets_limit)
+
     return PaginatedResponse.create(users, total, pagination)
 
 
+@router.get(
+    "/users/export",
+    tags=["Users"],
+    summary="Stream every user as NDJSON or CSV",
+    response_class=StreamingResponse,
+    status_code=200)
+async def export_users(
+        export_format: FileFormat = Query(FileFormat.NDJSON, alias="format")):
+    return export_response(user_service.export_query(), "users", export_format)
+
+
+@router.post(
+    "/users/batch-get",
+    tags=["Users"],
+    summary="Get many users by id",
+    response_model=BatchResponse[UserResponseSchema],
+    status_code=200)
+async def get_users_batch(
+        batch: BatchIdsSchema,
+        db: AsyncSession = Depends(get_db)):
+    users, not_found = await user_service.get_users_by_ids(db, batch.ids)
+
+    return BatchResponse(items=users, not_found=not_found)
+
+
+@router.patch(
+    "/users/batch",
+    tags=["Users"],
+    summary="PATCH many users in one transaction",
+    response_model=BatchResponse[UserResponseSchema],
+    status_code=200)
+async def users_patch_batch(
+        batch: UserBatchPatchSchema,
+        db: AsyncSession = Depends(get_db)):
+    users, not_found = await user_service.patch_users(db, batch.items)
+
+    return BatchResponse(items=users, not_found=not_found)
+
+
+@router.delete(
+    "/users/batch",
+    tags=["Users"],
+    summary="Delete many users, their tickets are kept without an owner",
+    response_model=BatchDeleteResponseSchema,
+    status_code=200)
+async def users_delete_batch(
+        batch: BatchIdsSchema,
+        db: AsyncSession = Depends(get_db)):
+    deleted, not_found = await user_service.delete_users(db, batch.ids)
+
+    return BatchDeleteResponseSchema(deleted=deleted, not_found=not_found)
+
+
 @router.get(
     "/users/{user_id}",
     tags=["Users"],
-    summary="Get user by id",
+    summary="Get user by id, answers If-None-Match / If-Modified-Since with 304 when the user is unchanged",
     response_model=UserResponseSchema,
-    status_code=200)
+    status_code=200,
+    responses={304: {"description": "Not modified"}})
 async def get_user_by_id(
-        user: User = Depends(is_user_id_valid)):
+        user: User = Depends(get_fresh_user),
+        include: UserIncludeParams = Depends(),
+        db: AsyncSession = Depends(get_db)):
+    if include.tickets:
+        await user_service.embed_tickets(db, [user], include.tickets_limit)
+
     return user
 
 
+@router.get(
+    "/users/{user_id}/ticket-stats",
+    tags=["Users"],
+    summary="Ticket count, valid ticket count and price sum of the user's tickets",
+    response_model=UserTicketStatsResponseSchema,
+    status_code=200)
+async def get_user_ticket_stats(
+        user: User = Depends(is_user_id_valid),
+        db: AsyncSession = Depends(get_db)):
+    return await ticket_stats_service.get_user_stats(db, user.id)
+
+
 @router.post(
     "/users",
     tags=["Users"],
@@ -46,40 +131,64 @@ async def get_user_by_id(
 async def user_create(
         user: UserCreateSchema,
         db: AsyncSession = Depends(get_db)):
-    db_user = await user_service.get_user_by_email(db, email=user.email)
+    db_user = await user_service.create_user(db=db, user=user)
 
-    if db_user:
+    if not db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    return await user_service.create_user(db=db, user=user)
+    return db_user
+
+
+@router.post(
+    "/users/bulk",
+    tags=["Users"],
+    summary="Create many users at once, already registered emails are skipped",
+    response_model=UserBulkResponseSchema,
+    status_code=201)
+async def users_create_bulk(
+        users: UserBulkCreateSchema,
+        db: AsyncSession = Depends(get_db)):
+    return await user_service.create_users_bulk(db=db, users=users)
 
 
 @router.put(
     "/users/{user_id}",
     tags=["Users"],
-    summary="Update the user",
+    summary="Update the user, with If-Match only if it is still at that version",
     response_model=UserResponseSchema,
-    status_code=200)
+    status_code=200,
+    responses={412: {"description": "The user changed since the If-Match ETag"}})
 async def user_update(
+        user_id: int,
         update_data: UserBaseSchema,
-        user: User = Depends(is_user_id_valid),
+        response: Response,
+        expected: Optional[List[datetime]] = Depends(if_match_versions),
         db: AsyncSession = Depends(get_db),
 ):
-    return await user_service.update_user(db, user=user, update_data=update_data)
+    user = await user_service.update_user(db, user_id=user_id, update_data=update_data, expected=expected)
+    set_validators(response, user.updated_at)
+
+    return user
 
 
 @router.patch(
     "/users/{user_id}",
     tags=["Users"],
-    summary="PATCH the user",
+    summary="PATCH the user, with If-Match only if it is still at that version",
     response_model=UserResponseSchema,
-    status_code=200)
+    status_code=200,
+    responses={412: {"description": "The user changed since the If-Match ETag"}})
 async def user_patch(
+        user_id: int,
         update_data: UserPatchSchema,
-        user: User = Depends(is_user_id_valid),
+        response: Response,
+        expected: Optional[List[datetime]] = Depends(if_match_versions),
         db: AsyncSession = Depends(get_db),
 ):
-    return await user_service.patch_user(db, user=user, update_data=update_data)
+    user = await user_service.patch_user(db, user_id=user_id, update_data=update_data, expected=expected)
+    set_validators(response, user.updated_at)
+
+    return user
 
 
 @router.delete(
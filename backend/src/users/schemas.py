@@ -1,7 +1,12 @@
 from datetime import datetime
+from enum import Enum
 from typing import TYPE_CHECKING, List, Optional
 
-from pydantic import BaseModel, EmailStr, ConfigDict, Field
+from fastapi import Query
+from pydantic import BaseModel, EmailStr, ConfigDict, Field, model_validator
+
+from src.batch import MAX_BATCH_SIZE
+from src.users.constants import MAX_BULK_USERS, DEFAULT_TICKETS_LIMIT, MAX_TICKETS_LIMIT
 
 # Useful to prevent circular dep issue. TYPE_CHECKING is always false at runtime, so no error.
 # Meanwhile, IDE pretends it's true.
@@ -21,10 +26,29 @@ class UserPatchSchema(BaseModel):
     email: Optional[EmailStr] = None
 
 
+class UserBatchPatchItemSchema(UserPatchSchema):
+    id: int
+
+
+class UserBatchPatchSchema(BaseModel):
+    items: List[UserBatchPatchItemSchema] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
 class UserCreateSchema(UserBaseSchema):
     password: str
 
 
+class UserBulkCreateSchema(BaseModel):
+    users: List[UserCreateSchema] = Field(min_length=1, max_length=MAX_BULK_USERS)
+
+
+class UserBulkResponseSchema(BaseModel):
+    success: bool
+    users_created: int
+    # Emails that were already registered (or repeated in the request), those users were skipped
+    existing_emails: List[EmailStr]
+
+
 class UserResponseSchema(UserBaseSchema):
     id: int
     username: str
@@ -34,11 +58,52 @@ class UserResponseSchema(UserBaseSchema):
     # The string "TicketResponseSchema" is resolved when model_rebuild() is called
     # Made Optional to handle cases where tickets aren't loaded (lazy="noload")
     tickets: Optional[List["TicketResponseSchema"]] = None
+    # How many tickets the user owns in total, set together with tickets by ?include=tickets
+    tickets_total: Optional[int] = None
 
     # Basically allows to read from DB ORM model,
     # because naturally pydantic schemas are expecting dicts, not ORM objects
     model_config = ConfigDict(from_attributes=True)
 
+    @model_validator(mode="after")
+    def drop_unloaded_tickets(self) -> "UserResponseSchema":
+        # noload hands out an empty list, which would read as "owns no tickets"
+        if self.tickets_total is None:
+            self.tickets = None
+
+        return self
+
+
+class UserTicketStatsResponseSchema(BaseModel):
+    user_id: int
+    tickets: int
+    valid_tickets: int
+    total_price: float
+
+
+class UserInclude(str, Enum):
+    TICKETS = "tickets"
+
+
+class UserIncludeParams(BaseModel):
+    include: Optional[UserInclude] = None
+    tickets_limit: int = Field(DEFAULT_TICKETS_LIMIT, ge=1, le=MAX_TICKETS_LIMIT)
+
+    @property
+    def tickets(self) -> bool:
+        return self.include == UserInclude.TICKETS
+
+    def __init__(
+            self,
+            include: Optional[UserInclude] = Query(None, description="Embed related rows, 'tickets' for now"),
+            tickets_limit: int = Query(
+                DEFAULT_TICKETS_LIMIT,
+                ge=1,
+                le=MAX_TICKETS_LIMIT,
+                description="Oldest tickets embedded per user, tickets_total has the full count"),
+    ):
+        super().__init__(include=include, tickets_limit=tickets_limit)
+
 
 class UserListResponseSchema(BaseModel):
     users: list[UserResponseSchema]
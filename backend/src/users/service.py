@@ -1,31 +1,115 @@
-import hashlib
+import asyncio
 from collections.abc import Sequence
-from typing import Optional, Tuple
+from datetime import datetime
+from typing import Optional, Tuple, List
 
-from sqlalchemy import select, func
+from fastapi import HTTPException
+from sqlalchemy import Select, select, update, delete, func, true
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, aliased
+from sqlalchemy.orm.attributes import set_committed_value
 
-from src.pagination import PaginationParams
+from src.batch import missing_ids
+from src.bulk import conflict_insert
+from src.cache import entity_cache, attach_entity, entity_to_dict, user_key, ticket_key
+from src.conditional import precondition_failed, matches_expected
+from src.counting import row_counter
+from src.database import on_primary
+from src.pagination import PaginationParams, paginate
+from src.singleflight import user_flights
+from src.tickets.models import Ticket, TicketStats
+from src.tickets.stats import ticket_stats_service
 from src.users.models import User
-from src.users.schemas import UserCreateSchema, UserBaseSchema, UserPatchSchema
+from src.users.constants import USER_BULK_BATCH_SIZE
+from src.users.schemas import UserCreateSchema, UserBaseSchema, UserPatchSchema, UserBulkCreateSchema, \
+    UserBatchPatchItemSchema
+from src.users.utils import password_hasher
+from src.utils import chunked
 
 
 class UserService:
-    async def create_user(self, db: AsyncSession, user: UserCreateSchema) -> User:
-        hashed_password = hashlib.sha256(user.password.encode()).hexdigest()
-        db_user = User(
-            username=user.username,
-            email=user.email,
-            password=hashed_password,
+    async def create_user(self, db: AsyncSession, user: UserCreateSchema) -> Optional[User]:
+        """
+        One INSERT ... ON CONFLICT (email) DO NOTHING RETURNING. Returns None when the email is taken,
+        which also covers two signups racing for the same email
+        """
+        hashed_password = await password_hasher.hash(user.password)
+        db_user = await db.scalar(
+            conflict_insert(db, User)
+            .values(
+                username=user.username,
+                email=user.email,
+                password=hashed_password,
+            )
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User)
         )
-        db.add(db_user)
         await db.commit()
-        await db.refresh(db_user)
+
+        if db_user:
+            row_counter.add(User.__tablename__, 1)
 
         return db_user
 
+    async def create_users_bulk(self, db: AsyncSession, users: UserBulkCreateSchema) -> dict:
+        """
+        Insert users USER_BULK_BATCH_SIZE at a time in one transaction. Emails already registered are found
+        with one lookup per batch (so their passwords aren't hashed for nothing), ON CONFLICT catches the rest
+        """
+        created = 0
+        existing_emails = []
+
+        for batch in chunked(users.users, USER_BULK_BATCH_SIZE):
+            emails = [user.email for user in batch]
+            taken = set((await db.scalars(select(User.email).where(User.email.in_(emails)))).all())
+            new_users = [user for user in batch if user.email not in taken]
+
+            hashed_passwords = await asyncio.gather(*(password_hasher.hash(user.password) for user in new_users))
+            inserted = set()
+
+            if new_users:
+                result = await db.scalars(
+                    conflict_insert(db, User)
+                    .values([
+                        {"username": user.username, "email": user.email, "password": hashed_password}
+                        for user, hashed_password in zip(new_users, hashed_passwords)
+                    ])
+                    .on_conflict_do_nothing(index_elements=[User.email])
+                    .returning(User.email)
+                )
+                inserted = set(result.all())
+
+            created += len(inserted)
+            # Repeated emails within the request: the first one wins, later ones count as existing
+            remaining = set(inserted)
+
+            for email in emails:
+                if email in remaining:
+                    remaining.discard(email)
+                else:
+                    existing_emails.append(email)
+
+        await db.commit()
+        row_counter.add(User.__tablename__, created)
+
+        return {
+            "success": True,
+            "users_created": created,
+            "existing_emails": existing_emails,
+        }
+
+    async def verify_password(self, db: AsyncSession, user: User, password: str) -> bool:
+        """Check a password, a legacy sha256 hash or one with outdated scrypt parameters is replaced on success"""
+        matches, needs_rehash = await password_hasher.verify(password, user.password)
+
+        if matches and needs_rehash:
+            user.password = await password_hasher.hash(password)
+            await db.commit()
+            await entity_cache.invalidate(user_key(user.id))
+
+        return matches
+
     async def get_user_by_email(self, db: AsyncSession, email: str) -> Optional[User]:
         result = await db.execute(
             select(User).where(User.email == email)
@@ -34,13 +118,122 @@ class UserService:
         return result.scalar_one_or_none()
 
     async def get_user_by_id(self, db: AsyncSession, user_id: int) -> Optional[User]:
-        result = await db.execute(
-            select(User)
-            .options(selectinload(User.tickets))
-            .where(User.id == user_id)
-        )
+        cached = await entity_cache.get(user_key(user_id))
 
-        return result.scalar_one_or_none()
+        if cached:
+            return await attach_entity(db, User, cached)
+
+        epoch = entity_cache.epoch
+        user = None
+
+        async def load() -> Optional[dict]:
+            nonlocal user
+            result = await db.execute(
+                select(User)
+                .where(User.id == user_id)
+            )
+            user = result.scalar_one_or_none()
+
+            if not user:
+                return None
+
+            data = entity_to_dict(user)
+
+            # A lagging replica could put back a row a write just invalidated, only primary reads are cached
+            if on_primary(db):
+                await entity_cache.set(user_key(user_id), data, epoch)
+
+            return data
+
+        # Concurrent misses for the same user share one query, only the caller that ran it has `user` set
+        data = await user_flights.do((db.bind, user_id), load, epoch)
+
+        if user is not None or data is None:
+            return user
+
+        return await attach_entity(db, User, data)
+
+    async def get_user_version(self, db: AsyncSession, user_id: int) -> Optional[datetime]:
+        """
+        updated_at only, enough to answer a conditional GET without loading the user. Always read from the
+        database: the entity cache is per process and misses writes handled by the other workers
+        """
+        updated_at = await db.scalar(select(User.updated_at).where(User.id == user_id))
+        cached = await entity_cache.get(user_key(user_id))
+
+        # The 200 that follows must not be served from a copy older than the version just read
+        if cached and cached["updated_at"] != updated_at:
+            await entity_cache.invalidate(user_key(user_id))
+
+        return updated_at
+
+    async def embed_tickets(self, db: AsyncSession, users: Sequence[User], limit: int) -> None:
+        """
+        Set `tickets` (the oldest `limit` ones) and `tickets_total` on every user with one query.
+        On Postgres a LATERAL join reads at most `limit` rows per user straight from the
+        (user_id, created_at, id) index; other databases rank the rows with a window function.
+        The total is the user's ticket_stats counter, a primary key lookup however many tickets they own.
+        """
+        user_ids = [user.id for user in users]
+
+        if not user_ids:
+            return
+
+        total = func.coalesce(
+            select(TicketStats.tickets)
+            .where(TicketStats.user_id == User.id)
+            .correlate(User)
+            .scalar_subquery(),
+            0,
+        ).label("tickets_total")
+
+        if db.bind.dialect.name == "postgresql":
+            first_tickets = (
+                select(Ticket)
+                .where(Ticket.user_id == User.id)
+                .order_by(Ticket.created_at, Ticket.id)
+                .limit(limit)
+                .lateral()
+            )
+            ticket = aliased(Ticket, first_tickets)
+            query = (
+                select(User.id, total, ticket)
+                .outerjoin(first_tickets, true())
+                .where(User.id.in_(user_ids))
+                .order_by(User.id, first_tickets.c.created_at, first_tickets.c.id)
+            )
+        else:
+            ranked = (
+                select(
+                    Ticket,
+                    func.row_number()
+                    .over(partition_by=Ticket.user_id, order_by=(Ticket.created_at, Ticket.id))
+                    .label("position"),
+                )
+                .where(Ticket.user_id.in_(user_ids))
+                .subquery()
+            )
+            ticket = aliased(Ticket, ranked)
+            query = (
+                select(User.id, total, ticket)
+                .outerjoin(ranked, (ranked.c.user_id == User.id) & (ranked.c.position <= limit))
+                .where(User.id.in_(user_ids))
+                .order_by(User.id, ranked.c.position)
+            )
+
+        tickets = {user_id: [] for user_id in user_ids}
+        totals = {}
+
+        for user_id, tickets_total, user_ticket in (await db.execute(query)).all():
+            totals[user_id] = tickets_total
+
+            # Outer join, a user without tickets comes back once with no ticket
+            if user_ticket is not None:
+                tickets[user_id].append(user_ticket)
+
+        for user in users:
+            set_committed_value(user, "tickets", tickets[user.id])
+            user.tickets_total = totals.get(user.id, 0)
 
     async def get_user_with_tickets(self, db: AsyncSession, user_id: int) -> Optional[User]:
         """Get user with their associated tickets loaded"""
@@ -51,53 +244,182 @@ class UserService:
         )
         return result.scalar_one_or_none()
 
-    async def get_users(self, db: AsyncSession, pagination: PaginationParams) -> Tuple[Sequence[User], int]:
-        count_result = await db.execute(select(func.count(User.id)))
-        # Returns ONE single value from the first row, first column.
-        # Returns a ScalarsResult object that gives you the first column from multiple rows.
-        total = count_result.scalar()
+    async def get_users(self, db: AsyncSession, pagination: PaginationParams) -> Tuple[Sequence[User], Optional[int]]:
+        return await paginate(db, User, pagination)
 
-        users_result = await db.execute(
-            select(User)
-            .order_by(User.created_at)
-            .offset(pagination.skip)
-            .limit(pagination.limit)
+    def export_query(self) -> Select:
+        # Plain columns instead of ORM objects, and never the password hash
+        return (
+            select(
+                User.id,
+                User.username,
+                User.email,
+                User.created_at,
+                User.updated_at,
+            )
+            .order_by(User.id)
         )
 
-        users = users_result.scalars().all()
-
-        return list(users), total
-
-    async def patch_user(self, db: AsyncSession, user: User, update_data: UserPatchSchema) -> User:
+    async def patch_user(
+            self,
+            db: AsyncSession,
+            user_id: int,
+            update_data: UserPatchSchema,
+            expected: Optional[List[datetime]] = None,
+    ) -> User:
         user_data = update_data.model_dump(exclude_unset=True)
 
         if not user_data:
+            user = await self.get_user_by_id(db, user_id)
+
+            if not user:
+                raise HTTPException(404, "User not found")
+
+            if expected is not None and not matches_expected(user.updated_at, expected):
+                raise precondition_failed()
+
             return user
 
-        return await self._update_and_save(db, user, user_data)
+        return await self._update_and_save(db, user_id, user_data, expected)
 
-    async def update_user(self, db: AsyncSession, user: User, update_data: UserBaseSchema) -> User:
+    async def update_user(
+            self,
+            db: AsyncSession,
+            user_id: int,
+            update_data: UserBaseSchema,
+            expected: Optional[List[datetime]] = None,
+    ) -> User:
         user_data = update_data.model_dump(exclude_unset=False)
 
-        return await self._update_and_save(db, user, user_data)
+        return await self._update_and_save(db, user_id, user_data, expected)
 
     async def delete_user(self, db: AsyncSession, user: User) -> None:
-        await db.delete(user)
-        await db.commit()
+        # Tickets aren't loaded with the user, detaching them has to be set-based
+        await self.delete_users(db, [user.id])
+
+    async def get_users_by_ids(self, db: AsyncSession, user_ids: List[int]) -> Tuple[List[User], List[int]]:
+        """
+        Cached users are served from the cache, all the others come from one WHERE id IN (...).
+        Like the listing, tickets are not embedded
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        users = {}
+        misses = []
+
+        for user_id in user_ids:
+            cached = await entity_cache.get(user_key(user_id))
 
-    async def _update_and_save(self, db: AsyncSession, user: User, update_data: dict) -> User:
-        for field, value in update_data.items():
-            setattr(user, field, value)
+            if cached:
+                users[user_id] = await attach_entity(db, User, cached)
+            else:
+                misses.append(user_id)
+
+        if misses:
+            epoch = entity_cache.epoch
+            result = await db.scalars(select(User).where(User.id.in_(misses)))
+
+            cacheable = on_primary(db)
+
+            for user in result.all():
+                users[user.id] = user
+
+                if cacheable:
+                    await entity_cache.set(user_key(user.id), entity_to_dict(user), epoch)
+
+        return [users[user_id] for user_id in user_ids if user_id in users], missing_ids(user_ids, users)
+
+    async def patch_users(self, db: AsyncSession, items: List[UserBatchPatchItemSchema]) -> Tuple[List[User], List[int]]:
+        """One lookup of all ids, a bulk UPDATE by primary key and one transaction for the whole batch"""
+        changes = {}
+
+        for item in items:
+            changes.setdefault(item.id, {}).update(item.model_dump(exclude_unset=True, exclude={"id"}))
+
+        found_ids = set((await db.scalars(select(User.id).where(User.id.in_(changes)))).all())
+        update_params = [{"id": user_id, **changes[user_id]} for user_id in found_ids if changes[user_id]]
 
         try:
-            db.add(user)
+            if update_params:
+                await db.execute(update(User), update_params)
+
+            result = await db.scalars(
+                select(User)
+                .where(User.id.in_(found_ids))
+                .order_by(User.id)
+                .execution_options(populate_existing=True)
+            )
+            users = list(result.all())
             await db.commit()
-            await db.refresh(user)
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(400, "Email already registered")
 
-            return user
-        except IntegrityError as e:
+        await entity_cache.invalidate(*[user_key(user_id) for user_id in found_ids])
+
+        return users, missing_ids(list(changes), found_ids)
+
+    async def delete_users(self, db: AsyncSession, user_ids: List[int]) -> Tuple[List[int], List[int]]:
+        # The tickets stay, they just lose their owner
+        detached = await db.execute(
+            update(Ticket)
+            .where(Ticket.user_id.in_(user_ids))
+            .values(user_id=None)
+            .returning(Ticket.id)
+        )
+        ticket_ids = list(detached.scalars().all())
+        await ticket_stats_service.disown(db, user_ids)
+
+        result = await db.execute(
+            delete(User)
+            .where(User.id.in_(user_ids))
+            .returning(User.id)
+        )
+        deleted_ids = sorted(result.scalars().all())
+        await db.commit()
+
+        row_counter.add(User.__tablename__, -len(deleted_ids))
+        await entity_cache.invalidate(
+            *[user_key(user_id) for user_id in deleted_ids],
+            *[ticket_key(ticket_id) for ticket_id in ticket_ids],
+        )
+
+        return deleted_ids, missing_ids(user_ids, deleted_ids)
+
+    async def _update_and_save(
+            self,
+            db: AsyncSession,
+            user_id: int,
+            update_data: dict,
+            expected: Optional[List[datetime]] = None,
+    ) -> User:
+        # One UPDATE ... RETURNING, a missing user (or, with If-Match, a newer version) is simply no returned row
+        condition = User.id == user_id
+
+        if expected is not None:
+            condition &= User.updated_at.in_(expected)
+
+        try:
+            result = await db.execute(
+                update(User)
+                .where(condition)
+                .values(**update_data)
+                .returning(User)
+            )
+            user = result.scalar_one_or_none()
+            await db.commit()
+        except IntegrityError:
             await db.rollback()
-            raise ValueError(f"Database integrity error: {e}")
+            raise HTTPException(400, "Email already registered")
+
+        if user is None:
+            if expected is not None and await db.scalar(select(User.id).where(User.id == user_id)):
+                raise precondition_failed()
+
+            raise HTTPException(404, "User not found")
+
+        await entity_cache.invalidate(user_key(user.id))
+
+        return user
 
 
 user_service = UserService()
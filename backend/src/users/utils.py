@@ -0,0 +1,97 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+from src.config import settings as main_config
+
+# Passwords stored before the KDF was introduced: bare sha256 hex digest, no salt
+LEGACY_SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_SALT_BYTES = 16
+SCRYPT_KEY_BYTES = 32
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        # scrypt needs 128 * n * r bytes, openssl's default ceiling is too low for bigger costs
+        maxmem=256 * n * r,
+        dklen=SCRYPT_KEY_BYTES,
+    )
+
+
+class PasswordHasher:
+    """
+    scrypt hashing and verification off the event loop. The KDF runs on a dedicated thread pool
+    (hashlib releases the GIL while it works), and a semaphore keeps bursts waiting in asyncio
+    instead of piling up in the executor queue.
+    Hashes look like scrypt$<n>$<r>$<p>$<salt>$<key>, so the cost can change without breaking old ones.
+    """
+
+    def __init__(self, cost: int, workers: int):
+        self.cost = cost
+        self.workers = workers
+        self._executor = None
+        self._slots = asyncio.Semaphore(workers)
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher")
+
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _hash_sync(self, password: str) -> str:
+        salt = os.urandom(SCRYPT_SALT_BYTES)
+        key = _scrypt(password, salt, self.cost, SCRYPT_R, SCRYPT_P)
+
+        return f"scrypt${self.cost}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+    def _verify_sync(self, password: str, stored: str) -> Tuple[bool, bool]:
+        if LEGACY_SHA256_PATTERN.match(stored):
+            digest = hashlib.sha256(password.encode()).hexdigest()
+
+            return hmac.compare_digest(digest, stored), True
+
+        try:
+            _, n, r, p, salt, key = stored.split("$")
+            n, r, p = int(n), int(r), int(p)
+            expected = base64.b64decode(key)
+            actual = _scrypt(password, base64.b64decode(salt), n, r, p)
+        except ValueError:
+            return False, False
+
+        return hmac.compare_digest(actual, expected), (n, r, p) != (self.cost, SCRYPT_R, SCRYPT_P)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._hash_sync, password)
+
+    async def verify(self, password: str, stored: str) -> Tuple[bool, bool]:
+        """
+        Returns (matches, needs_rehash), legacy sha256 hashes and hashes made with other scrypt parameters
+        (n, r or p) need a rehash
+        """
+        return await self._run(self._verify_sync, password, stored)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(cost=main_config.PASSWORD_HASH_COST, workers=main_config.PASSWORD_HASH_WORKERS)
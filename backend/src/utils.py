@@ -1,4 +1,4 @@
-from typing import List, Iterator, TypeVar
+from typing import List, Iterator, TypeVar, AsyncIterable, AsyncIterator
 
 T = TypeVar('T')
 
@@ -6,4 +6,19 @@ T = TypeVar('T')
 def chunked(iterable: List[T], size: int) -> Iterator[List[T]]:
     """Split an iterable into chunks of specified size."""
     for i in range(0, len(iterable), size):
-        yield iterable[i:i + size]
\ No newline at end of file
+        yield iterable[i:i + size]
+
+
+async def achunked(iterable: AsyncIterable[T], size: int) -> AsyncIterator[List[T]]:
+    """Group an async iterable into lists of at most `size` items, consuming it lazily."""
+    chunk = []
+
+    async for item in iterable:
+        chunk.append(item)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+
+import httpx
+import pytest
+
+# Settings are read on import, so the test database has to be chosen first. The default is a throwaway
+# SQLite file; set TEST_DATABASE_URL to run the same tests against PostgreSQL (asyncpg, COPY paths included)
+TEST_DATABASE_FILE = os.path.join(tempfile.gettempdir(), f"ticketing-tests-{os.getpid()}.db")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", f"sqlite+aiosqlite:///{TEST_DATABASE_FILE}")
+
+from sqlalchemy import event, text  # noqa: E402
+
+import src.models  # noqa: E402,F401  resolves the User <-> Ticket relationship
+from src.cache import entity_cache, LRUCacheBackend  # noqa: E402
+from src.config import settings as main_config  # noqa: E402
+from src.counting import row_counter  # noqa: E402
+from src.database import Base, engine, dispose_engines  # noqa: E402
+from src.migrations import migrate  # noqa: E402
+
+
+def run_async(coroutine):
+    """
+    Run `coroutine` on a fresh event loop. Pooled connections belong to the loop that opened them,
+    so the pools are emptied before the loop closes
+    """
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await dispose_engines()
+
+    return asyncio.run(main())
+
+
+async def _reset_database() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+
+    await migrate(engine)
+
+
+@contextmanager
+def _recorded_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0].upper())
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def run():
+    return run_async
+
+
+@pytest.fixture
+def client():
+    """
+    Opens an HTTP client on the app, in process and on the running loop. The lifespan (migrations,
+    job runner, pool warmup) is not run, the database fixture takes care of the schema
+    """
+    from src.main import app
+
+    return lambda: httpx.AsyncClient(app=app, base_url="http://test")
+
+
+@pytest.fixture
+def statements():
+    """`with statements() as sent:` collects the first keyword of every statement sent in the block"""
+    return _recorded_statements
+
+
+@pytest.fixture
+def database():
+    """Empty, fully migrated database, and no cached entities or row counts left by an earlier test"""
+    run_async(_reset_database())
+    entity_cache.backend = LRUCacheBackend(main_config.CACHE_MAX_ENTRIES, main_config.CACHE_TTL)
+
+    for table_name in list(Base.metadata.tables):
+        row_counter.invalidate(table_name)
+
+    yield
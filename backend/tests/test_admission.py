@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from src.admission import AdmissionController, AdmissionMiddleware, TokenBuckets
+
+QUEUE_TIMEOUT = 0.1
+REQUEST_TIME = 0.5
+
+
+async def slow_app(scope, receive, send):
+    await asyncio.sleep(REQUEST_TIME)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def fast_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def request(app, method: str, path: str, client: str = "127.0.0.1"):
+    """(status, seconds until the response started)"""
+    scope = {"type": "http", "method": method, "path": path, "headers": [], "client": (client, 1)}
+    started = time.monotonic()
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+
+        if message["type"] == "http.response.start":
+            status = (message["status"], time.monotonic() - started)
+
+    await app(scope, receive, send)
+
+    return status
+
+
+def test_burst_beyond_the_pool_is_shed_quickly(run):
+    app = AdmissionMiddleware(slow_app, AdmissionController({}, QUEUE_TIMEOUT, None, capacity=3))
+
+    async def burst():
+        return await asyncio.gather(*(request(app, "POST", "/tickets") for _ in range(10)))
+
+    responses = run(burst())
+    admitted = [elapsed for status, elapsed in responses if status == 200]
+    shed = [elapsed for status, elapsed in responses if status == 503]
+
+    assert len(admitted) == 3
+    assert len(shed) == 7
+    assert max(shed) < REQUEST_TIME
+
+
+def test_route_classes_share_the_pool(run):
+    """Reads and writes each have a limit of the full capacity, together they still get no more"""
+    app = AdmissionMiddleware(slow_app, AdmissionController({}, QUEUE_TIMEOUT, None, capacity=4))
+
+    async def burst():
+        return await asyncio.gather(
+            *(request(app, "GET", "/tickets") for _ in range(4)),
+            *(request(app, "POST", "/tickets") for _ in range(4)),
+            request(app, "POST", "/tickets/bulk"),
+        )
+
+    statuses = [status for status, _ in run(burst())]
+
+    assert statuses == [200] * 4 + [503] * 5
+
+
+def test_clients_over_their_rate_get_429(run):
+    buckets = TokenBuckets(rate=1, burst=2)
+    app = AdmissionMiddleware(fast_app, AdmissionController({}, QUEUE_TIMEOUT, buckets, capacity=4))
+
+    async def burst():
+        statuses = [(await request(app, "GET", "/tickets"))[0] for _ in range(3)]
+        # Other clients have buckets of their own, routes outside the API are never limited
+        other = await request(app, "GET", "/tickets", client="10.0.0.2")
+        metrics = await request(app, "GET", "/metrics")
+
+        return statuses, other[0], metrics[0]
+
+    assert run(burst()) == ([200, 200, 429], 200, 200)
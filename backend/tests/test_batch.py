@@ -0,0 +1,93 @@
+from sqlalchemy import insert
+
+from src.database import AsyncSessionLocal
+from src.tickets.models import Ticket
+from src.tickets.stats import ticket_stats_service
+from src.users.models import User
+
+
+async def seed() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": 1, "username": "first", "email": "first@example.com", "password": "-"},
+            {"id": 2, "username": "second", "email": "second@example.com", "password": "-"},
+        ])
+        await db.execute(insert(Ticket), [
+            {"id": i, "name": f"ticket-{i}", "price": 10, "is_valid": True, "user_id": 1} for i in range(1, 5)
+        ])
+        # Builds the per-user counters of the rows inserted above, and commits
+        await ticket_stats_service.reconcile(db)
+
+
+def test_ticket_batch_get_patch_and_delete(database, run, client):
+    async def scenario():
+        await seed()
+
+        async with client() as http:
+            got = (await http.post("/tickets/batch-get", json={"ids": [3, 99, 1, 3]})).json()
+            patched = (await http.patch("/tickets/batch", json={"items": [
+                {"id": 1, "price": 20},
+                {"id": 2, "user_id": 2, "is_valid": False},
+                {"id": 98, "name": "gone"},
+            ]})).json()
+            refused = await http.patch("/tickets/batch", json={"items": [
+                {"id": 3, "name": "renamed"},
+                {"id": 4, "user_id": 77},
+            ]})
+            deleted = (await http.request("DELETE", "/tickets/batch", json={"ids": [4, 97, 3]})).json()
+            left = (await http.post("/tickets/batch-get", json={"ids": [1, 2, 3, 4]})).json()
+            stats = [(await http.get(f"/users/{user_id}/ticket-stats")).json() for user_id in (1, 2)]
+
+        return got, patched, refused, deleted, left, stats
+
+    got, patched, refused, deleted, left, stats = run(scenario())
+
+    assert sorted(ticket["id"] for ticket in got["items"]) == [1, 3]
+    assert got["not_found"] == [99]
+
+    changed = {ticket["id"]: ticket for ticket in patched["items"]}
+    assert changed[1]["price"] == 20
+    assert (changed[2]["user_id"], changed[2]["is_valid"]) == (2, False)
+    assert patched["not_found"] == [98]
+
+    # One unknown user_id rejects the whole batch
+    assert refused.status_code == 400
+    assert sorted(deleted["deleted"]) == [3, 4]
+    assert deleted["not_found"] == [97]
+
+    assert {ticket["id"]: ticket["name"] for ticket in left["items"]} == {1: "ticket-1", 2: "ticket-2"}
+    assert left["not_found"] == [3, 4]
+    assert [(entry["tickets"], entry["valid_tickets"], entry["total_price"]) for entry in stats] == [
+        (1, 1, 20), (1, 0, 10),
+    ]
+
+
+def test_user_batch_endpoints(database, run, client):
+    async def scenario():
+        await seed()
+
+        async with client() as http:
+            got = (await http.post("/users/batch-get", json={"ids": [2, 5]})).json()
+            patched = (await http.patch("/users/batch", json={"items": [{"id": 2, "username": "renamed"}]})).json()
+            deleted = (await http.request("DELETE", "/users/batch", json={"ids": [2, 6]})).json()
+            missing = await http.get("/users/2")
+
+        return got, patched, deleted, missing.status_code
+
+    got, patched, deleted, missing = run(scenario())
+
+    assert ([user["id"] for user in got["items"]], got["not_found"]) == ([2], [5])
+    assert patched["items"][0]["username"] == "renamed"
+    assert deleted == {"deleted": [2], "not_found": [6]}
+    assert missing == 404
+
+
+def test_batch_size_is_bounded(database, run, client):
+    async def scenario():
+        async with client() as http:
+            empty = await http.post("/tickets/batch-get", json={"ids": []})
+            too_many = await http.post("/tickets/batch-get", json={"ids": list(range(1, 1002))})
+
+        return empty.status_code, too_many.status_code
+
+    assert run(scenario()) == (422, 422)
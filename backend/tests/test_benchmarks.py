@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import json
+
+from benchmarks import endpoints
+from src.jobs.service import job_runner
+
+
+def test_every_route_has_a_scenario():
+    assert endpoints.missing_scenarios() == []
+
+
+def test_percentiles_and_regressions():
+    latencies = [float(value) for value in range(1, 101)]
+
+    assert [endpoints.percentile(latencies, fraction) for fraction in (0.5, 0.95, 0.99)] == [50.0, 95.0, 99.0]
+    assert endpoints.percentile([], 0.5) == 0.0
+
+    baseline = {"GET /tickets": {"p95": 0.010, "throughput": 100.0}}
+    within = {"GET /tickets": {"p95": 0.011, "throughput": 90.0}}
+    slower = {"GET /tickets": {"p95": 0.013, "throughput": 70.0}, "GET /users": {"p95": 1.0, "throughput": 1.0}}
+
+    assert endpoints.compare(within, baseline, 0.2) == []
+    # Routes missing from the baseline are not compared
+    assert endpoints.compare(slower, baseline, 0.2) == [
+        "GET /tickets: p95 10.00ms -> 13.00ms",
+        "GET /tickets: throughput 100.0/s -> 70.0/s",
+    ]
+
+
+def test_suite_runs_every_scenario(database, run, tmp_path, capsys, monkeypatch):
+    # The suite runs the app's lifespan, whose shutdown leaves the shared job runner stopping for good
+    monkeypatch.setattr(job_runner, "_stopping", asyncio.Event())
+    baseline = tmp_path / "endpoints.json"
+    args = argparse.Namespace(
+        tickets=200, requests=2, warmup=1, concurrency=2, tolerance=0.2,
+        baseline=str(baseline), save_baseline=True, route=None,
+    )
+
+    assert run(endpoints.main(args)) == 0
+
+    recorded = json.loads(baseline.read_text())
+    assert set(recorded["routes"]) == {scenario.route for scenario in endpoints.SCENARIOS}
+    assert all(not result["errors"] for result in recorded["routes"].values())
+    assert "FAILED" not in capsys.readouterr().out
@@ -0,0 +1,65 @@
+from datetime import datetime, UTC
+from itertools import repeat
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+
+from src.bulk import bulk_insert
+from src.database import AsyncSessionLocal
+from src.tickets.constants import BULK_TICKET_COLUMNS
+from src.tickets.models import Ticket
+from src.tickets.schemas import TicketCreateBulkSchema
+from src.tickets.service import ticket_service
+from src.tickets.stats import ticket_stats_service
+
+
+async def count_tickets() -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(Ticket))
+
+
+def test_bulk_insert_writes_every_row(database, run):
+    async def scenario():
+        now = datetime.now(UTC)
+
+        async with AsyncSessionLocal() as db:
+            written = await bulk_insert(
+                db, Ticket.__table__, BULK_TICKET_COLUMNS, repeat((10.0, "bulk", True, now, now), 25), batch_size=10)
+            await db.commit()
+
+        return written, await count_tickets()
+
+    assert run(scenario()) == (25, 25)
+
+
+def test_bulk_insert_is_undone_by_rollback(database, run):
+    # The rows are the first thing the session writes, on asyncpg that is the COPY
+    async def scenario():
+        now = datetime.now(UTC)
+
+        async with AsyncSessionLocal() as db:
+            await bulk_insert(db, Ticket.__table__, BULK_TICKET_COLUMNS, repeat((10.0, "bulk", True, now, now), 25))
+            await db.rollback()
+
+        return await count_tickets()
+
+    assert run(scenario()) == 0
+
+
+def test_bulk_create_keeps_rows_and_stats_together(database, run, monkeypatch):
+    async def failing_apply(db, delta):
+        raise OperationalError("UPDATE ticket_stats", {}, Exception("stats upsert failed"))
+
+    monkeypatch.setattr(ticket_stats_service, "apply", failing_apply)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            with pytest.raises(HTTPException) as rejected:
+                await ticket_service.create_ticket_bulk(
+                    db, TicketCreateBulkSchema(name="bulk", price=10, is_valid=True, amount=20))
+
+        return rejected.value.status_code, await count_tickets()
+
+    assert run(scenario()) == (500, 0)
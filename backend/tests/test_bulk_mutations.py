@@ -0,0 +1,74 @@
+from sqlalchemy import insert, select
+
+from src.database import AsyncSessionLocal
+from src.tickets.models import Ticket
+from src.tickets.stats import ticket_stats_service
+from src.users.models import User
+
+
+async def seed() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": user_id, "username": f"user-{user_id}", "email": f"user-{user_id}@example.com", "password": "-"}
+            for user_id in (1, 2)
+        ])
+        await db.execute(insert(Ticket), [
+            {"id": i, "name": f"ticket-{i}", "price": 10, "is_valid": True, "user_id": 1 if i <= 5 else 2}
+            for i in range(1, 8)
+        ])
+        await ticket_stats_service.reconcile(db)
+
+
+def test_mutations_by_filter(database, run, client, monkeypatch):
+    # Several lock, change and commit rounds per request
+    monkeypatch.setattr("src.tickets.service.BULK_MUTATION_BATCH_SIZE", 2)
+
+    async def scenario():
+        await seed()
+
+        async with client() as http:
+            cached = (await http.get("/tickets/1")).json()
+            invalidated = (await http.post("/tickets/bulk-update", json={
+                "filter": {"user_id": 1}, "changes": {"is_valid": False},
+            })).json()
+            reassigned = (await http.post("/tickets/bulk-update", json={
+                "filter": {"user_id": 1, "id_to": 3}, "changes": {"user_id": 2, "price": 15},
+            })).json()
+            deleted = (await http.post("/tickets/bulk-delete", json={"filter": {"user_id": 2, "is_valid": True}})).json()
+            after = (await http.get("/tickets/1")).json()
+
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(Ticket.id, Ticket.user_id, Ticket.is_valid).order_by(Ticket.id))).all()
+            drift = await ticket_stats_service.reconcile(db, fix=False)
+
+        return cached, invalidated, reassigned, deleted, after, [tuple(row) for row in rows], drift
+
+    cached, invalidated, reassigned, deleted, after, rows, drift = run(scenario())
+
+    assert (invalidated, reassigned, deleted) == ({"affected": 5}, {"affected": 3}, {"affected": 2})
+    assert cached["is_valid"] is True
+    assert (after["user_id"], after["is_valid"], after["price"]) == (2, False, 15)
+    assert rows == [(1, 2, False), (2, 2, False), (3, 2, False), (4, 1, False), (5, 1, False)]
+    assert drift == []
+
+
+def test_mutations_need_a_filter_and_changes(database, run, client):
+    async def scenario():
+        await seed()
+
+        async with client() as http:
+            responses = [
+                await http.post("/tickets/bulk-delete", json={"filter": {}}),
+                await http.post("/tickets/bulk-update", json={"filter": {"user_id": 1}, "changes": {}}),
+                await http.post("/tickets/bulk-update", json={"filter": {"user_id": 1}, "changes": {"user_id": 9}}),
+            ]
+
+        async with AsyncSessionLocal() as db:
+            owners = (await db.scalars(select(Ticket.user_id).order_by(Ticket.id))).all()
+
+        return [response.status_code for response in responses], owners
+
+    statuses, owners = run(scenario())
+
+    assert statuses == [422, 400, 400]
+    assert owners == [1, 1, 1, 1, 1, 2, 2]
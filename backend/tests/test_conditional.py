@@ -0,0 +1,79 @@
+from sqlalchemy import insert
+
+from src.database import AsyncSessionLocal
+from src.tickets.models import Ticket
+from src.users.models import User
+
+
+async def seed() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User).values(id=1, username="owner", email="owner@example.com", password="-"))
+        await db.execute(insert(Ticket).values(id=1, name="ticket", price=1.0, is_valid=True, user_id=1))
+        await db.commit()
+
+
+def test_conditional_get(database, run, client):
+    async def scenario():
+        await seed()
+
+        async with client() as http:
+            first = await http.get("/tickets/1")
+            etag, modified = first.headers["etag"], first.headers["last-modified"]
+            unchanged = await http.get("/tickets/1", headers={"If-None-Match": f'"0", W/{etag}'})
+            not_modified_since = await http.get("/tickets/1", headers={"If-Modified-Since": modified})
+            await http.patch("/tickets/1", json={"name": "renamed"})
+            changed = await http.get("/tickets/1", headers={"If-None-Match": etag})
+            user = await http.get("/users/1")
+            user_unchanged = await http.get("/users/1", headers={"If-None-Match": user.headers["etag"]})
+            missing = await http.get("/tickets/2", headers={"If-None-Match": etag})
+
+        return first, unchanged, not_modified_since, changed, user_unchanged, missing
+
+    first, unchanged, not_modified_since, changed, user_unchanged, missing = run(scenario())
+
+    assert first.status_code == 200
+    assert (unchanged.status_code, unchanged.content) == (304, b"")
+    assert unchanged.headers["etag"] == first.headers["etag"]
+    assert not_modified_since.status_code == 304
+    assert changed.status_code == 200
+    assert changed.json()["name"] == "renamed"
+    assert changed.headers["etag"] != first.headers["etag"]
+    assert user_unchanged.status_code == 304
+    assert missing.status_code == 404
+
+
+def test_if_match_guards_updates(database, run, client):
+    async def scenario():
+        await seed()
+
+        async with client() as http:
+            etag = (await http.get("/tickets/1")).headers["etag"]
+            first = await http.patch("/tickets/1", json={"name": "first"}, headers={"If-Match": etag})
+            # Another client still holding the old ETag loses
+            second = await http.patch("/tickets/1", json={"name": "second"}, headers={"If-Match": etag})
+            weak = await http.put(
+                "/tickets/1",
+                json={"name": "weak", "price": 1, "is_valid": True, "user_id": 1},
+                headers={"If-Match": f"W/{first.headers['etag']}"},
+            )
+            current = await http.put(
+                "/tickets/1",
+                json={"name": "third", "price": 1, "is_valid": True, "user_id": 1},
+                headers={"If-Match": f'"1", {first.headers["etag"]}'},
+            )
+            user_etag = (await http.get("/users/1")).headers["etag"]
+            await http.patch("/users/1", json={"username": "renamed"})
+            stale_user = await http.patch("/users/1", json={"username": "lost"}, headers={"If-Match": user_etag})
+            final = (await http.get("/tickets/1")).json()
+
+        return first, second, weak, current, stale_user, final
+
+    first, second, weak, current, stale_user, final = run(scenario())
+
+    assert first.status_code == 200
+    assert second.status_code == 412
+    assert weak.status_code == 412
+    assert current.status_code == 200
+    assert current.headers["etag"] != first.headers["etag"]
+    assert stale_user.status_code == 412
+    assert final["name"] == "third"
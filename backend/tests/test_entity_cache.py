@@ -0,0 +1,75 @@
+import time
+
+from sqlalchemy import insert
+
+from src.cache import EntityCache, LRUCacheBackend, entity_cache, ticket_key
+from src.database import AsyncSessionLocal
+from src.tickets.models import Ticket
+
+
+def test_lru_backend_evicts_and_expires(run):
+    async def scenario():
+        backend = LRUCacheBackend(max_entries=2, ttl=60)
+        await backend.set("a", {"id": 1})
+        await backend.set("b", {"id": 2})
+        await backend.get("a")
+        # "b" is now the least recently used
+        await backend.set("c", {"id": 3})
+        kept = [await backend.get(key) for key in ("a", "b", "c")]
+
+        expiring = LRUCacheBackend(max_entries=2, ttl=0)
+        await expiring.set("a", {"id": 1})
+        time.sleep(0.001)
+
+        return kept, await expiring.get("a"), backend.stats(), expiring.stats()
+
+    kept, expired, stats, expiring_stats = run(scenario())
+
+    assert kept == [{"id": 1}, None, {"id": 3}]
+    assert expired is None
+    assert (stats["entries"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+    assert expiring_stats["expirations"] == 1
+
+
+def test_load_overlapping_an_invalidation_is_not_cached(run):
+    async def scenario():
+        cache = EntityCache(LRUCacheBackend(max_entries=10, ttl=60))
+        epoch = cache.epoch
+        await cache.invalidate("ticket:1")
+        await cache.set("ticket:1", {"id": 1}, epoch)
+        stale = await cache.get("ticket:1")
+        await cache.set("ticket:1", {"id": 1}, cache.epoch)
+
+        return stale, await cache.get("ticket:1")
+
+    assert run(scenario()) == (None, {"id": 1})
+
+
+def test_reads_are_cached_and_writes_invalidate(database, run, client):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Ticket).values(id=1, name="old", price=1.0, is_valid=True))
+            await db.commit()
+
+        async with client() as http:
+            first = (await http.get("/tickets/1")).json()
+            cached = await entity_cache.get(ticket_key(1))
+            hits = entity_cache.stats()["hits"]
+            second = (await http.get("/tickets/1")).json()
+            hits_after = entity_cache.stats()["hits"]
+
+            await http.patch("/tickets/1", json={"name": "new"})
+            after_patch = (await http.get("/tickets/1")).json()
+
+            await http.delete("/tickets/1")
+            after_delete = await http.get("/tickets/1")
+
+        return first, cached, second, hits_after - hits, after_patch, after_delete.status_code
+
+    first, cached, second, hits, after_patch, after_delete = run(scenario())
+
+    assert cached["name"] == "old"
+    assert second == first
+    assert hits > 0
+    assert after_patch["name"] == "new"
+    assert after_delete == 404
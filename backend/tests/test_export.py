@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+
+from sqlalchemy import insert
+
+from src.database import AsyncSessionLocal
+from src.export import FileFormat, stream_rows
+from src.tickets.models import Ticket
+from src.tickets.service import ticket_service
+from src.users.models import User
+
+
+async def seed() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": 1, "username": "first", "email": "first@example.com", "password": "secret-hash"},
+            {"id": 2, "username": "second", "email": "second@example.com", "password": "secret-hash"},
+        ])
+        await db.execute(insert(Ticket), [
+            {"id": i, "name": f"ticket-{i}", "price": i, "is_valid": True, "user_id": 1 + i % 2} for i in range(1, 6)
+        ])
+        await db.commit()
+
+
+def test_export_ndjson_and_csv(database, run, client):
+    async def scenario():
+        await seed()
+
+        async with client() as http:
+            ndjson = await http.get("/tickets/export")
+            filtered = await http.get("/tickets/export", params={"user_id": 2})
+            as_csv = await http.get("/tickets/export", params={"format": "csv"})
+            users = await http.get("/users/export", params={"format": "csv"})
+
+        return ndjson, filtered, as_csv, users
+
+    ndjson, filtered, as_csv, users = run(scenario())
+
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    assert ndjson.headers["content-disposition"] == 'attachment; filename="tickets.ndjson"'
+    tickets = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [ticket["id"] for ticket in tickets] == [1, 2, 3, 4, 5]
+    assert (tickets[0]["name"], tickets[0]["user_id"]) == ("ticket-1", 2)
+
+    assert [json.loads(line)["id"] for line in filtered.text.splitlines()] == [1, 3, 5]
+
+    rows = list(csv.reader(io.StringIO(as_csv.text)))
+    assert rows[0] == ["id", "user_id", "name", "price", "is_valid", "created_at", "updated_at"]
+    assert [row[0] for row in rows[1:]] == ["1", "2", "3", "4", "5"]
+
+    user_rows = list(csv.reader(io.StringIO(users.text)))
+    assert user_rows[0] == ["id", "username", "email", "created_at", "updated_at"]
+    assert "secret-hash" not in users.text
+
+
+def test_export_is_streamed_in_batches(database, run, monkeypatch):
+    monkeypatch.setattr("src.export.EXPORT_BATCH_SIZE", 2)
+
+    async def scenario():
+        await seed()
+
+        return [chunk async for chunk in stream_rows(ticket_service.export_query(), FileFormat.NDJSON)]
+
+    chunks = run(scenario())
+
+    assert [chunk.count("\n") for chunk in chunks] == [2, 2, 1]
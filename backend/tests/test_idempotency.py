@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+from src.admission import AdmissionController, AdmissionMiddleware
+from src.idempotency.middleware import IdempotencyMiddleware
+from src.idempotency.service import IdempotencyStore
+
+REQUEST_TIME = 0.3
+
+
+def make_app(capacity: int, runs: list):
+    async def create(scope, receive, send):
+        body = (await receive())["body"]
+        runs.append(body)
+        await asyncio.sleep(REQUEST_TIME * 3 if b"slow" in body else REQUEST_TIME)
+        await send({
+            "type": "http.response.start",
+            "status": 500 if b"fail" in body else 201,
+            "headers": [(b"content-type", b"application/json"), (b"location", b"/tickets/1")],
+        })
+        await send({"type": "http.response.body", "body": json.dumps({"created": len(runs)}).encode()})
+
+    store = IdempotencyStore(ttl=60, lock_timeout=60)
+
+    return AdmissionMiddleware(IdempotencyMiddleware(create, store), AdmissionController({}, 0.1, None, capacity))
+
+
+async def request(app, body: bytes, key: str = None):
+    """(status, headers, body)"""
+    headers = [(b"idempotency-key", key.encode())] if key else []
+    scope = {"type": "http", "method": "POST", "path": "/tickets", "headers": headers, "client": ("127.0.0.1", 1)}
+    sent = {"body": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent["status"] = message["status"]
+            sent["headers"] = {name.decode(): value.decode() for name, value in message["headers"]}
+        else:
+            sent["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+
+    return sent["status"], sent["headers"], sent["body"]
+
+
+def test_retry_gets_the_stored_response(database, run):
+    runs = []
+    app = make_app(4, runs)
+
+    async def scenario():
+        first = await request(app, b'{"name": "a"}', "key-1")
+        retry = await request(app, b'{"name": "a"}', "key-1")
+        reused = await request(app, b'{"name": "b"}', "key-1")
+
+        return first, retry, reused
+
+    first, retry, reused = run(scenario())
+
+    assert len(runs) == 1
+    assert (retry[0], retry[2]) == (first[0], first[2]) == (201, b'{"created": 1}')
+    assert retry[1]["location"] == "/tickets/1"
+    assert retry[1]["idempotent-replayed"] == "true"
+    assert reused[0] == 422
+
+
+def test_waiting_duplicate_gives_its_slot_up(database, run):
+    """With two slots, one running request and its waiting duplicate leave room for a third request"""
+    runs = []
+    app = make_app(2, runs)
+
+    async def scenario():
+        first = asyncio.create_task(request(app, b'{"name": "a"}', "key-1"))
+        await asyncio.sleep(0.05)
+        duplicate = asyncio.create_task(request(app, b'{"name": "a"}', "key-1"))
+        await asyncio.sleep(0.05)
+        other = await request(app, b'{"name": "c"}')
+
+        return await first, await duplicate, other
+
+    first, duplicate, other = run(scenario())
+
+    assert (first[0], duplicate[0], other[0]) == (201, 201, 201)
+    assert duplicate[2] == first[2]
+    assert runs == [b'{"name": "a"}', b'{"name": "c"}']
+
+
+def test_duplicate_that_finds_no_slot_again_is_shed(database, run):
+    """The first request fails, its waiting duplicate has to run it but both slots are taken meanwhile"""
+    runs = []
+    app = make_app(2, runs)
+
+    async def scenario():
+        first = asyncio.create_task(request(app, b'{"name": "fail"}', "key-1"))
+        await asyncio.sleep(0.05)
+        duplicate = asyncio.create_task(request(app, b'{"name": "fail"}', "key-1"))
+        await asyncio.sleep(0.05)
+        # Takes the slot the waiting duplicate gave up
+        taken = asyncio.create_task(request(app, b'{"name": "slow"}'))
+        await asyncio.sleep(REQUEST_TIME - 0.15)
+        # Queued when the first request ends, gets its slot
+        queued = asyncio.create_task(request(app, b'{"name": "slow"}'))
+
+        responses = await asyncio.gather(first, duplicate, taken, queued)
+        # The key was given up again, a retry runs the request
+        retry = await request(app, b'{"name": "fail"}', "key-1")
+
+        return responses, retry
+
+    (first, duplicate, taken, queued), retry = run(scenario())
+
+    assert (first[0], taken[0], queued[0]) == (500, 201, 201)
+    assert duplicate[0] == 503
+    assert "retry-after" in duplicate[1]
+    assert retry[0] == 500
+    assert runs.count(b'{"name": "fail"}') == 2
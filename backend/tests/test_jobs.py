@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select, func, update
+from sqlalchemy.exc import OperationalError
+
+from src.database import AsyncSessionLocal
+from src.jobs.constants import JOB_RUNNING, JOB_CANCELLED, JOB_PENDING, JOB_COMPLETED
+from src.jobs.models import Job
+from src.jobs.service import JobRunner, job_service
+from src.tickets.constants import BULK_TICKET_JOB
+from src.tickets.models import Ticket, TicketStats
+from src.tickets.service import ticket_service
+from src.tickets.stats import ticket_stats_service
+
+PAYLOAD = {"name": "job", "is_valid": True, "price": 2.0}
+
+
+async def create_job(total: int, status: str, done: int = 0) -> Job:
+    async with AsyncSessionLocal() as db:
+        job = await job_service.create_job(db, kind=BULK_TICKET_JOB, total=total, payload=PAYLOAD)
+        await db.execute(update(Job).where(Job.id == job.id).values(status=status, done=done))
+        await db.commit()
+
+    return await load_job(job.id)
+
+
+async def load_job(job_id: int) -> Job:
+    async with AsyncSessionLocal() as db:
+        return await job_service.get_job_by_id(db, job_id)
+
+
+async def state(job_id: int) -> tuple:
+    """(job status, job done, tickets in the table, tickets in the stats)"""
+    async with AsyncSessionLocal() as db:
+        job = await db.get(Job, job_id, populate_existing=True)
+        tickets = await db.scalar(select(func.count()).select_from(Ticket))
+        counted = await db.scalar(select(func.coalesce(func.sum(TicketStats.tickets), 0)))
+
+        return job.status, job.done, tickets, counted
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr("src.tickets.service.BULK_BATCH_SIZE", 10)
+
+
+def test_resumed_job_writes_only_the_missing_rows(database, run, small_batches):
+    async def scenario():
+        # 10 of 25 rows were written before the shutdown, those are not in this fresh table
+        job = await create_job(25, JOB_RUNNING, done=10)
+        await ticket_service.create_tickets_background(job)
+
+        return await state(job.id)
+
+    assert run(scenario()) == (JOB_RUNNING, 25, 15, 15)
+
+
+def test_cancelled_job_writes_nothing(database, run, small_batches):
+    async def scenario():
+        job = await create_job(25, JOB_RUNNING)
+
+        async with AsyncSessionLocal() as db:
+            await job_service.cancel_job(db, await job_service.get_job_by_id(db, job.id))
+
+        await ticket_service.create_tickets_background(job)
+
+        return await state(job.id)
+
+    assert run(scenario()) == (JOB_CANCELLED, 0, 0, 0)
+
+
+def test_failed_batch_leaves_no_uncounted_rows(database, run, small_batches, monkeypatch):
+    apply = ticket_stats_service.apply
+    calls = 0
+
+    async def fail_second_batch(db, delta):
+        nonlocal calls
+        calls += 1
+
+        if calls == 2:
+            raise OperationalError("UPDATE ticket_stats", {}, Exception("connection lost"))
+
+        await apply(db, delta)
+
+    monkeypatch.setattr(ticket_stats_service, "apply", fail_second_batch)
+
+    async def scenario():
+        job = await create_job(25, JOB_RUNNING)
+
+        with pytest.raises(OperationalError):
+            await ticket_service.create_tickets_background(job)
+
+        interrupted = await state(job.id)
+
+        # Resumed from what was committed, every row is written exactly once
+        await ticket_service.create_tickets_background(await load_job(job.id))
+
+        return interrupted, await state(job.id)
+
+    interrupted, resumed = run(scenario())
+
+    assert interrupted == (JOB_RUNNING, 10, 10, 10)
+    assert resumed == (JOB_RUNNING, 25, 25, 25)
+
+
+def test_runner_resumes_unfinished_jobs_on_start(database, run, small_batches):
+    async def scenario():
+        job = await create_job(25, JOB_PENDING)
+        runner = JobRunner(workers=1)
+        runner.register(BULK_TICKET_JOB, ticket_service.create_tickets_background)
+        await runner.start()
+
+        try:
+            for _ in range(100):
+                if (await state(job.id))[0] == JOB_COMPLETED:
+                    break
+
+                await asyncio.sleep(0.05)
+        finally:
+            await runner.stop()
+
+        return await state(job.id)
+
+    assert run(scenario()) == (JOB_COMPLETED, 25, 25, 25)
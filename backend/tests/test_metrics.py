@@ -0,0 +1,58 @@
+from src.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_metrics_render_in_the_prometheus_format(monkeypatch):
+    own = MetricsRegistry()
+    monkeypatch.setattr("src.metrics.registry", own)
+
+    requests = Counter("requests_total", "Requests", ("path",))
+    in_flight = Gauge("in_flight", "Requests running")
+    latency = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    requests.inc('/a"b')
+    requests.inc('/a"b', amount=2)
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value)
+
+    assert own.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{path="/a\\"b"} 3',
+        "# HELP in_flight Requests running",
+        "# TYPE in_flight gauge",
+        "in_flight 1",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 3.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_metrics_endpoint(database, run, client):
+    async def scenario():
+        async with client() as http:
+            await http.get("/tickets/12345")
+            await http.get("/tickets")
+
+            return await http.get("/metrics")
+
+    response = run(scenario())
+    lines = response.text.splitlines()
+
+    def sampled(prefix: str) -> bool:
+        return any(line.startswith(prefix) for line in lines)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # Labeled by the route template, not the requested path
+    assert sampled('http_requests_total{method="GET",route="/tickets/{ticket_id}",status="404"}')
+    assert sampled('http_request_duration_seconds_count{method="GET",route="/tickets"}')
+    assert sampled('db_statement_duration_seconds_count{pool="primary",operation="SELECT"}')
+    assert sampled('db_pool_checked_out{pool="primary"}')
@@ -0,0 +1,100 @@
+import importlib
+
+import pytest
+from sqlalchemy import inspect, text
+
+from src.database import Base, engine
+from src.migrations import migrate, check_schema_version, SchemaVersionError, LATEST_VERSION
+
+initial_schema = importlib.import_module("src.migrations.versions.0001_initial_schema")
+
+
+async def drop_everything() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+
+
+def describe_schema(sync_conn) -> dict:
+    """table -> (column names, index names), schema_migrations left out"""
+    inspector = inspect(sync_conn)
+
+    return {
+        table: (
+            sorted(column["name"] for column in inspector.get_columns(table)),
+            sorted(index["name"] for index in inspector.get_indexes(table)),
+        )
+        for table in inspector.get_table_names()
+        if table != "schema_migrations"
+    }
+
+
+def test_migrations_apply_step_by_step(run):
+    async def scenario():
+        await drop_everything()
+
+        with pytest.raises(SchemaVersionError):
+            await check_schema_version(engine)
+
+        first = await migrate(engine, target=2)
+
+        with pytest.raises(SchemaVersionError):
+            await check_schema_version(engine)
+
+        rest = await migrate(engine)
+        again = await migrate(engine)
+
+        return first, rest, again, await check_schema_version(engine)
+
+    first, rest, again, version = run(scenario())
+
+    assert first == [1, 2]
+    assert rest == list(range(3, LATEST_VERSION + 1))
+    assert again == []
+    assert version == LATEST_VERSION
+
+
+def test_migrated_schema_matches_the_models(run):
+    async def scenario():
+        await drop_everything()
+        await migrate(engine)
+
+        async with engine.connect() as conn:
+            migrated = await conn.run_sync(describe_schema)
+
+        await drop_everything()
+
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            modeled = await conn.run_sync(describe_schema)
+
+        return migrated, modeled
+
+    migrated, modeled = run(scenario())
+
+    assert migrated == modeled
+
+
+def test_database_created_before_migrations_is_adopted(run):
+    """The tables create_all made before the first migration existed are kept, with their rows"""
+    async def scenario():
+        await drop_everything()
+
+        async with engine.begin() as conn:
+            await conn.run_sync(initial_schema.metadata.create_all)
+            await conn.execute(text(
+                "INSERT INTO users (username, email, password, created_at, updated_at) "
+                "VALUES ('old', 'old@example.com', '-', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+            ))
+
+        applied = await migrate(engine)
+
+        async with engine.connect() as conn:
+            users = await conn.scalar(text("SELECT count(*) FROM users"))
+
+        return applied, users
+
+    applied, users = run(scenario())
+
+    assert applied == list(range(1, LATEST_VERSION + 1))
+    assert users == 1
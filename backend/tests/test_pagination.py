@@ -0,0 +1,137 @@
+from datetime import datetime, UTC, timedelta
+
+from sqlalchemy import insert
+
+from src.database import AsyncSessionLocal
+from src.tickets.models import Ticket
+from src.users.models import User
+
+TICKETS = 12
+
+
+async def seed_tickets() -> None:
+    # Two tickets per timestamp, the id has to break the tie
+    started = datetime(2026, 1, 1, tzinfo=UTC)
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Ticket), [
+            {"name": f"ticket-{i}", "price": i % 4, "is_valid": True, "created_at": started + timedelta(minutes=i // 2)}
+            for i in range(TICKETS)
+        ])
+        await db.commit()
+
+
+async def walk(http, path: str, params: dict, direction: str = "after", start: str = None) -> list:
+    """Ids of every page reached by following the cursors from `start`, in the order served"""
+    pages = []
+    cursor = start
+
+    while True:
+        query = {"page_size": 5, **params, **({direction: cursor} if cursor else {})}
+        body = (await http.get(path, params=query)).json()
+        pages.append([item["id"] for item in body["items"]])
+        cursor = body["meta"]["next_cursor" if direction == "after" else "prev_cursor"]
+
+        if not cursor:
+            return pages
+
+
+def test_cursors_visit_every_ticket_once(database, run, client):
+    async def scenario():
+        await seed_tickets()
+
+        async with client() as http:
+            forward = await walk(http, "/tickets", {})
+            by_price = await walk(http, "/tickets", {"sort": "-price"})
+            last_page = (await http.get("/tickets", params={"page": 3, "page_size": 5})).json()
+            backward = await walk(http, "/tickets", {}, "before", last_page["meta"]["prev_cursor"])
+
+        return forward, by_price, backward
+
+    forward, by_price, backward = run(scenario())
+    prices = {i + 1: i % 4 for i in range(TICKETS)}
+
+    assert forward == [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10], [11, 12]]
+    assert backward == [[6, 7, 8, 9, 10], [1, 2, 3, 4, 5]]
+
+    ordered = [ticket_id for page in by_price for ticket_id in page]
+    assert ordered == sorted(prices, key=lambda ticket_id: (-prices[ticket_id], -ticket_id))
+
+
+def test_cursor_pages_of_users(database, run, client):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(User), [
+                {"username": f"user-{i}", "email": f"user-{i}@example.com", "password": "-"} for i in range(7)
+            ])
+            await db.commit()
+
+        async with client() as http:
+            return await walk(http, "/users", {})
+
+    assert run(scenario()) == [[1, 2, 3, 4, 5], [6, 7]]
+
+
+def test_bad_cursors_are_rejected(database, run, client):
+    async def scenario():
+        await seed_tickets()
+
+        async with client() as http:
+            cursor = (await http.get("/tickets", params={"page_size": 5})).json()["meta"]["next_cursor"]
+            responses = [
+                await http.get("/tickets", params={"after": "not a cursor"}),
+                await http.get("/tickets", params={"after": cursor, "sort": "price"}),
+                await http.get("/tickets", params={"after": cursor, "before": cursor}),
+            ]
+
+        return [(response.status_code, response.json()["detail"]) for response in responses]
+
+    assert run(scenario()) == [
+        (400, "Invalid cursor"),
+        (400, "Cursor does not match the sort order"),
+        (400, "Use either 'after' or 'before', not both"),
+    ]
+
+
+def test_count_defaults_to_exact_for_pages_and_none_for_cursors(database, run, client):
+    async def scenario():
+        await seed_tickets()
+
+        async with client() as http:
+            first = (await http.get("/tickets", params={"page_size": 5})).json()["meta"]
+            cursor = first["next_cursor"]
+            by_cursor = (await http.get("/tickets", params={"page_size": 5, "after": cursor})).json()["meta"]
+            counted = (await http.get("/tickets", params={"page_size": 5, "after": cursor, "count": "exact"})).json()
+
+        return first, by_cursor, counted["meta"]
+
+    first, by_cursor, counted = run(scenario())
+
+    assert (first["count"], first["total_items"], first["total_pages"]) == ("exact", TICKETS, 3)
+    assert (by_cursor["count"], by_cursor["total_items"], by_cursor["total_pages"]) == ("none", None, None)
+    assert by_cursor["has_next"] is True
+    assert (counted["count"], counted["total_items"]) == ("exact", TICKETS)
+
+
+def test_count_strategies(database, run, client):
+    async def scenario():
+        await seed_tickets()
+        totals = {}
+
+        async with client() as http:
+            for strategy in ("exact", "estimated", "cached", "none"):
+                meta = (await http.get("/tickets", params={"page_size": 5, "count": strategy})).json()["meta"]
+                totals[strategy] = meta["total_items"]
+
+            # Past the last page no row carries the total, it is still reported
+            beyond = (await http.get("/tickets", params={"page": 9, "page_size": 5})).json()
+            # Filtered listings count the matching rows, whatever the strategy
+            filtered = (await http.get("/tickets", params={"page_size": 5, "min_price": 3, "count": "cached"})).json()
+
+        return totals, beyond, filtered
+
+    totals, beyond, filtered = run(scenario())
+
+    assert totals == {"exact": TICKETS, "estimated": TICKETS, "cached": TICKETS, "none": None}
+    assert (beyond["items"], beyond["meta"]["total_items"]) == ([], TICKETS)
+    assert filtered["meta"]["total_items"] == 3
@@ -0,0 +1,63 @@
+import hashlib
+
+from sqlalchemy import select
+
+from src.database import AsyncSessionLocal
+from src.users.models import User
+from src.users.service import user_service
+from src.users.utils import PasswordHasher, SCRYPT_R, SCRYPT_P, _scrypt, _b64
+
+PASSWORD = "correct horse battery staple"
+
+
+def test_legacy_hash_is_replaced_after_verify(database, run):
+    legacy = hashlib.sha256(PASSWORD.encode()).hexdigest()
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            user = User(username="legacy", email="legacy@example.com", password=legacy)
+            db.add(user)
+            await db.commit()
+
+            wrong = await user_service.verify_password(db, user, "wrong")
+            kept = await db.scalar(select(User.password).where(User.id == user.id))
+            right = await user_service.verify_password(db, user, PASSWORD)
+
+        async with AsyncSessionLocal() as db:
+            stored = await db.scalar(select(User.password).where(User.email == "legacy@example.com"))
+            again = await user_service.verify_password(db, await user_service.get_user_by_email(db, user.email), PASSWORD)
+
+        return wrong, kept, right, stored, again
+
+    wrong, kept, right, stored, again = run(scenario())
+
+    assert (wrong, kept) == (False, legacy)
+    assert right is True
+    assert stored.startswith("scrypt$")
+    assert again is True
+
+
+def scrypt_hash(n: int, r: int, p: int) -> str:
+    salt = b"0123456789abcdef"
+
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(PASSWORD, salt, n, r, p))}"
+
+
+def test_other_scrypt_parameters_need_a_rehash(run):
+    hasher = PasswordHasher(cost=2 ** 4, workers=1)
+    stored = [
+        scrypt_hash(2 ** 4, SCRYPT_R, SCRYPT_P),
+        scrypt_hash(2 ** 5, SCRYPT_R, SCRYPT_P),
+        scrypt_hash(2 ** 4, SCRYPT_R * 2, SCRYPT_P),
+        scrypt_hash(2 ** 4, SCRYPT_R, SCRYPT_P + 1),
+    ]
+
+    async def scenario():
+        return [await hasher.verify(PASSWORD, value) for value in stored]
+
+    try:
+        results = run(scenario())
+    finally:
+        hasher.shutdown()
+
+    assert results == [(True, False), (True, True), (True, True), (True, True)]
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from src import server
+from src.config import settings as main_config
+from src.database import pool_limits
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(main_config, "POOL_SIZE", 10)
+    monkeypatch.setattr(main_config, "MAX_OVERFLOW", 15)
+
+    return lambda connections: monkeypatch.setattr(main_config, "DB_CONNECTION_BUDGET", connections)
+
+
+def test_without_a_budget_every_process_gets_the_full_pool(budget):
+    budget(0)
+
+    assert pool_limits(1) == pool_limits(8) == (10, 15)
+
+
+@pytest.mark.parametrize("connections, workers, expected", [
+    (100, 4, (10, 15)),
+    (100, 3, (13, 20)),
+    (10, 4, (1, 1)),
+    (4, 4, (1, 0)),
+])
+def test_budget_is_split_between_the_workers(budget, connections, workers, expected):
+    budget(connections)
+    pool_size, max_overflow = pool_limits(workers)
+
+    assert (pool_size, max_overflow) == expected
+    assert workers * (pool_size + max_overflow) <= connections
+
+
+def test_budget_too_small_for_the_workers(budget):
+    budget(3)
+
+    with pytest.raises(ValueError):
+        pool_limits(4)
+
+
+def test_launcher_tells_the_workers_their_number(budget, monkeypatch):
+    budget(40)
+    monkeypatch.setattr(main_config, "WORKERS", 4)
+    monkeypatch.setenv("WORKERS", "0")
+    started = {}
+    monkeypatch.setattr(server.uvicorn, "run", lambda app, **options: started.update(app=app, **options))
+
+    server.main()
+
+    assert (started["app"], started["workers"]) == ("src.main:app", 4)
+    assert os.environ["WORKERS"] == "4"
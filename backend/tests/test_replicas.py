@@ -0,0 +1,136 @@
+import os
+import tempfile
+from types import SimpleNamespace
+
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.cache import entity_cache, ticket_key, user_key
+from src.config import settings as main_config
+from src.database import AsyncSessionLocal, Base, ReplicaRouter, engine
+from src.tickets.models import Ticket
+from src.tickets.service import ticket_service
+from src.users.models import User
+from src.users.service import user_service
+
+REPLICA_FILE = os.path.join(tempfile.gettempdir(), f"ticketing-tests-replica-{os.getpid()}.db")
+
+
+async def lagging_replica():
+    """A second database holding the rows as they were before the primary's last write"""
+    if os.path.exists(REPLICA_FILE):
+        os.remove(REPLICA_FILE)
+
+    # Pooled like the replicas src.database creates
+    replica = create_async_engine(f"sqlite+aiosqlite:///{REPLICA_FILE}", poolclass=AsyncAdaptedQueuePool)
+
+    async with replica.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User).values(id=1, username="old", email="user@example.com", password="-"))
+        await conn.execute(insert(Ticket).values(id=1, name="old", price=1.0, is_valid=True, user_id=1))
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User).values(id=1, username="new", email="user@example.com", password="-"))
+        await db.execute(insert(Ticket).values(id=1, name="new", price=1.0, is_valid=True, user_id=1))
+        await db.commit()
+
+    return replica
+
+
+def test_replica_reads_are_not_cached(database, run):
+    async def scenario():
+        replica = await lagging_replica()
+
+        try:
+            async with AsyncSessionLocal(bind=replica) as db:
+                ticket = await ticket_service.get_ticket_by_id(db, 1)
+                user = await user_service.get_user_by_id(db, 1)
+                batch, _ = await ticket_service.get_tickets_by_ids(db, [1])
+                users, _ = await user_service.get_users_by_ids(db, [1])
+                replica_reads = (ticket.name, user.username, batch[0].name, users[0].username)
+
+            cached = (await entity_cache.get(ticket_key(1)), await entity_cache.get(user_key(1)))
+
+            # The primary fills the cache, and a replica session is then served the primary's row from it
+            async with AsyncSessionLocal() as db:
+                await ticket_service.get_ticket_by_id(db, 1)
+
+            async with AsyncSessionLocal(bind=replica) as db:
+                after_primary_read = (await ticket_service.get_ticket_by_id(db, 1)).name
+        finally:
+            await replica.dispose()
+
+        return replica_reads, cached, after_primary_read
+
+    replica_reads, cached, after_primary_read = run(scenario())
+
+    assert replica_reads == ("old", "old", "old", "old")
+    assert cached == (None, None)
+    assert after_primary_read == "new"
+
+
+def test_pinned_client_never_sees_a_replica_row(database, run):
+    """A write invalidates the entry, a lagging replica read must not put the old row back"""
+    async def scenario():
+        replica = await lagging_replica()
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await ticket_service.get_ticket_by_id(db, 1)
+                await db.execute(update(Ticket).where(Ticket.id == 1).values(name="newest"))
+                await db.commit()
+                await entity_cache.invalidate(ticket_key(1))
+
+            async with AsyncSessionLocal(bind=replica) as db:
+                await ticket_service.get_ticket_by_id(db, 1)
+
+            # Pinned to the primary by the read-your-writes cookie
+            async with AsyncSessionLocal() as db:
+                return (await ticket_service.get_ticket_by_id(db, 1)).name
+        finally:
+            await replica.dispose()
+
+    assert run(scenario()) == "newest"
+
+
+def fake_engine(checkedout: int):
+    return SimpleNamespace(pool=SimpleNamespace(checkedout=lambda: checkedout))
+
+
+def test_router_spreads_reads_over_the_replicas():
+    primary, first, second, third = fake_engine(0), fake_engine(3), fake_engine(1), fake_engine(1)
+
+    round_robin = ReplicaRouter(primary, [first, second, third], "round_robin")
+    least_busy = ReplicaRouter(primary, [first, second, third], "least_busy")
+
+    assert [round_robin.choose() for _ in range(4)] == [first, second, third, first]
+    # Equally busy replicas take turns
+    assert [least_busy.choose() for _ in range(3)] == [second, second, third]
+    assert ReplicaRouter(primary, [], "round_robin").choose() is primary
+
+
+def test_reads_go_to_the_replica_until_the_client_writes(database, run, client, monkeypatch):
+    monkeypatch.setattr(main_config, "READ_YOUR_WRITES_WINDOW", 5)
+
+    async def scenario():
+        replica = await lagging_replica()
+        monkeypatch.setattr("src.database.replica_engines", [replica])
+        monkeypatch.setattr("src.database.replica_router", ReplicaRouter(engine, [replica], "round_robin"))
+
+        try:
+            async with client() as http:
+                before = (await http.get("/tickets/1")).json()["name"]
+                written = await http.patch("/tickets/1", json={"price": 2})
+                # The cookie pins this client to the primary for the window
+                after = (await http.get("/tickets/1")).json()
+        finally:
+            await replica.dispose()
+
+        return before, written.cookies.get("db_primary_until"), after
+
+    before, cookie, after = run(scenario())
+
+    assert before == "old"
+    assert cookie is not None
+    assert (after["name"], after["price"]) == ("new", 2)
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+from sqlalchemy import insert
+
+from src.database import AsyncSessionLocal
+from src.singleflight import SingleFlight
+from src.tickets.models import Ticket
+from src.tickets.service import ticket_service
+
+
+def counting_load(calls: list, result="row", delay: float = 0.05, error: Exception = None):
+    async def load():
+        calls.append(result)
+        await asyncio.sleep(delay)
+
+        if error is not None:
+            raise error
+
+        return result
+
+    return load
+
+
+def test_concurrent_calls_share_one_load(run):
+    flights = SingleFlight("test")
+    calls = []
+
+    async def scenario():
+        shared = await asyncio.gather(*(flights.do("key", counting_load(calls)) for _ in range(5)))
+        other = await flights.do("other", counting_load(calls, "other"))
+        # Nothing in flight any more, a later call loads again
+        later = await flights.do("key", counting_load(calls))
+
+        return shared, other, later
+
+    shared, other, later = run(scenario())
+
+    assert shared == ["row"] * 5
+    assert (other, later) == ("other", "row")
+    assert calls == ["row", "other", "row"]
+
+
+def test_errors_are_shared(run):
+    flights = SingleFlight("test")
+    calls = []
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flights.do("key", counting_load(calls, error=LookupError("gone"))) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = run(scenario())
+
+    assert len(calls) == 1
+    assert all(isinstance(result, LookupError) for result in results)
+
+
+def test_newer_generation_does_not_join(run):
+    flights = SingleFlight("test")
+    calls = []
+
+    async def scenario():
+        return await asyncio.gather(
+            flights.do("key", counting_load(calls, "before write"), generation=1),
+            flights.do("key", counting_load(calls, "after write"), generation=2),
+        )
+
+    assert run(scenario()) == ["before write", "after write"]
+    assert len(calls) == 2
+
+
+def test_cancelled_leader_hands_over_to_a_follower(run):
+    flights = SingleFlight("test")
+    calls = []
+
+    async def scenario():
+        leader = asyncio.create_task(flights.do("key", counting_load(calls, "leader")))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("key", counting_load(calls, "follower")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+        return await follower
+
+    assert run(scenario()) == "follower"
+    assert calls == ["leader", "follower"]
+
+
+def test_cancelled_follower_leaves_the_leader_alone(run):
+    flights = SingleFlight("test")
+    calls = []
+
+    async def scenario():
+        leader = asyncio.create_task(flights.do("key", counting_load(calls)))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("key", counting_load(calls)))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+
+        return await leader
+
+    assert run(scenario()) == "row"
+    assert len(calls) == 1
+
+
+def test_concurrent_lookups_of_one_ticket_take_one_query(database, run, statements):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Ticket).values(id=1, name="ticket", price=1.0, is_valid=True))
+            await db.commit()
+
+        async def lookup():
+            async with AsyncSessionLocal() as db:
+                return (await ticket_service.get_ticket_by_id(db, 1)).name
+
+        with statements() as sent:
+            names = await asyncio.gather(*(lookup() for _ in range(5)))
+
+        return names, sent
+
+    names, sent = run(scenario())
+
+    assert names == ["ticket"] * 5
+    assert sent.count("SELECT") == 1
@@ -0,0 +1,74 @@
+"""
+Run from backend/:
+    python -m pytest tests
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.tickets.batcher import TicketCreateBatcher
+
+VALUES = {"user_id": None, "price": 1.0, "name": "ticket", "is_valid": True}
+
+
+class BrokenSession:
+    """Session whose every use raises an error that is not an SQLAlchemyError"""
+
+    async def __aenter__(self):
+        raise ValueError("not a database error")
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def test_write_error_fails_every_caller(monkeypatch):
+    monkeypatch.setattr("src.tickets.batcher.AsyncSessionLocal", BrokenSession)
+
+    async def create_group():
+        batcher = TicketCreateBatcher(window=0.001, max_rows=10)
+        # A hang shows up as a timeout instead of a stuck test run
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.create(dict(VALUES)) for _ in range(3)), return_exceptions=True), 5)
+
+    results = asyncio.run(create_group())
+
+    assert len(results) == 3
+    for result in results:
+        assert isinstance(result, HTTPException)
+        assert result.status_code == 500
+
+
+class HangingSession:
+    """Session that never gets a connection"""
+
+    async def __aenter__(self):
+        await asyncio.Event().wait()
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+@pytest.mark.parametrize("started", [False, True])
+def test_cancelled_write_fails_every_caller(monkeypatch, started):
+    monkeypatch.setattr("src.tickets.batcher.AsyncSessionLocal", HangingSession)
+
+    async def create_group():
+        batcher = TicketCreateBatcher(window=60, max_rows=10)
+        callers = [asyncio.create_task(batcher.create(dict(VALUES))) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        # Shutdown cancelling the write, before it started or while it waits for the database
+        batcher._flush()
+        if started:
+            await asyncio.sleep(0.01)
+        for write in list(batcher._writes):
+            write.cancel()
+
+        return await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 5)
+
+    results = asyncio.run(create_group())
+
+    for result in results:
+        assert isinstance(result, HTTPException)
+        assert result.status_code == 500
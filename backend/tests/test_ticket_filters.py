@@ -0,0 +1,78 @@
+from datetime import datetime, UTC, timedelta
+
+from sqlalchemy import insert
+
+from src.database import AsyncSessionLocal
+from src.tickets.models import Ticket
+from src.users.models import User
+
+STARTED = datetime(2026, 1, 1, tzinfo=UTC)
+
+# id: (user_id, is_valid, price, minutes after STARTED)
+TICKETS = {
+    1: (1, True, 10, 0),
+    2: (1, False, 30, 1),
+    3: (2, True, 20, 2),
+    4: (2, True, 30, 3),
+    5: (None, False, 5, 4),
+    6: (1, True, 20, 5),
+}
+
+
+async def seed() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": user_id, "username": f"user-{user_id}", "email": f"user-{user_id}@example.com", "password": "-"}
+            for user_id in (1, 2)
+        ])
+        await db.execute(insert(Ticket), [
+            {
+                "id": ticket_id,
+                "name": f"ticket-{ticket_id}",
+                "user_id": user_id,
+                "is_valid": is_valid,
+                "price": price,
+                "created_at": STARTED + timedelta(minutes=minutes),
+            }
+            for ticket_id, (user_id, is_valid, price, minutes) in TICKETS.items()
+        ])
+        await db.commit()
+
+
+def test_filters_and_sort_orders(database, run, client):
+    queries = {
+        "user": {"user_id": 1},
+        "valid_in_range": {"is_valid": "true", "min_price": 15, "max_price": 30},
+        "created": {
+            "created_after": (STARTED + timedelta(minutes=2)).isoformat(),
+            "created_before": (STARTED + timedelta(minutes=5)).isoformat(),
+        },
+        "price": {"sort": "price"},
+        "price_desc": {"sort": "-price"},
+        "newest": {"sort": "-created_at", "is_valid": "false"},
+    }
+
+    async def scenario():
+        await seed()
+        found = {}
+
+        async with client() as http:
+            for name, params in queries.items():
+                body = (await http.get("/tickets", params={"page_size": 10, **params})).json()
+                found[name] = ([ticket["id"] for ticket in body["items"]], body["meta"]["total_items"])
+
+            bad_sort = await http.get("/tickets", params={"sort": "name"})
+
+        return found, bad_sort.status_code
+
+    found, bad_sort = run(scenario())
+
+    assert found["user"] == ([1, 2, 6], 3)
+    assert found["valid_in_range"] == ([3, 4, 6], 3)
+    assert found["created"] == ([3, 4, 5], 3)
+    # Equal prices are ordered by id, in the direction of the sort
+    assert found["price"] == ([5, 1, 3, 6, 2, 4], 6)
+    assert found["price_desc"] == ([4, 2, 6, 3, 1, 5], 6)
+    assert found["newest"] == ([5, 2], 2)
+    # Only indexed columns can be sorted by
+    assert bad_sort == 422
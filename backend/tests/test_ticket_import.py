@@ -0,0 +1,53 @@
+import io
+import json
+
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from src.database import AsyncSessionLocal
+from src.export import FileFormat
+from src.tickets.models import Ticket
+from src.tickets.service import ticket_service
+from src.tickets.stats import ticket_stats_service
+
+
+def upload(records: list) -> UploadFile:
+    content = "\n".join(json.dumps(record) for record in records).encode()
+
+    return UploadFile(file=io.BytesIO(content), filename="tickets.ndjson")
+
+
+def test_failed_batch_leaves_none_of_its_rows(database, run, monkeypatch):
+    monkeypatch.setattr("src.tickets.service.IMPORT_BATCH_SIZE", 3)
+    apply = ticket_stats_service.apply
+    calls = 0
+
+    async def fail_second_batch(db, delta):
+        nonlocal calls
+        calls += 1
+
+        if calls == 2:
+            raise OperationalError("UPDATE ticket_stats", {}, Exception("connection lost"))
+
+        await apply(db, delta)
+
+    monkeypatch.setattr(ticket_stats_service, "apply", fail_second_batch)
+
+    # No user_ids, so on PostgreSQL every batch is written by COPY
+    records = [{"name": f"ticket {line}", "price": 1.0, "is_valid": True} for line in range(1, 10)]
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            result = await ticket_service.import_tickets(db, upload(records), FileFormat.NDJSON)
+
+        async with AsyncSessionLocal() as db:
+            names = (await db.scalars(select(Ticket.name).order_by(Ticket.id))).all()
+
+        return result, names
+
+    result, names = run(scenario())
+
+    assert result["tickets_created"] == 6
+    assert [error["line"] for error in result["errors"]] == [4, 5, 6]
+    assert names == ["ticket 1", "ticket 2", "ticket 3", "ticket 7", "ticket 8", "ticket 9"]
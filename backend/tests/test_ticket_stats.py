@@ -0,0 +1,73 @@
+from sqlalchemy import insert, update
+
+from src.database import AsyncSessionLocal
+from src.tickets import reconcile_stats
+from src.tickets.models import TicketStats
+from src.tickets.stats import ticket_stats_service
+from src.users.models import User
+
+
+async def drift() -> list:
+    async with AsyncSessionLocal() as db:
+        return await ticket_stats_service.reconcile(db, fix=False)
+
+
+def test_counters_follow_every_write(database, run, client):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(User), [
+                {"id": user_id, "username": f"user-{user_id}", "email": f"user-{user_id}@example.com", "password": "-"}
+                for user_id in (1, 2)
+            ])
+            await db.commit()
+
+        async with client() as http:
+            for price, user_id in ((10, 1), (20, 1), (30, 2), (5, None)):
+                await http.post("/tickets", json={"name": "t", "price": price, "is_valid": True, "user_id": user_id})
+
+            await http.post("/tickets/bulk", json={"name": "bulk", "price": 1, "is_valid": False, "amount": 10})
+            await http.put("/tickets/1", json={"name": "t", "price": 15, "is_valid": False, "user_id": 2})
+            await http.patch("/tickets/2", json={"price": 25})
+            await http.delete("/tickets/3")
+
+            user_stats = [(await http.get(f"/users/{user_id}/ticket-stats")).json() for user_id in (1, 2)]
+            await http.delete("/users/2")
+            totals = (await http.get("/tickets/stats")).json()
+
+        return user_stats, totals, await drift()
+
+    user_stats, totals, found = run(scenario())
+
+    assert [(stats["tickets"], stats["valid_tickets"], stats["total_price"]) for stats in user_stats] == [
+        (1, 1, 25), (1, 0, 15),
+    ]
+    assert (totals["tickets"], totals["valid_tickets"], totals["total_price"]) == (13, 2, 55)
+    assert (totals["owners"], totals["unowned_tickets"]) == (1, 12)
+    assert found == []
+
+
+def test_reconcile_reports_and_fixes_drift(database, run, client, capsys):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(User).values(id=1, username="owner", email="owner@example.com", password="-"))
+            await db.commit()
+
+        async with client() as http:
+            await http.post("/tickets", json={"name": "t", "price": 10, "is_valid": True, "user_id": 1})
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(TicketStats).where(TicketStats.user_id == 1).values(tickets=7))
+            await db.commit()
+
+        dry_run = await reconcile_stats.main(fix=False)
+        still_there = await drift()
+        fixed = await reconcile_stats.main(fix=True)
+
+        return dry_run, still_there, fixed, await drift()
+
+    dry_run, still_there, fixed, after = run(scenario())
+
+    assert (dry_run, fixed) == (1, 1)
+    assert still_there == [{"user_id": 1, "stored": (7, 1, 10.0), "actual": (1, 1, 10.0)}]
+    assert after == []
+    assert "user_id=1: stored tickets=7 valid=1 price=10.00, actual tickets=1 valid=1 price=10.00" in capsys.readouterr().out
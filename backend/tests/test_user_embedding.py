@@ -0,0 +1,59 @@
+from datetime import datetime, UTC, timedelta
+
+from sqlalchemy import insert
+
+from src.database import AsyncSessionLocal
+from src.tickets.models import Ticket
+from src.tickets.stats import ticket_stats_service
+from src.users.models import User
+
+STARTED = datetime(2026, 1, 1, tzinfo=UTC)
+
+# ticket id -> owner, in creation order
+OWNERS = {1: 1, 2: 3, 3: 1, 4: 1, 5: 1, 6: 4}
+
+
+async def seed() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": user_id, "username": f"user-{user_id}", "email": f"user-{user_id}@example.com", "password": "-"}
+            for user_id in range(1, 6)
+        ])
+        await db.execute(insert(Ticket), [
+            {
+                "id": ticket_id,
+                "name": f"ticket-{ticket_id}",
+                "price": 1,
+                "is_valid": True,
+                "user_id": user_id,
+                "created_at": STARTED + timedelta(minutes=ticket_id),
+            }
+            for ticket_id, user_id in OWNERS.items()
+        ])
+        await ticket_stats_service.reconcile(db)
+
+
+def test_listing_embeds_the_oldest_tickets_in_one_query(database, run, client, statements):
+    async def scenario():
+        await seed()
+
+        async with client() as http:
+            with statements() as sent:
+                embedded = (await http.get("/users", params={"include": "tickets", "tickets_limit": 2})).json()
+
+            plain = (await http.get("/users")).json()
+            single = (await http.get("/users/1", params={"include": "tickets", "tickets_limit": 3})).json()
+            too_many = await http.get("/users", params={"include": "tickets", "tickets_limit": 1000})
+
+        return embedded, sent, plain, single, too_many.status_code
+
+    embedded, sent, plain, single, too_many = run(scenario())
+
+    assert [
+        ([ticket["id"] for ticket in user["tickets"]], user["tickets_total"]) for user in embedded["items"]
+    ] == [([1, 3], 4), ([], 0), ([2], 1), ([6], 1), ([], 0)]
+    # The page and the embedded tickets, however many users are on the page
+    assert sent.count("SELECT") == 2
+    assert all(user["tickets"] is None for user in plain["items"])
+    assert ([ticket["id"] for ticket in single["tickets"]], single["tickets_total"]) == ([1, 3, 4], 4)
+    assert too_many == 422
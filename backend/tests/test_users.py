@@ -0,0 +1,59 @@
+import asyncio
+
+from sqlalchemy import select, func
+
+from src.database import AsyncSessionLocal
+from src.users.models import User
+
+
+def new_user(name: str) -> dict:
+    return {"username": name, "email": f"{name}@example.com", "password": "password"}
+
+
+def test_create_user_once_per_email(database, run, client):
+    async def scenario():
+        async with client() as http:
+            created = await http.post("/users", json=new_user("first"))
+            repeated = await http.post("/users", json=new_user("first"))
+            racing = await asyncio.gather(*(http.post("/users", json=new_user("racer")) for _ in range(3)))
+
+        async with AsyncSessionLocal() as db:
+            stored = await db.scalar(select(User.password).where(User.email == "first@example.com"))
+            users = await db.scalar(select(func.count()).select_from(User))
+
+        return created, repeated, sorted(response.status_code for response in racing), stored, users
+
+    created, repeated, racing, stored, users = run(scenario())
+
+    assert created.status_code == 201
+    assert created.json()["email"] == "first@example.com"
+    assert "password" not in created.json()
+    assert stored.startswith("scrypt$")
+    assert (repeated.status_code, repeated.json()["detail"]) == (400, "Email already registered")
+    assert racing == [201, 400, 400]
+    assert users == 2
+
+
+def test_bulk_create_skips_registered_emails(database, run, client, monkeypatch):
+    monkeypatch.setattr("src.users.service.USER_BULK_BATCH_SIZE", 2)
+
+    async def scenario():
+        async with client() as http:
+            await http.post("/users", json=new_user("taken"))
+            users = [new_user(name) for name in ("a", "taken", "b", "a", "c")]
+            response = await http.post("/users/bulk", json={"users": users})
+
+        async with AsyncSessionLocal() as db:
+            emails = (await db.scalars(select(User.email).order_by(User.id))).all()
+
+        return response, emails
+
+    response, emails = run(scenario())
+
+    assert response.status_code == 201
+    assert response.json() == {
+        "success": True,
+        "users_created": 3,
+        "existing_emails": ["taken@example.com", "a@example.com"],
+    }
+    assert emails == ["taken@example.com", "a@example.com", "b@example.com", "c@example.com"]
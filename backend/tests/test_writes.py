@@ -0,0 +1,62 @@
+from sqlalchemy import insert
+
+from src.database import AsyncSessionLocal
+from src.tickets.models import Ticket
+from src.users.models import User
+
+
+async def seed() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User).values(id=1, username="owner", email="owner@example.com", password="-"))
+        await db.execute(insert(Ticket).values(id=1, name="old", price=1.0, is_valid=True, user_id=1))
+        await db.commit()
+
+
+def test_writes_take_one_round_trip(database, run, client, statements):
+    async def scenario():
+        await seed()
+
+        async with client() as http:
+            with statements() as patched:
+                ticket = (await http.patch("/tickets/1", json={"name": "new"})).json()
+
+            with statements() as put:
+                user = (await http.put("/users/1", json={"username": "renamed", "email": "owner@example.com"})).json()
+
+            with statements() as created:
+                new_ticket = await http.post("/tickets", json={"name": "x", "price": 2, "is_valid": True})
+
+        return ticket, patched, user, put, new_ticket.status_code, new_ticket.json(), created
+
+    ticket, patched, user, put, status, new_ticket, created = run(scenario())
+
+    # UPDATE ... RETURNING, no SELECT before or after
+    assert patched == ["UPDATE"]
+    assert (ticket["name"], ticket["price"], ticket["user_id"]) == ("new", 1.0, 1)
+    assert put == ["UPDATE"]
+    assert user["username"] == "renamed"
+    assert status == 201
+    assert (new_ticket["id"], new_ticket["name"]) == (2, "x")
+    assert "SELECT" not in created
+
+
+def test_patch_null_clears_only_user_id(database, run, client):
+    async def scenario():
+        await seed()
+
+        async with client() as http:
+            cleared = await http.patch("/tickets/1", json={"user_id": None})
+            refused = await http.patch("/tickets/1", json={"name": None, "price": None})
+            kept = await http.get("/tickets/1")
+            missing = await http.patch("/tickets/99", json={"name": "new"})
+
+        return cleared, refused, kept.json(), missing.status_code
+
+    cleared, refused, kept, missing = run(scenario())
+
+    assert cleared.status_code == 200
+    assert cleared.json()["user_id"] is None
+    assert refused.status_code == 422
+    assert "name, price may not be null" in refused.text
+    assert (kept["name"], kept["price"], kept["user_id"]) == ("old", 1.0, None)
+    assert missing == 404